@@ -0,0 +1,318 @@
+"""
+Declarative alert rules evaluated against a consultation.
+
+Each rule is registered once at import time. A consultation's context (the
+consultation, its patient, vitals, latest lab results, latest consent, latest
+imaging study and the patient's latest recent events) is loaded with a fixed number of queries,
+every rule is evaluated in a single pass over that context, and the resulting
+alerts are written with one bulk insert.
+
+Repeat firings of a rule for the same patient are folded into the open alert
+while they fall inside the suppression window (``ALERT_SUPPRESSION_WINDOW``
+seconds since it was last seen): its ``occurrences`` counter and ``last_seen``
+timestamp are bumped and its description is replaced with the latest one
+(e.g. the new blood pressure reading) instead of inserting a duplicate row. Every insert and
+repeat is also recorded as an ``AlertEvent`` for the live alert stream.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Prefetch, Value, When
+from django.utils import timezone
+
+from .fragment_cache import bump_data_version
+from .models import Alert, AlertEvent, Consent, Consultation, ImagingStudy, LabResults, RecentEvents
+
+DEFAULT_TPA_WINDOW_WARNING = 30 * 60
+
+RULES = {}
+
+
+class Rule:
+    """Base class for alert rules; subclasses implement ``matches``"""
+
+    def __init__(self, key, type, message):
+        self.key = key
+        self.type = type
+        self.message = message
+
+    def matches(self, context):
+        raise NotImplementedError
+
+    def evaluate(self, context):
+        """Return the alert description if the rule fires, otherwise None"""
+        if self.matches(context):
+            return self.message.format(**context)
+        return None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.key}>"
+
+
+class ThresholdRule(Rule):
+    """
+    Fires when any of ``limits`` is outside its (low, high) range.
+
+    ``source`` names the context object holding the fields, and either bound
+    may be None. Missing sources and missing values never fire; with
+    ``skip_zero``, neither does 0, for fields where it means "not measured".
+    """
+
+    def __init__(self, key, type, source, limits, message, skip_zero=False):
+        super().__init__(key, type, message)
+        self.source = source
+        self.limits = limits
+        self.skip_zero = skip_zero
+
+    def matches(self, context):
+        obj = context.get(self.source)
+        if obj is None:
+            return False
+        for field, (low, high) in self.limits.items():
+            value = getattr(obj, field)
+            if value is None or (self.skip_zero and value == 0):
+                continue
+            if (low is not None and value < low) or (high is not None and value > high):
+                return True
+        return False
+
+
+class FlagRule(Rule):
+    """Fires when a boolean field on the ``source`` context object is set"""
+
+    def __init__(self, key, type, source, field, message):
+        super().__init__(key, type, message)
+        self.source = source
+        self.field = field
+
+    def matches(self, context):
+        obj = context.get(self.source)
+        return obj is not None and bool(getattr(obj, self.field))
+
+
+class CheckRule(Rule):
+    """Fires when ``check(context)`` returns a truthy value"""
+
+    def __init__(self, key, type, check, message):
+        super().__init__(key, type, message)
+        self.check = check
+
+    def matches(self, context):
+        return bool(self.check(context))
+
+
+def register(rule):
+    """Add ``rule`` to the registry; keys must be unique"""
+    if rule.key in RULES:
+        raise ValueError(f"Alert rule '{rule.key}' is already registered.")
+    RULES[rule.key] = rule
+    return rule
+
+
+def check(key, type, message):
+    """Decorator registering a function of the context as a CheckRule"""
+    def decorator(func):
+        register(CheckRule(key, type, func, message))
+        return func
+    return decorator
+
+
+def registered_rules():
+    """Return the registered rules in evaluation order"""
+    return list(RULES.values())
+
+
+register(ThresholdRule(
+    'nihss_stroke', 'warning', 'consultation', {'nihss_score': (None, 3)},
+    'NIHSS score ({consultation.nihss_score}) indicates potential stroke',
+))
+register(ThresholdRule(
+    'blood_pressure_high', 'critical', 'vitals', {'systolic': (None, 185), 'diastolic': (None, 110)},
+    'High blood pressure ({vitals.systolic}/{vitals.diastolic}) detected - tPA contraindicated',
+))
+register(ThresholdRule(
+    'heart_rate_abnormal', 'warning', 'vitals', {'heart_rate': (60, 100)},
+    'Abnormal heart rate ({vitals.heart_rate} bpm) detected',
+))
+register(ThresholdRule(
+    'oxygen_saturation_low', 'warning', 'vitals', {'oxygen_saturation': (95, None)},
+    'Oxygen saturation below normal range ({vitals.oxygen_saturation:.1f}% < 95%) - '
+    'Supplemental oxygen may be required',
+))
+register(ThresholdRule(
+    'temperature_abnormal', 'warning', 'vitals', {'temperature': (36.1, 38)},
+    'Abnormal temperature detected ({vitals.temperature:.1f}°C) - Normal range: 36.1°C to 38°C',
+))
+register(ThresholdRule(
+    'respiratory_rate_abnormal', 'warning', 'vitals', {'respiratory_rate': (12, 20)},
+    'Abnormal respiratory rate detected ({vitals.respiratory_rate} breaths/min) - '
+    'Normal range: 12-20 breaths/min', skip_zero=True,
+))
+register(ThresholdRule(
+    'blood_glucose_out_of_range', 'critical', 'vitals', {'blood_glucose': (50, 400)},
+    'Blood glucose outside tPA administration range ({vitals.blood_glucose} mg/dL) - '
+    'Normal range: 50-400 mg/dL',
+))
+register(ThresholdRule(
+    'age_below_threshold', 'critical', 'patient', {'age': (18, None)},
+    'Patient age ({patient.age}) is below tPA eligibility threshold',
+))
+
+for _field, _label in [
+    ('recent_surgery', 'Recent surgery'),
+    ('recent_biopsy', 'Recent biopsy'),
+    ('recent_head_trauma', 'Recent head trauma'),
+    ('recent_stroke', 'Recent stroke'),
+    ('recent_mi', 'Recent myocardial infarction'),
+]:
+    register(FlagRule(
+        _field, 'critical', 'recent_events', _field,
+        f'{_label} detected - tPA contraindicated',
+    ))
+
+register(ThresholdRule(
+    'inr_high', 'critical', 'lab_results', {'inr': (None, 1.7)},
+    'INR too high for tPA administration ({lab_results.inr:.1f} > 1.7) - tPA contraindicated', skip_zero=True,
+))
+register(ThresholdRule(
+    'platelets_low', 'critical', 'lab_results', {'cbc_plt': (100000, None)},
+    'Platelet count too low for tPA administration ({lab_results.cbc_plt} x10³/μL < 100,000) - '
+    'tPA contraindicated', skip_zero=True,
+))
+
+
+@check('outside_tpa_window', 'critical', 'Patient outside tPA treatment window (>4.5 hours)')
+def outside_tpa_window(context):
+    consultation = context['consultation']
+    return consultation.symptom_onset_time and not consultation.within_tpa_window
+
+
+def tpa_warning_lead():
+    """How long before the tPA window closes the closing-soon alert is raised"""
+    return timedelta(seconds=getattr(settings, 'TPA_WINDOW_WARNING', DEFAULT_TPA_WINDOW_WARNING))
+
+
+@check('tpa_window_closing', 'warning', 'tPA treatment window closing soon - treatment decision needed')
+def tpa_window_closing(context):
+    consultation = context['consultation']
+    if not consultation.symptom_onset_time:
+        return False
+    left = consultation.symptom_onset_time + Consultation.TPA_WINDOW - consultation.date
+    return timedelta(0) < left <= tpa_warning_lead()
+
+
+@check('tpa_consent_missing', 'critical', 'No consent for tPA administration')
+def tpa_consent_missing(context):
+    consent = context['consent']
+    return consent is not None and not consent.tpa_consent
+
+
+def load_contexts(consultations):
+    """Load everything the rules read for each of ``consultations`` (a queryset) in a fixed number of queries"""
+    contexts = []
+    for consultation in (
+        consultations
+        .select_related('patient__vitals', 'vitals')
+        .prefetch_related(
+            Prefetch('lab_results', queryset=LabResults.objects.order_by('-id'),
+                     to_attr='ordered_lab_results'),
+            Prefetch('consents', queryset=Consent.objects.order_by('-id'),
+                     to_attr='ordered_consents'),
+            Prefetch('imaging_studies', queryset=ImagingStudy.objects.order_by('-id'),
+                     to_attr='ordered_imaging_studies'),
+            Prefetch('patient__recent_events', queryset=RecentEvents.objects.order_by('-id'),
+                     to_attr='ordered_recent_events'),
+        )
+    ):
+        patient = consultation.patient
+        contexts.append({
+            'consultation': consultation,
+            'patient': patient,
+            'vitals': consultation.vitals,
+            'lab_results': next(iter(consultation.ordered_lab_results), None),
+            'consent': next(iter(consultation.ordered_consents), None),
+            'imaging_study': next(iter(consultation.ordered_imaging_studies), None),
+            'recent_events': next(iter(patient.ordered_recent_events), None),
+        })
+    return contexts
+
+
+def load_context(consultation_id):
+    """Load everything the rules read for a consultation in a fixed number of queries"""
+    contexts = load_contexts(Consultation.objects.filter(pk=consultation_id))
+    if not contexts:
+        raise Consultation.DoesNotExist(f'Consultation {consultation_id} does not exist.')
+    return contexts[0]
+
+
+def evaluate(context, rules=None):
+    """Evaluate ``rules`` (default: all registered) and return (rule, description) pairs"""
+    fired = []
+    for rule in rules if rules is not None else RULES.values():
+        description = rule.evaluate(context)
+        if description is not None:
+            fired.append((rule, description))
+    return fired
+
+
+def alert_fingerprint(patient_id, rule_key):
+    """Stable identifier of a rule firing for a patient"""
+    return hashlib.sha1(f'{patient_id}:{rule_key}'.encode()).hexdigest()
+
+
+def save_alerts(patient, fired, now=None):
+    """
+    Store (rule, description) pairs for ``patient``, folding repeats into open alerts.
+
+    The partial unique index on open fingerprints makes this safe against
+    concurrent writers: at worst a racing duplicate is dropped by the insert.
+    Returns the newly created alerts.
+    """
+    now = now or timezone.now()
+    window = timedelta(seconds=settings.ALERT_SUPPRESSION_WINDOW)
+    candidates = {}
+    for rule, description in fired:
+        fingerprint = alert_fingerprint(patient.pk, rule.key)
+        candidates[fingerprint] = Alert(
+            type=rule.type, description=description, patient=patient,
+            rule_key=rule.key, fingerprint=fingerprint, last_seen=now,
+        )
+    if not candidates:
+        return []
+
+    with transaction.atomic():
+        open_alerts = Alert.objects.filter(fingerprint__in=candidates, acknowledged=False)
+        # Open alerts not seen within the window give up their fingerprint so
+        # the new firing is raised as a fresh alert.
+        open_alerts.filter(last_seen__lt=now - window).update(fingerprint=None)
+        repeated = dict(open_alerts.values_list('fingerprint', 'id'))
+        if repeated:
+            Alert.objects.filter(id__in=repeated.values()).update(
+                occurrences=F('occurrences') + 1, last_seen=now,
+                description=Case(*[When(id=alert_id, then=Value(candidates[fingerprint].description))
+                                   for fingerprint, alert_id in repeated.items()]),
+            )
+        Alert.objects.bulk_create(
+            [alert for fingerprint, alert in candidates.items() if fingerprint not in repeated],
+            ignore_conflicts=True,
+        )
+        # bulk_create cannot report primary keys when conflicts are ignored,
+        # so read back the alerts this call actually inserted.
+        new_alerts = list(Alert.objects.filter(
+            fingerprint__in=[fingerprint for fingerprint in candidates if fingerprint not in repeated],
+            acknowledged=False, last_seen=now, occurrences=1,
+        ).order_by('id'))
+        AlertEvent.objects.bulk_create(
+            [AlertEvent(alert=alert, kind='created') for alert in new_alerts]
+            + [AlertEvent(alert_id=alert_id, kind='repeated') for alert_id in repeated.values()]
+        )
+        transaction.on_commit(bump_data_version)
+    return new_alerts
+
+
+def run_alert_rules(consultation):
+    """Evaluate all rules for ``consultation`` and store the alerts they raise"""
+    context = load_context(consultation.pk)
+    return save_alerts(context['patient'], evaluate(context))
@@ -0,0 +1,197 @@
+"""
+Server-sent event stream of alert changes.
+
+Alert inserts, repeats and acknowledgements are appended to ``AlertEvent``.
+Each server process runs a single poller per event loop that reads new events
+in id order and fans them out to every connected client's queue, so the
+database sees one small indexed query per poll interval no matter how many
+neurologists are listening.
+
+Event ids double as SSE ids. A reconnecting browser sends the last id it saw
+in ``Last-Event-ID`` and the stream replays everything after it from the
+database before switching to live events. A client that falls too far behind
+is disconnected and catches up the same way when it reconnects.
+
+Ids are allocated at insert but become visible at commit, which on
+PostgreSQL need not happen in id order, so an event can appear behind the
+cursor. The poller therefore also re-reads the last ``OVERLAP`` ids for
+events it has not seen yet, and a replay starts ``OVERLAP`` ids before the
+client's cursor. Every event carries the alert's current state, so a client
+receiving one twice simply applies it again.
+
+The stream is an infinite async response and needs an ASGI server
+(``stroke_unit_system.asgi``); under WSGI it would hold a worker for as long
+as a dashboard is open, so the view refuses it there.
+"""
+import asyncio
+import json
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+
+from .models import AlertEvent
+
+DEFAULT_POLL_INTERVAL = 1
+DEFAULT_KEEPALIVE = 15
+RECONNECT_DELAY_MS = 3000
+BATCH_SIZE = 500
+QUEUE_SIZE = 100
+OVERLAP = 100
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def serialize(event):
+    """Return the JSON payload sent to clients for an AlertEvent"""
+    alert = event.alert
+    return {
+        'id': event.id,
+        'kind': event.kind,
+        'alert': {
+            'id': alert.id,
+            'type': alert.type,
+            'description': alert.description,
+            'patient_id': alert.patient_id,
+            'patient_name': alert.patient.name,
+            'patient_url': reverse('patientsystem:patient_detail', args=[alert.patient_id]),
+            'timestamp': alert.timestamp.isoformat(),
+            'occurrences': alert.occurrences,
+            'acknowledged': alert.acknowledged,
+            'acknowledged_by': alert.acknowledged_by.username if alert.acknowledged_by else None,
+        },
+    }
+
+
+def fetch_events(after_id, limit=BATCH_SIZE, ids=None):
+    """Return up to ``limit`` serialized events with an id above ``after_id`` (and in ``ids``, if given)"""
+    events = AlertEvent.objects.filter(id__gt=after_id)
+    if ids is not None:
+        events = events.filter(id__in=ids)
+    events = events.select_related('alert__patient', 'alert__acknowledged_by').order_by('id')[:limit]
+    return [serialize(event) for event in events]
+
+
+def latest_event_id():
+    return AlertEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def recent_event_ids(last_id):
+    """Ids of the committed events among the ``OVERLAP`` ids up to ``last_id``"""
+    return set(AlertEvent.objects.filter(id__gt=last_id - OVERLAP, id__lte=last_id)
+               .values_list('id', flat=True))
+
+
+def format_event(payload):
+    """Encode a serialized event as an SSE message"""
+    return f"id: {payload['id']}\nevent: {payload['kind']}\ndata: {json.dumps(payload)}\n\n"
+
+
+class Broadcaster:
+    """Polls for new events and pushes them to subscriber queues"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = None
+        # Ids already published among the OVERLAP ids up to last_id.
+        self.seen = set()
+        self.task = None
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        if self.task is None or self.task.done():
+            # The poller starts from the current position; subscribers replay
+            # anything older themselves, so they overlap rather than leave a gap.
+            last_id = await sync_to_async(latest_event_id)()
+            seen = await sync_to_async(recent_event_ids)(last_id)
+            if self.task is None or self.task.done():
+                self.last_id, self.seen = last_id, seen
+                self.task = asyncio.ensure_future(self.run())
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def poll(self):
+        """New events, preceded by any that committed behind the cursor since the last poll"""
+        missed = recent_event_ids(self.last_id) - self.seen
+        events = fetch_events(self.last_id - OVERLAP, ids=missed) if missed else []
+        events += fetch_events(self.last_id)
+        if events:
+            self.last_id = max(self.last_id, events[-1]['id'])
+            self.seen.update(payload['id'] for payload in events)
+            self.seen = {event_id for event_id in self.seen if event_id > self.last_id - OVERLAP}
+        return events
+
+    async def run(self):
+        interval = getattr(settings, 'ALERT_STREAM_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        while self.subscribers:
+            events = await sync_to_async(self.poll)()
+            if events:
+                for queue in list(self.subscribers):
+                    self.publish(queue, events)
+            if len(events) < BATCH_SIZE:
+                await asyncio.sleep(interval)
+
+    def publish(self, queue, events):
+        try:
+            queue.put_nowait(events)
+        except asyncio.QueueFull:
+            # Drop the backlog and tell the client to reconnect; it resumes
+            # from its Last-Event-ID out of the database.
+            self.unsubscribe(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters[loop] = Broadcaster()
+    return _broadcasters[loop]
+
+
+def parse_event_id(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+async def stream(last_event_id=None):
+    """Yield SSE messages: a replay after ``last_event_id``, then live events"""
+    keepalive = getattr(settings, 'ALERT_STREAM_KEEPALIVE', DEFAULT_KEEPALIVE)
+    broadcaster = get_broadcaster()
+    queue = await broadcaster.subscribe()
+    try:
+        yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+        # Replayed ids, so live events the replay already covered are not sent again.
+        sent = set()
+        cursor = parse_event_id(last_event_id)
+        if cursor is not None:
+            cursor = max(cursor - OVERLAP, 0)
+            while True:
+                events = await sync_to_async(fetch_events)(cursor)
+                for payload in events:
+                    yield format_event(payload)
+                    sent.add(payload['id'])
+                    cursor = payload['id']
+                if len(events) < BATCH_SIZE:
+                    break
+
+        while True:
+            try:
+                events = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if events is None:
+                return
+            for payload in events:
+                if payload['id'] not in sent:
+                    yield format_event(payload)
+    finally:
+        broadcaster.unsubscribe(queue)
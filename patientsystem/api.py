@@ -0,0 +1,195 @@
+"""
+Read-only JSON API (``/api/v1/``) for patients, consultations and alerts.
+
+Clients pick the columns they need with ``fields=a,b,c``; only those (plus
+the sort key) are selected. Lists are cursor-paginated with the same
+``after``/``before``/``page_size`` parameters as the HTML pages, in one of
+the indexed orderings chosen with ``order=``.
+
+Every response carries an ``ETag`` hashed from the page itself (the ids and
+values of its rows and its cursors) and the viewer's role. It is computed
+from the page query, so it changes exactly when the data the client would
+receive does, whichever worker answers; a poller revalidating unchanged data
+gets a ``304 Not Modified`` without the response body. When ages are
+requested or filtered on, the ETag also covers today's date, since those
+change at midnight. There is no ``Last-Modified``: no timestamp on the page
+moves when a row is acknowledged, leaves the filter or is deleted, so
+``If-Modified-Since`` would answer 304 for a stale list.
+"""
+import hashlib
+
+from django.db.models import F, Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from .filters import alert_filters, filters_to_q
+from .middleware import request_role
+from .models import Alert, Consultation, Patient, age_range
+from .pagination import InvalidCursor, KeysetPaginator, get_page_size
+
+API_VERSION = 'v1'
+ROLES = ('technician', 'neurologist')
+
+
+class Resource:
+    """
+    A listable model. ``queryset()`` builds the base queryset for a request,
+    ``orderings`` maps each ``order=`` value to its keyset ordering (the first
+    is the default) and ``fields`` maps each public field name to the lookup
+    it is read from. The optional ``filters(params)`` turns query parameters
+    into a Q object. ``dated`` lists the fields and parameters whose meaning
+    depends on today's date (ages), which then keys the ETag.
+    """
+
+    def __init__(self, name, queryset, orderings, fields, default_fields, filters=None, roles=ROLES, dated=()):
+        self.name = name
+        self.queryset = queryset
+        self.orderings = orderings
+        self.fields = fields
+        self.default_fields = default_fields
+        self.filters = filters
+        self.roles = roles
+        self.dated = dated
+
+    def values(self, names, ordering):
+        """The queryset selecting ``names`` plus the sort key columns"""
+        sort_keys = [key.lstrip('-') for key in ordering]
+        plain = [name for name in names if self.fields[name] == name]
+        plain += [key for key in sort_keys if key not in plain]
+        renamed = {name: F(self.fields[name]) for name in names if self.fields[name] != name}
+        return self.queryset().values(*plain, **renamed)
+
+
+def _age(value):
+    return int(value) if (value or '').isdigit() else None
+
+
+def _patient_filters(params):
+    return age_range(_age(params.get('min_age')), _age(params.get('max_age')))
+
+
+def _consultation_filters(params):
+    if (params.get('patient') or '').isdigit():
+        return Q(patient_id=int(params['patient']))
+    return Q()
+
+
+def _alert_filters(params):
+    # Same filters as the alerts page.
+    return filters_to_q(alert_filters(params))
+
+
+VITALS_FIELDS = {
+    'systolic': 'vitals__systolic', 'diastolic': 'vitals__diastolic', 'heart_rate': 'vitals__heart_rate',
+    'oxygen_saturation': 'vitals__oxygen_saturation', 'temperature': 'vitals__temperature',
+    'respiratory_rate': 'vitals__respiratory_rate', 'blood_glucose': 'vitals__blood_glucose',
+}
+
+RESOURCES = {
+    'patients': Resource(
+        'patients', Patient.objects.with_age,
+        {'updated': ('-updated_at', '-id'), 'age': ('-date_of_birth', '-id'), '-age': ('date_of_birth', 'id')},
+        fields=dict({name: name for name in (
+            'id', 'hospital_id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'chief_complaint',
+            'medical_history', 'current_medications', 'allergies', 'nihss_score', 'nihss_last_updated',
+            'created_at', 'updated_at',
+        )}, age='age_years', **VITALS_FIELDS),
+        default_fields=('id', 'hospital_id', 'first_name', 'last_name', 'nihss_score', 'updated_at'),
+        filters=_patient_filters, dated=('age', 'min_age', 'max_age'),
+    ),
+    'consultations': Resource(
+        'consultations', Consultation.objects.all, {'date': ('-date', '-id')},
+        fields=dict({name: name for name in (
+            'id', 'date', 'symptom_onset_time', 'diagnosis', 'treatment_plan', 'test_orders', 'nihss_score',
+            'patient_id',
+        )}, **VITALS_FIELDS),
+        default_fields=('id', 'patient_id', 'date', 'diagnosis', 'nihss_score'),
+        filters=_consultation_filters, roles=('neurologist',),
+    ),
+    'alerts': Resource(
+        'alerts', Alert.objects.all, {'timestamp': ('-timestamp', '-id')},
+        fields={name: name for name in (
+            'id', 'type', 'description', 'rule_key', 'timestamp', 'acknowledged', 'acknowledged_at',
+            'occurrences', 'last_seen', 'patient_id', 'acknowledged_by_id',
+        )},
+        default_fields=('id', 'patient_id', 'type', 'description', 'timestamp', 'acknowledged'),
+        filters=_alert_filters, roles=('neurologist',),
+    ),
+}
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _page_url(request, **cursor):
+    params = request.GET.copy()
+    for key in ('after', 'before'):
+        params.pop(key, None)
+    params.update(cursor)
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def _serve(request, resource):
+    if not request.user.is_authenticated:
+        return _error('Authentication required.', 401)
+    role = request_role(request)
+    if role not in resource.roles:
+        return _error(f'The {resource.name} API is not available to your role.', 403)
+
+    requested = request.GET.get('fields')
+    names = [name.strip() for name in requested.split(',') if name.strip()] if requested else resource.default_fields
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        return _error(f'Unknown field(s): {", ".join(unknown)}. '
+                      f'Available: {", ".join(resource.fields)}.', 400)
+
+    order = request.GET.get('order') or next(iter(resource.orderings))
+    if order not in resource.orderings:
+        return _error(f'Unknown order {order!r}. Available: {", ".join(resource.orderings)}.', 400)
+    ordering = resource.orderings[order]
+
+    filter_params = {key: value for key, value in request.GET.items()
+                     if key not in ('fields', 'order', 'after', 'before', 'page_size')}
+    condition = resource.filters(filter_params) if resource.filters else Q()
+    paginator = KeysetPaginator(resource.values(names, ordering).filter(condition), ordering,
+                                get_page_size(request))
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        return _error('Invalid cursor.', 400)
+    response = JsonResponse({
+        'results': [{name: row[name] for name in names} for row in page],
+        'next': _page_url(request, after=page.next_cursor) if page.has_next else None,
+        'previous': _page_url(request, before=page.previous_cursor) if page.has_previous else None,
+    })
+    # Ages and age filter results change at midnight without any row changing.
+    dated = set(resource.dated) & (set(names) | set(filter_params))
+    today = timezone.localdate() if dated else ''
+    etag = quote_etag(hashlib.md5(f'{API_VERSION}:{role}:{today}:'.encode() + response.content).hexdigest())
+    response = get_conditional_response(request, etag=etag) or response
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+@require_safe
+def patients(request):
+    """List patients as JSON, most recently updated first or by age, optionally within an age range"""
+    return _serve(request, RESOURCES['patients'])
+
+
+@require_safe
+def consultations(request):
+    """List consultations as JSON, newest first (neurologist only)"""
+    return _serve(request, RESOURCES['consultations'])
+
+
+@require_safe
+def alerts(request):
+    """List alerts as JSON, newest first, with the alerts page filters (neurologist only)"""
+    return _serve(request, RESOURCES['alerts'])
@@ -6,4 +6,5 @@ class PatientsystemConfig(AppConfig):
     name = 'patientsystem'
 
     def ready(self):
+        import patientsystem.checks
         import patientsystem.signals
@@ -0,0 +1,170 @@
+"""
+Patient autocomplete by name prefix or hospital ID.
+
+Names are matched on ``first_name_key``/``last_name_key``, case- and
+accent-folded copies of the names kept up to date by ``Patient.save()`` and
+``bulk_create()``. A prefix is looked up as the range ``[prefix, prefix')``
+(``prefix'`` being the prefix with its last character incremented) rather
+than with LIKE, which SQLite never serves from an index, so each lookup is a
+short scan of one composite index. Hospital IDs are matched the same way on
+the unique ``hospital_id`` index.
+
+With ``AUTOCOMPLETE_MEMORY_INDEX`` enabled, each process also keeps the
+sorted name keys in memory and answers single-word prefixes with a bisect,
+touching the database only to fetch the matching rows by primary key. Every
+``AUTOCOMPLETE_MEMORY_INDEX_REFRESH`` seconds the index compares its patient
+version (see ``fragment_cache``), which only patient writes change, and if
+it is stale a background thread builds a new one while requests keep using
+the old index (or the database, before the first build), so new patients
+can take that long to appear in suggestions.
+"""
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+from . import fragment_cache
+from .models import Patient, name_key, prefix_range
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+FIELDS = ('id', 'hospital_id', 'first_name', 'last_name', 'date_of_birth', 'gender')
+HOSPITAL_ID = re.compile(r'(?i)(?:p-?)?(\d+)|p-')
+
+
+def _by_hospital_id(digits, limit):
+    low, high = prefix_range(f'P-{digits}')
+    return list(Patient.objects.filter(hospital_id__gte=low, hospital_id__lt=high)
+                .order_by('hospital_id').values(*FIELDS)[:limit])
+
+
+def _by_full_name(first, last, limit):
+    """Patients whose first name starts with ``first`` and last name with ``last``"""
+    return list(Patient.objects.name_prefix('first_name_key', first).name_prefix('last_name_key', last)
+                .order_by('first_name_key', 'last_name_key', 'id').values(*FIELDS)[:limit])
+
+
+def _by_name(prefix, limit, exclude=()):
+    return list(Patient.objects.name_prefix('last_name_key', prefix).exclude(id__in=exclude)
+                .order_by('last_name_key', 'first_name_key', 'id').values(*FIELDS)[:limit])
+
+
+def _by_first_name(prefix, limit, exclude=()):
+    return list(Patient.objects.name_prefix('first_name_key', prefix).exclude(id__in=exclude)
+                .order_by('first_name_key', 'last_name_key', 'id').values(*FIELDS)[:limit])
+
+
+class MemoryIndex:
+    """Sorted name keys with the matching patient ids, for bisecting in process"""
+
+    def __init__(self, version):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.last_names, self.last_name_ids = self._load('last_name_key', 'first_name_key')
+        self.first_names, self.first_name_ids = self._load('first_name_key', 'last_name_key')
+
+    @staticmethod
+    def _load(key, tiebreak):
+        keys, ids = [], array('q')
+        rows = Patient.objects.order_by(key, tiebreak, 'id').values_list(key, 'id')
+        for value, patient_id in rows.iterator(chunk_size=10000):
+            keys.append(value)
+            ids.append(patient_id)
+        return keys, ids
+
+    @staticmethod
+    def _scan(keys, ids, prefix, limit, exclude=()):
+        found = []
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+            if ids[i] not in exclude:
+                found.append(ids[i])
+            i += 1
+        return found
+
+    def lookup(self, prefix, limit):
+        """Ids of up to ``limit`` patients by last name, then by first name"""
+        found = self._scan(self.last_names, self.last_name_ids, prefix, limit)
+        if len(found) < limit:
+            found += self._scan(self.first_names, self.first_name_ids, prefix, limit - len(found), set(found))
+        return found
+
+
+_memory_index = None
+_memory_index_lock = threading.Lock()
+
+
+def _build_memory_index(version):
+    global _memory_index
+    try:
+        _memory_index = MemoryIndex(version)
+    finally:
+        connection.close()
+        _memory_index_lock.release()
+
+
+def memory_index():
+    """
+    This process's MemoryIndex, with a rebuild started in the background when
+    stale; None unless AUTOCOMPLETE_MEMORY_INDEX is set or before the first build
+    """
+    if not getattr(settings, 'AUTOCOMPLETE_MEMORY_INDEX', False):
+        return None
+    index = _memory_index
+    now = time.monotonic()
+    if index is not None and now - index.checked_at < getattr(settings, 'AUTOCOMPLETE_MEMORY_INDEX_REFRESH', 60):
+        return index
+    version = fragment_cache.patient_version()
+    if index is not None:
+        index.checked_at = now
+        if index.version == version:
+            return index
+    # At most one build per process; requests never wait for it.
+    if _memory_index_lock.acquire(blocking=False):
+        threading.Thread(target=_build_memory_index, args=(version,), daemon=True,
+                         name='autocomplete-index').start()
+    return index
+
+
+def _from_memory(index, prefix, limit):
+    ids = index.lookup(prefix, limit)
+    rows = {row['id']: row for row in Patient.objects.filter(id__in=ids).values(*FIELDS)}
+    # Rows deleted since the index was built are simply skipped.
+    return [rows[patient_id] for patient_id in ids if patient_id in rows]
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    """
+    Return up to ``limit`` patients (as dicts of FIELDS) matching ``query``:
+    a hospital ID prefix ("P-12", "12"), a name prefix, or a first and last
+    name prefix in either order ("ann smi", "smi ann").
+    """
+    hospital_id = HOSPITAL_ID.fullmatch(query.strip())
+    if hospital_id:
+        return _by_hospital_id(hospital_id.group(1) or '', limit)
+    words = name_key(query).split()
+    if not words:
+        return []
+    if len(words) > 1:
+        first, rest = words[0], ' '.join(words[1:])
+        # "First Last", "Last First", then a multi-word last name ("van der").
+        lookups = [lambda n: _by_full_name(first, rest, n), lambda n: _by_full_name(rest, first, n),
+                   lambda n: _by_name(' '.join(words), n)]
+        results, seen = [], set()
+        for lookup in lookups:
+            results += [row for row in lookup(limit) if row['id'] not in seen]
+            seen.update(row['id'] for row in results)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+    index = memory_index()
+    if index is not None:
+        return _from_memory(index, words[0], limit)
+    results = _by_name(words[0], limit)
+    if len(results) < limit:
+        results += _by_first_name(words[0], limit - len(results), exclude=[row['id'] for row in results])
+    return results
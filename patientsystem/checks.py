@@ -0,0 +1,26 @@
+"""System checks for the deployment this app needs."""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+DATABASE_CACHE = 'django.core.cache.backends.db.DatabaseCache'
+
+
+@register(Tags.caches)
+def check_cache_tables(app_configs, **kwargs):
+    """Warn about DatabaseCache tables that do not exist yet; ``migrate`` creates them"""
+    tables = [options['LOCATION'] for options in settings.CACHES.values() if options['BACKEND'] == DATABASE_CACHE]
+    if not tables:
+        return []
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        with connection.cursor() as cursor:
+            existing = set(connection.introspection.table_names(cursor))
+    except DatabaseError:
+        # No database to look at yet; migrate will report that itself.
+        return []
+    return [
+        Warning(f"The cache table '{table}' does not exist.",
+                hint="Run 'python manage.py migrate', which creates it.", id='patientsystem.W001')
+        for table in tables if table not in existing
+    ]
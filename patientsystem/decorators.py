@@ -1,17 +1,12 @@
 from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import redirect
 from django.contrib import messages
+from .middleware import request_role
 
 def role_required(role):
-    def check_role(user):
-        try:
-            return user.userprofile.role == role
-        except:
-            return False
-    
     def decorator(view_func):
         def wrapped_view(request, *args, **kwargs):
-            if not check_role(request.user):
+            if request_role(request) != role:
                 messages.error(request, f'Only {role}s can access this page.')
                 return redirect('patientsystem:dashboard')
             return view_func(request, *args, **kwargs)
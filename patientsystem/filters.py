@@ -0,0 +1,67 @@
+"""
+Alert filters shared by the alerts page, bulk acknowledgement and the JSON
+API, so the same query parameters select the same alerts everywhere.
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Alert
+
+ALERT_FILTERS = ('type', 'acknowledged', 'patient', 'since', 'until')
+
+
+def parse_time_bound(value, end_of_day=False):
+    """Parse a date or datetime filter value into an aware datetime, or None"""
+    value = (value or '').strip()
+    # Dates first: parse_datetime also accepts a bare date, as midnight at its start.
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, datetime.min.time())
+    else:
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            return None
+        if moment is None:
+            return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def alert_filters(params):
+    """Clean the alert filter query parameters, dropping any that are invalid"""
+    filters = {}
+    if params.get('type') in dict(Alert.ALERT_TYPES):
+        filters['type'] = params['type']
+    if params.get('acknowledged') in ('yes', 'no'):
+        filters['acknowledged'] = params['acknowledged'] == 'yes'
+    if (params.get('patient') or '').isdigit():
+        filters['patient'] = int(params['patient'])
+    for key in ('since', 'until'):
+        moment = parse_time_bound(params.get(key), end_of_day=key == 'until')
+        if moment is not None:
+            filters[key] = moment
+    return filters
+
+
+def filters_to_q(filters):
+    """The Q object selecting the alerts matching cleaned ``filters``"""
+    q = Q()
+    if 'type' in filters:
+        q &= Q(type=filters['type'])
+    if 'acknowledged' in filters:
+        q &= Q(acknowledged=filters['acknowledged'])
+    if 'patient' in filters:
+        q &= Q(patient_id=filters['patient'])
+    if 'since' in filters:
+        q &= Q(timestamp__gte=filters['since'])
+    if 'until' in filters:
+        q &= Q(timestamp__lt=filters['until'])
+    return q
@@ -0,0 +1,122 @@
+"""
+Cache for rendered dashboard fragments.
+
+Fragments are keyed by name, the viewer's role, any extra key parts (page
+cursor, page size) and a global data version. Saving or deleting a patient,
+vitals, alert or consultation bumps the version once the transaction commits,
+so every fragment rendered before the change is simply never read again and
+ages out of the cache. Code that writes with ``bulk_create`` or ``update()``
+bypasses model signals and must call ``bump_data_version`` itself.
+
+The version, the fragments and the miss locks live in the default cache,
+which is shared by all worker processes (see ``CACHES``), so a write made
+through one worker invalidates the fragments of every other. Only the hit
+and miss counters are per process.
+
+When several requests miss the same fragment at once, only the one that wins
+a short ``cache.add`` lock renders it; the others wait briefly for its result.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+DATA_VERSION_KEY = 'patientsystem:data_version'
+# Changes only when patients are added, saved or deleted (see autocomplete).
+PATIENT_VERSION_KEY = 'patientsystem:patient_version'
+DEFAULT_FRAGMENT_TIMEOUT = 10 * 60
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Return this process's fragment cache counters"""
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters.get('hits', 0) + counters.get('misses', 0)
+    return {
+        'hits': counters.get('hits', 0),
+        'misses': counters.get('misses', 0),
+        'collapsed': counters.get('collapsed', 0),
+        'lock_timeouts': counters.get('lock_timeouts', 0),
+        'version_bumps': counters.get('version_bumps', 0),
+        'hit_ratio': counters.get('hits', 0) / lookups if lookups else None,
+    }
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def data_version():
+    return _version(DATA_VERSION_KEY)
+
+
+def patient_version():
+    return _version(PATIENT_VERSION_KEY)
+
+
+def bump_patient_version():
+    cache.set(PATIENT_VERSION_KEY, secrets.token_hex(8), None)
+
+
+def bump_data_version():
+    """Invalidate every cached fragment"""
+    _count('version_bumps')
+    # A new random version rather than incr(), which the database cache does
+    # as a read and a write: two concurrent bumps could both write the same
+    # value and the second change would invalidate nothing.
+    cache.set(DATA_VERSION_KEY, secrets.token_hex(8), None)
+
+
+def fragment_key(name, role, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'patientsystem:fragment:{name}:{role}:{data_version()}:{digest}'
+
+
+def cached_fragment(name, role, parts, render):
+    """Return the cached HTML for a fragment, calling ``render()`` to build it on a miss"""
+    key = fragment_key(name, role, *parts)
+    html = cache.get(key)
+    if html is not None:
+        _count('hits')
+        return mark_safe(html)
+
+    _count('misses')
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # Another worker is rendering this fragment; wait for its result.
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            html = cache.get(key)
+            if html is not None:
+                _count('collapsed')
+                return mark_safe(html)
+        _count('lock_timeouts')
+        return mark_safe(render())
+
+    try:
+        html = render()
+        cache.set(key, str(html), getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', DEFAULT_FRAGMENT_TIMEOUT))
+    finally:
+        cache.delete(lock_key)
+    return mark_safe(html)
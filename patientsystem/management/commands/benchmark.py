@@ -0,0 +1,306 @@
+import json
+import math
+import platform
+import random
+import resource
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from patientsystem import synthetic, urls as patientsystem_urls
+from patientsystem.models import Alert, Patient
+
+PASSWORD = 'benchmark-password'
+
+VITALS_FORM = {
+    'systolic': '150', 'diastolic': '90', 'heart_rate': '88', 'oxygen_saturation': '96',
+    'temperature': '37.1', 'respiratory_rate': '16', 'blood_glucose': '140',
+}
+PATIENT_FORM = dict(VITALS_FORM, **{
+    'first_name': 'Bench', 'last_name': 'Mark', 'date_of_birth': '1955-03-02', 'gender': 'F',
+    'chief_complaint': 'Left-sided weakness', 'address': '1 Test Road', 'phone_number': '555-0100',
+    'emergency_contact': 'Next of kin', 'medical_history': 'Hypertension',
+    'current_medications': 'Amlodipine', 'allergies': 'None',
+})
+CONSULTATION_FORM = dict(VITALS_FORM, **{
+    'symptom_onset_time': '', 'diagnosis': 'Acute ischemic stroke', 'treatment_plan': 'Thrombolysis',
+    'test_orders': 'CT angiography', 'nihss_score': '9', 'cbc_plt': '210000', 'inr': '1.1',
+    'study_type': 'CT', 'findings': 'Hyperdense MCA sign', 'stroke_type': 'ischemic',
+    'tpa_consent': 'on', 'consent_given_by': 'Patient', 'relationship_to_patient': 'Self',
+})
+
+SEARCH_TERMS = ['warfarin', 'left MCA', 'hemorrhage', 'hypertension', 'aspirin', 'penicillin', 'weak*']
+
+
+class Route:
+    """
+    How to exercise one URL. ``session`` is 'user' to reuse the role's logged-in
+    client, 'fresh' for a newly logged-in client per request (logout) or
+    'anonymous' for a client without a session (login).
+    """
+
+    def __init__(self, name, method, url, data=None, session='user'):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.session = session
+
+    @property
+    def key(self):
+        return f'{self.name} {self.method}'
+
+
+def _patient_url(name):
+    return lambda ctx, rng: reverse(name, args=[rng.choice(ctx['patient_ids'])])
+
+
+def _consultation_form(ctx, rng):
+    onset = timezone.now() - timedelta(minutes=rng.randint(30, 400))
+    return dict(CONSULTATION_FORM, symptom_onset_time=onset.isoformat(timespec='minutes'))
+
+
+ROUTES = [
+    Route('login', 'GET', lambda ctx, rng: reverse('login'), session='anonymous'),
+    Route('login', 'POST', lambda ctx, rng: reverse('login'), session='anonymous',
+          data=lambda ctx, rng: {'username': ctx['username'], 'password': PASSWORD, 'role': ctx['role']}),
+    Route('patientsystem:dashboard', 'GET', lambda ctx, rng: reverse('patientsystem:dashboard')),
+    Route('patientsystem:new_patient', 'GET', lambda ctx, rng: reverse('patientsystem:new_patient')),
+    Route('patientsystem:new_patient', 'POST', lambda ctx, rng: reverse('patientsystem:new_patient'),
+          data=lambda ctx, rng: PATIENT_FORM),
+    Route('patientsystem:patient_detail', 'GET', _patient_url('patientsystem:patient_detail')),
+    Route('patientsystem:new_consultation', 'GET', _patient_url('patientsystem:new_consultation')),
+    Route('patientsystem:new_consultation', 'POST', _patient_url('patientsystem:new_consultation'),
+          data=_consultation_form),
+    Route('patientsystem:alerts', 'GET', lambda ctx, rng: reverse('patientsystem:alerts')),
+    Route('patientsystem:acknowledge_alert', 'POST',
+          lambda ctx, rng: reverse('patientsystem:acknowledge_alert', args=[rng.choice(ctx['alert_ids'])])),
+    Route('patientsystem:acknowledge_alerts', 'POST', lambda ctx, rng: reverse('patientsystem:acknowledge_alerts'),
+          data=lambda ctx, rng: {'ids': rng.sample(ctx['alert_ids'], min(20, len(ctx['alert_ids'])))}),
+    Route('patientsystem:consultations', 'GET', lambda ctx, rng: reverse('patientsystem:consultations')),
+    Route('patientsystem:logout', 'GET', lambda ctx, rng: reverse('patientsystem:logout'), session='fresh'),
+    Route('patientsystem:edit_vitals', 'GET', _patient_url('patientsystem:edit_vitals')),
+    Route('patientsystem:edit_vitals', 'POST', _patient_url('patientsystem:edit_vitals'),
+          data=lambda ctx, rng: VITALS_FORM),
+    Route('patientsystem:vitals_history', 'GET', _patient_url('patientsystem:vitals_history')),
+    Route('patientsystem:search', 'GET', lambda ctx, rng: reverse('patientsystem:search') + '?' + urlencode(
+        {'q': rng.choice(SEARCH_TERMS)})),
+    Route('patientsystem:patient_autocomplete', 'GET', lambda ctx, rng: reverse(
+        'patientsystem:patient_autocomplete') + '?' + urlencode({'q': rng.choice(synthetic.LAST_NAMES)[:3]})),
+    Route('patientsystem:tpa_worklist', 'GET', lambda ctx, rng: reverse('patientsystem:tpa_worklist')),
+    Route('patientsystem:fragment_cache_stats', 'GET', lambda ctx, rng: reverse('patientsystem:fragment_cache_stats')),
+    Route('patientsystem:api_patients', 'GET', lambda ctx, rng: reverse('patientsystem:api_patients')),
+    Route('patientsystem:api_consultations', 'GET', lambda ctx, rng: reverse('patientsystem:api_consultations')),
+    Route('patientsystem:api_alerts', 'GET', lambda ctx, rng: reverse('patientsystem:api_alerts')),
+]
+
+# Routes that cannot be timed as a single request/response.
+SKIPPED = {
+    'patientsystem:stream_alerts': 'server-sent event stream never completes',
+}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Builds throwaway databases of the given sizes, drives every patientsystem route for '
+            'both roles, and reports latency percentiles, queries per request and peak memory')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, nargs='+', default=[10000],
+                            help='Database sizes to benchmark, e.g. --patients 10000 100000 1000000')
+        parser.add_argument('--consultations-per-patient', type=float,
+                            default=synthetic.PROFILE['consultations_per_patient'])
+        parser.add_argument('--processes', type=int, help='Worker processes generating the data (default: CPUs)')
+        parser.add_argument('--users', type=int, default=10, help='Users created per role (default: 10)')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per route and role')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per route and role first')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--test-db-name', help='Build the benchmark database in this file instead of '
+                                                   'the backend default (in-memory for SQLite)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against results previously written with --output')
+        parser.add_argument('--tolerance', type=float, default=20.0,
+                            help='Percent p95 slowdown tolerated before a route counts as regressed')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error when any route regressed against the baseline')
+
+    def handle(self, *args, **options):
+        routes_by_name = {route.name for route in ROUTES}
+        for pattern in patientsystem_urls.urlpatterns:
+            name = f'{patientsystem_urls.app_name}:{pattern.name}'
+            if name not in routes_by_name and name not in SKIPPED:
+                self.stderr.write(self.style.WARNING(f'No benchmark recipe for {name}; it will not be measured.'))
+
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'consultations_per_patient': options['consultations_per_patient'],
+                'skipped': SKIPPED,
+                'started': timezone.now().isoformat(),
+            },
+            'results': {},
+        }
+        setup_test_environment()
+        try:
+            for size in options['patients']:
+                report['results'][str(size)] = self.run_size(size, options)
+        finally:
+            teardown_test_environment()
+        report['meta']['max_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                regressions = self.compare(json.load(f), report, options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} route(s) regressed against {options["baseline"]}.')
+
+    def run_size(self, size, options):
+        if options['test_db_name']:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = options['test_db_name']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            started = time.monotonic()
+            ctx = self.build_dataset(size, options)
+            self.stderr.write(f'Built {size} patients in {time.monotonic() - started:.1f}s')
+            results = {}
+            for role in synthetic.ROLES:
+                results[role] = self.run_role(role, ctx, options)
+                self.print_results(size, role, results[role])
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def build_dataset(self, size, options):
+        generated = synthetic.generate(
+            size, seed=options['seed'], users=options['users'], password=PASSWORD,
+            profile={'consultations_per_patient': options['consultations_per_patient']},
+            processes=options['processes'],
+        )
+        user_ids = [user_id for ids in generated['users'].values() for user_id in ids]
+        User.objects.filter(pk__in=user_ids).update(is_staff=True)
+        return {
+            'users': {role: User.objects.get(pk=ids[0]) for role, ids in generated['users'].items()},
+            'patient_ids': list(Patient.objects.values_list('id', flat=True)[:1000]),
+            'alert_ids': list(Alert.objects.values_list('id', flat=True)[:1000]) or [0],
+        }
+
+    def run_role(self, role, ctx, options):
+        rng = random.Random(f"{options['seed']}-{role}")
+        user = ctx['users'][role]
+        ctx = dict(ctx, role=role, username=user.username)
+        logged_in = Client()
+        logged_in.force_login(user)
+        queries = []
+
+        def counting(execute, sql, params, many, context):
+            queries.append(1)
+            return execute(sql, params, many, context)
+
+        def client_for(route):
+            if route.session == 'user':
+                return logged_in
+            client = Client()
+            if route.session == 'fresh':
+                client.force_login(user)
+            return client
+
+        def send(route, client):
+            url = route.url(ctx, rng)
+            data = route.data(ctx, rng) if route.data else None
+            if route.method == 'POST':
+                return client.post(url, data or {})
+            return client.get(url, data or {})
+
+        timings = {route.key: [] for route in ROUTES}
+        query_counts = {route.key: [] for route in ROUTES}
+        statuses = {route.key: set() for route in ROUTES}
+        for iteration in range(options['warmup'] + options['iterations']):
+            for route in ROUTES:
+                client = client_for(route)
+                queries.clear()
+                started = time.perf_counter()
+                with connection.execute_wrapper(counting):
+                    response = send(route, client)
+                elapsed = time.perf_counter() - started
+                if iteration >= options['warmup']:
+                    timings[route.key].append(elapsed)
+                    query_counts[route.key].append(len(queries))
+                    statuses[route.key].add(response.status_code)
+
+        results = {}
+        for route in ROUTES:
+            client = client_for(route)
+            tracemalloc.start()
+            send(route, client)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            values = timings[route.key]
+            results[route.key] = {
+                'p50_ms': round(percentile(values, 50) * 1000, 3),
+                'p95_ms': round(percentile(values, 95) * 1000, 3),
+                'p99_ms': round(percentile(values, 99) * 1000, 3),
+                'mean_ms': round(sum(values) / len(values) * 1000, 3),
+                'queries': round(sum(query_counts[route.key]) / len(values), 2),
+                'max_queries': max(query_counts[route.key]),
+                'peak_kib': round(peak / 1024, 1),
+                'statuses': sorted(statuses[route.key]),
+            }
+        return results
+
+    def print_results(self, size, role, results):
+        self.stdout.write('')
+        self.stdout.write(f'{size} patients, {role}')
+        self.stdout.write(f"{'Route':<48}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'peak KiB':>10}")
+        for key, row in results.items():
+            self.stdout.write(f"{key:<48}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+                              f"{row['queries']:>9.1f}{row['peak_kib']:>10.1f}")
+
+    def compare(self, baseline, report, tolerance):
+        """Print per-route changes against ``baseline``; returns the number of regressions"""
+        regressions = 0
+        self.stdout.write('')
+        self.stdout.write(f"{'Size/role/route':<66}{'p95 ms':>18}{'queries':>14}")
+        for size, roles in report['results'].items():
+            for role, routes in roles.items():
+                for key, row in routes.items():
+                    before = baseline.get('results', {}).get(size, {}).get(role, {}).get(key)
+                    if before is None:
+                        continue
+                    slower = row['p95_ms'] > before['p95_ms'] * (1 + tolerance / 100)
+                    more_queries = row['max_queries'] > before['max_queries']
+                    flag = ' REGRESSED' if slower or more_queries else ''
+                    regressions += bool(flag)
+                    self.stdout.write(
+                        f"{size + ' ' + role + ' ' + key:<66}"
+                        f"{before['p95_ms']:>8.2f} -> {row['p95_ms']:<6.2f}"
+                        f"{before['max_queries']:>5} -> {row['max_queries']:<5}{flag}"
+                    )
+        if regressions:
+            self.stdout.write(self.style.ERROR(f'{regressions} route(s) regressed.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+        return regressions
@@ -0,0 +1,54 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from patientsystem import synthetic
+
+
+class Command(BaseCommand):
+    help = ('Adds deterministic synthetic patients with vitals history, consultations, labs, imaging, '
+            'consents, recent events and rule-generated alerts. Existing data is left untouched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument('--seed', type=int,
+                            help='The same seed, chunk size, profile and anchor always give the same data')
+        parser.add_argument('--profile', help='JSON file overriding entries of synthetic.PROFILE')
+        parser.add_argument('--anchor', help='ISO datetime the generated history ends at '
+                                             '(default: 2024-01-01T00:00Z with --seed, '
+                                             'otherwise the start of the current UTC day)')
+        parser.add_argument('--users', type=int, default=10, help='Users created per role (default: 10)')
+        parser.add_argument('--password', default='synthetic-password', help='Password of the created users')
+        parser.add_argument('--chunk-size', type=int, default=synthetic.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--processes', type=int, help='Worker processes (default: CPUs; 1 disables the pool)')
+
+    def handle(self, *args, **options):
+        profile = {}
+        if options['profile']:
+            with open(options['profile'], encoding='utf-8') as f:
+                profile = json.load(f)
+            unknown = set(profile) - set(synthetic.PROFILE)
+            if unknown:
+                raise CommandError(f'Unknown profile entries: {", ".join(sorted(unknown))}')
+        anchor = None
+        if options['anchor']:
+            anchor = parse_datetime(options['anchor'])
+            if anchor is None or anchor.tzinfo is None:
+                raise CommandError('--anchor must be an ISO datetime with a timezone, e.g. 2024-01-01T00:00Z')
+
+        started = time.monotonic()
+
+        def progress(totals):
+            elapsed = time.monotonic() - started
+            self.stderr.write(f"{totals['patients']} patients ({totals['patients'] / elapsed:.0f}/s)")
+
+        generated = synthetic.generate(
+            options['patients'], seed=options['seed'], profile=profile, anchor=anchor, users=options['users'],
+            password=options['password'], chunk_size=options['chunk_size'], processes=options['processes'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.monotonic() - started
+        rows = ', '.join(f'{count} {name}' for name, count in generated['rows'].items())
+        self.stdout.write(self.style.SUCCESS(f'Generated {rows or "nothing"} in {elapsed:.1f}s'))
@@ -0,0 +1,272 @@
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from patientsystem import tasks, tpa
+from patientsystem.fragment_cache import bump_data_version
+from patientsystem.models import Consultation, Patient, Vitals, VitalsReading
+
+PATIENT_TEXT_FIELDS = [
+    'chief_complaint', 'address', 'phone_number', 'emergency_contact',
+    'medical_history', 'current_medications', 'allergies',
+]
+GENDERS = {'M': 'M', 'MALE': 'M', 'F': 'F', 'FEMALE': 'F', 'O': 'O', 'OTHER': 'O'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(row, key, required=False):
+    value = row.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{key} is required')
+    return value
+
+
+def _number(row, key, cast, required=False):
+    value = row.get(key)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise RowError(f'{key} is required')
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{key} must be a number, got {value!r}')
+
+
+def flatten(record):
+    """Accept the nested {'vitals': {...}, 'consultation': {...}} record shape"""
+    row = {key: value for key, value in record.items() if key not in ('vitals', 'consultation')}
+    row.update(record.get('vitals') or {})
+    for key, value in (record.get('consultation') or {}).items():
+        row[f'consultation_{key}'] = value
+    return row
+
+
+def clean_row(row):
+    """Validate one input row; returns (patient fields, vitals fields, consultation fields or None)"""
+    try:
+        date_of_birth = date.fromisoformat(_text(row, 'date_of_birth', required=True)[:10])
+    except ValueError:
+        raise RowError(f"date_of_birth must be YYYY-MM-DD, got {row.get('date_of_birth')!r}")
+    gender = GENDERS.get(_text(row, 'gender', required=True).upper())
+    if gender is None:
+        raise RowError(f"gender must be M, F or O, got {row.get('gender')!r}")
+
+    systolic = _number(row, 'systolic', int)
+    diastolic = _number(row, 'diastolic', int)
+    if systolic is None and diastolic is None and _text(row, 'blood_pressure'):
+        try:
+            systolic, diastolic = Vitals.parse_blood_pressure(_text(row, 'blood_pressure'))
+        except ValueError:
+            raise RowError(f"blood_pressure must look like 120/80, got {row.get('blood_pressure')!r}")
+    vitals = {
+        'systolic': systolic,
+        'diastolic': diastolic,
+        'blood_pressure': Vitals.format_blood_pressure(systolic, diastolic),
+        'heart_rate': _number(row, 'heart_rate', int, required=True),
+        'oxygen_saturation': _number(row, 'oxygen_saturation', float, required=True),
+        'temperature': _number(row, 'temperature', float, required=True),
+        'respiratory_rate': _number(row, 'respiratory_rate', int),
+        'blood_glucose': _number(row, 'blood_glucose', int),
+    }
+
+    patient = {
+        'hospital_id': _text(row, 'hospital_id'),
+        'first_name': _text(row, 'first_name', required=True),
+        'last_name': _text(row, 'last_name', required=True),
+        'date_of_birth': date_of_birth,
+        'gender': gender,
+        'nihss_score': _number(row, 'nihss_score', int) or 0,
+    }
+    for field in PATIENT_TEXT_FIELDS:
+        patient[field] = _text(row, field)
+
+    consultation = None
+    if _text(row, 'consultation_diagnosis'):
+        onset = _text(row, 'consultation_symptom_onset_time')
+        onset_time = parse_datetime(onset) if onset else None
+        if onset and onset_time is None:
+            raise RowError(f'consultation_symptom_onset_time is not a valid datetime: {onset!r}')
+        if onset_time is not None and timezone.is_naive(onset_time):
+            onset_time = timezone.make_aware(onset_time)
+        consultation = {
+            'diagnosis': _text(row, 'consultation_diagnosis'),
+            'treatment_plan': _text(row, 'consultation_treatment_plan', required=True),
+            'test_orders': _text(row, 'consultation_test_orders'),
+            'symptom_onset_time': onset_time,
+            'nihss_score': _number(row, 'consultation_nihss_score', int) or patient['nihss_score'],
+        }
+    return patient, vitals, consultation
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports patients (with vitals and an optional consultation) from CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path to a .csv/.ndjson file, or "-" for stdin')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: guessed from the file extension, csv for stdin)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per transaction (default: 1000)')
+        parser.add_argument('--checkpoint', help='File recording how many rows have been committed; '
+                                                 'an existing checkpoint resumes after those rows')
+        parser.add_argument('--strict', action='store_true',
+                            help='Abort on the first invalid row instead of skipping it')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        source = options['source']
+        fmt = options['format'] or ('ndjson' if source.endswith(('.ndjson', '.jsonl')) else 'csv')
+        checkpoint = options['checkpoint']
+        skip = self.read_checkpoint(checkpoint, source)
+        if skip:
+            self.stderr.write(f'Resuming after {skip} rows from {checkpoint}')
+
+        stream = sys.stdin if source == '-' else open(source, newline='', encoding='utf-8')
+        try:
+            committed, invalid = self.import_rows(self.read_rows(stream, fmt), skip, options, checkpoint, source)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {committed - skip - invalid} rows ({invalid} invalid or duplicate rows skipped).'
+        ))
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            for line_number, row in enumerate(csv.DictReader(stream), start=2):
+                yield line_number, row
+            return
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'invalid JSON: {e}')
+                continue
+            yield line_number, flatten(record) if isinstance(record, dict) else RowError('expected a JSON object')
+
+    def import_rows(self, rows, skip, options, checkpoint, source):
+        batch_size = options['batch_size']
+        position = 0
+        invalid = 0
+        batch = []
+        started = time.monotonic()
+        for line_number, row in rows:
+            position += 1
+            if position <= skip:
+                continue
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                batch.append((line_number, *clean_row(row)))
+            except RowError as e:
+                if options['strict']:
+                    raise CommandError(f'Line {line_number}: {e}')
+                invalid += 1
+                self.stderr.write(f'Skipping line {line_number}: {e}')
+            if len(batch) >= batch_size:
+                invalid += self.write_batch(batch, position, options['strict'])
+                batch = []
+                self.checkpoint(checkpoint, source, position)
+                self.report_progress(position - skip, invalid, started)
+        if batch:
+            invalid += self.write_batch(batch, position, options['strict'])
+        self.checkpoint(checkpoint, source, position)
+        self.report_progress(position - skip, invalid, started)
+        return position, invalid
+
+    def drop_duplicates(self, batch, strict):
+        """Remove rows whose hospital_id already exists or repeats within the batch; returns the rest"""
+        given = [fields['hospital_id'] for _, fields, _, _ in batch if fields['hospital_id']]
+        seen = set(Patient.objects.filter(hospital_id__in=given).values_list('hospital_id', flat=True))
+        kept = []
+        for row in batch:
+            line_number, fields, _, _ = row
+            hospital_id = fields['hospital_id']
+            if hospital_id and hospital_id in seen:
+                if strict:
+                    raise CommandError(f'Line {line_number}: hospital_id {hospital_id} already exists')
+                self.stderr.write(f'Skipping line {line_number}: hospital_id {hospital_id} already exists')
+                continue
+            seen.add(hospital_id)
+            kept.append(row)
+        return kept
+
+    def write_batch(self, batch, position, strict=False):
+        """Insert one batch of cleaned rows in a single transaction; returns how many duplicates were skipped"""
+        rows = self.drop_duplicates(batch, strict)
+        skipped = len(batch) - len(rows)
+        batch = [(fields, v, c) for _, fields, v, c in rows]
+        if not batch:
+            return skipped
+        # Reserved outside the transaction so the counter row is not held
+        # locked while the batch is written; an aborted batch only leaves a gap.
+        missing = sum(1 for fields, _, _ in batch if not fields['hospital_id'])
+        hospital_ids = iter(Patient.allocate_hospital_ids(missing) if missing else [])
+        try:
+            with transaction.atomic():
+                vitals = Vitals.objects.bulk_create([Vitals(**v) for _, v, _ in batch])
+                patients = []
+                for (fields, _, _), patient_vitals in zip(batch, vitals):
+                    patient = Patient(vitals=patient_vitals, **fields)
+                    patient.hospital_id = patient.hospital_id or next(hospital_ids)
+                    patients.append(patient)
+                patients = Patient.objects.bulk_create(patients)
+                VitalsReading.objects.bulk_create([
+                    VitalsReading.from_vitals(patient, patient.vitals) for patient in patients
+                ])
+
+                with_consultation = [(patient, v, c) for patient, (_, v, c) in zip(patients, batch) if c]
+                if with_consultation:
+                    consultation_vitals = Vitals.objects.bulk_create([Vitals(**v) for _, v, _ in with_consultation])
+                    consultations = Consultation.objects.bulk_create([
+                        Consultation(patient=patient, vitals=snapshot, **fields)
+                        for (patient, _, fields), snapshot in zip(with_consultation, consultation_vitals)
+                    ])
+                    # bulk_create skips the signals that set the tPA status and raise alerts.
+                    tpa.refresh(Consultation.objects.filter(id__in=[c.id for c in consultations]))
+                    for consultation in consultations:
+                        tasks.enqueue('evaluate_alerts', {'consultation_id': consultation.id})
+                # Explicit IDs from the file must never be handed out by the sequence later.
+                Patient.claim_hospital_ids([fields['hospital_id'] for fields, _, _ in batch])
+        except IntegrityError as e:
+            raise CommandError(f'Batch ending at row {position} failed and was rolled back: {e}')
+        bump_data_version()
+        return skipped
+
+    def report_progress(self, rows, invalid, started):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stderr.write(f'{rows} rows processed, {invalid} invalid, {rows / elapsed:,.0f} rows/s')
+
+    def read_checkpoint(self, path, source):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('source') != source:
+            raise CommandError(f"Checkpoint {path} belongs to {state.get('source')!r}, not {source!r}.")
+        return int(state.get('rows', 0))
+
+    def checkpoint(self, path, source, rows):
+        if not path:
+            return
+        # Write-then-rename so an interrupted run never leaves a torn checkpoint.
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': source, 'rows': rows}, f)
+        os.replace(tmp_path, path)
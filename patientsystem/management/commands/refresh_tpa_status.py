@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from patientsystem import tpa
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the stored tPA eligibility of every consultation. Needed once after upgrading and '
+            'after loading data that bypasses model signals; normal edits keep it up to date.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=tpa.REFRESH_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        changed = tpa.refresh_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {changed} consultations in {time.monotonic() - started:.1f}s'))
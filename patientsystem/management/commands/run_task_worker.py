@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from patientsystem import tasks
+
+REQUEUE_INTERVAL = 60
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = ('Runs queued background tasks (alert evaluation and other follow-up work). Any number of '
+            'workers can run side by side.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed at a time (default: 10)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty (default: 1)')
+        parser.add_argument('--once', action='store_true', help='Run the tasks due now, then exit')
+
+    def handle(self, *args, **options):
+        worker = tasks.worker_name()
+        counts = {}
+        last_requeue = last_purge = 0
+        try:
+            while True:
+                close_old_connections()
+                if time.monotonic() - last_requeue >= REQUEUE_INTERVAL:
+                    tasks.requeue_expired()
+                    tasks.check_lag(tasks.queue_lag())
+                    last_requeue = time.monotonic()
+                if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    tasks.purge()
+                    last_purge = time.monotonic()
+                claimed = tasks.claim(worker, options['batch_size'])
+                for task_id in claimed:
+                    status = tasks.run_task(task_id, worker)
+                    counts[status] = counts.get(status, 0) + 1
+                if not claimed:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        summary = ', '.join(f'{count} {status}' for status, count in counts.items() if status)
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} stopped: {summary or "no tasks run"}'))
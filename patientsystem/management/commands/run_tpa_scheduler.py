@@ -0,0 +1,25 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from patientsystem.tpa_scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = ('Runs the tPA window scheduler in the foreground, raising closing-soon and expiry alerts for '
+            'eligible patients as their treatment window runs out. Run one per deployment.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, help='Seconds between data version checks')
+        parser.add_argument('--catch-up', type=int,
+                            help='On start, also alert for windows that closed this many seconds ago')
+
+    def handle(self, *args, **options):
+        if options['verbosity'] > 1:
+            logging.getLogger('patientsystem.tpa_scheduler').setLevel(logging.INFO)
+        scheduler = Scheduler(poll_interval=options['poll_interval'], catch_up=options['catch_up'])
+        self.stdout.write('tPA scheduler running; press Ctrl-C to stop.')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,159 @@
+import json
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from patientsystem.alert_rules import ThresholdRule, registered_rules
+from patientsystem.models import Consultation, LabResults
+
+# How each rule source maps onto columns reachable from a Consultation row.
+SOURCE_PATHS = {
+    'consultation': '{field}',
+    'vitals': 'vitals__{field}',
+    'lab_results': 'lab_{field}',
+}
+
+
+class Command(BaseCommand):
+    help = ('Replays historical consultations against the current alert thresholds and a '
+            'proposed set of overrides, reporting alert volume without creating any alerts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365,
+                            help='How many days of consultation history to replay (default: 365)')
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help='Consultations loaded per query (default: 100000)')
+        parser.add_argument('--set', dest='overrides', action='append', default=[],
+                            metavar='RULE[.FIELD].low|high=VALUE',
+                            help='Proposed threshold, e.g. oxygen_saturation_low.low=94; '
+                                 'use "none" to remove a bound. May be repeated.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        rules = [rule for rule in registered_rules()
+                 if isinstance(rule, ThresholdRule) and rule.source in SOURCE_PATHS]
+        if not rules:
+            raise CommandError('No vectorizable threshold rules are registered.')
+        skipped = [rule.key for rule in registered_rules() if rule not in rules]
+        proposed = self.apply_overrides(rules, options['overrides'])
+
+        columns = sorted({(rule.source, field) for rule in rules for field in rule.limits})
+        since = timezone.now() - timedelta(days=options['days'])
+        data = self.load_columns(columns, since, options['chunk_size'])
+        total = len(data['hour'])
+
+        report = {
+            'consultations': total,
+            'since': since.isoformat(),
+            'skipped_rules': skipped,
+            'rules': [],
+            'types': {},
+            'hours': {'current': [0] * 24, 'proposed': [0] * 24},
+        }
+        for rule in rules:
+            current = self.mask(data, rule, rule.limits, total)
+            candidate = self.mask(data, rule, proposed[rule.key], total)
+            counts = {'current': int(current.sum()), 'proposed': int(candidate.sum())}
+            report['rules'].append({'rule': rule.key, 'type': rule.type, **counts})
+            by_type = report['types'].setdefault(rule.type, {'current': 0, 'proposed': 0})
+            for name, mask in (('current', current), ('proposed', candidate)):
+                by_type[name] += counts[name]
+                hours = np.bincount(data['hour'][mask], minlength=24)
+                report['hours'][name] = [a + int(b) for a, b in zip(report['hours'][name], hours)]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def apply_overrides(self, rules, overrides):
+        limits = {rule.key: dict(rule.limits) for rule in rules}
+        for override in overrides:
+            try:
+                target, raw_value = override.split('=', 1)
+                parts = target.split('.')
+                key, bound = parts[0], parts[-1]
+                field = parts[1] if len(parts) == 3 else None
+                value = None if raw_value.lower() == 'none' else float(raw_value)
+            except ValueError:
+                raise CommandError(f"Invalid threshold override '{override}'.")
+            if key not in limits:
+                raise CommandError(f"'{key}' is not a vectorizable threshold rule.")
+            if field is None:
+                if len(limits[key]) != 1:
+                    raise CommandError(f"Rule '{key}' has several fields; use {key}.FIELD.{bound}=VALUE.")
+                field = next(iter(limits[key]))
+            if field not in limits[key] or bound not in ('low', 'high'):
+                raise CommandError(f"Invalid threshold override '{override}'.")
+            low, high = limits[key][field]
+            limits[key][field] = (value, high) if bound == 'low' else (low, value)
+        return limits
+
+    def load_columns(self, columns, since, chunk_size):
+        """Load the needed columns into NumPy arrays, keyset-paging by primary key"""
+        queryset = Consultation.objects.filter(date__gte=since).annotate(hour=ExtractHour('date'))
+        lab_fields = {field for source, field in columns if source == 'lab_results'}
+        if lab_fields:
+            latest_labs = LabResults.objects.filter(consultation=OuterRef('pk')).order_by('-id')
+            queryset = queryset.annotate(**{
+                f'lab_{field}': Subquery(latest_labs.values(field)[:1]) for field in lab_fields
+            })
+        paths = [SOURCE_PATHS[source].format(field=field) for source, field in columns]
+
+        chunks = {column: [] for column in columns}
+        hours = []
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'hour', *paths)[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            block = np.array([row[1:] for row in rows], dtype=float)
+            hours.append(block[:, 0].astype(np.int64))
+            for i, column in enumerate(columns, start=1):
+                chunks[column].append(block[:, i])
+            self.stderr.write(f'Loaded {sum(len(h) for h in hours)} consultations...', ending='\r')
+        self.stderr.write('')
+
+        data = {column: np.concatenate(parts) if parts else np.empty(0) for column, parts in chunks.items()}
+        data['hour'] = np.concatenate(hours) if hours else np.empty(0, dtype=np.int64)
+        return data
+
+    def mask(self, data, rule, limits, total):
+        # NaN (missing value) compares False, matching ThresholdRule skipping None.
+        fired = np.zeros(total, dtype=bool)
+        for field, (low, high) in limits.items():
+            values = data[(rule.source, field)]
+            if rule.skip_zero:
+                values = np.where(values == 0, np.nan, values)
+            if low is not None:
+                fired |= values < low
+            if high is not None:
+                fired |= values > high
+        return fired
+
+    def print_report(self, report):
+        self.stdout.write(f"Replayed {report['consultations']} consultations since {report['since']}")
+        self.stdout.write('')
+        self.stdout.write(f"{'Rule':<28}{'Type':<10}{'Current':>10}{'Proposed':>10}{'Change':>10}")
+        for row in report['rules']:
+            self.stdout.write(f"{row['rule']:<28}{row['type']:<10}{row['current']:>10}"
+                              f"{row['proposed']:>10}{row['proposed'] - row['current']:>+10}")
+        self.stdout.write('')
+        self.stdout.write(f"{'Type':<38}{'Current':>10}{'Proposed':>10}{'Change':>10}")
+        for alert_type, counts in report['types'].items():
+            self.stdout.write(f"{alert_type:<38}{counts['current']:>10}{counts['proposed']:>10}"
+                              f"{counts['proposed'] - counts['current']:>+10}")
+        self.stdout.write('')
+        self.stdout.write(f"{'Hour':<38}{'Current':>10}{'Proposed':>10}{'Change':>10}")
+        for hour, (current, proposed) in enumerate(zip(report['hours']['current'],
+                                                       report['hours']['proposed'])):
+            self.stdout.write(f"{hour:02d}:00{'':<33}{current:>10}{proposed:>10}{proposed - current:>+10}")
+        if report['skipped_rules']:
+            self.stdout.write('')
+            self.stdout.write('Not simulated (not plain thresholds): ' + ', '.join(report['skipped_rules']))
@@ -0,0 +1,283 @@
+"""
+Per-view request, latency and SQL metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request and counts the SQL it runs through
+``connection.execute_wrapper``, keyed by the resolved URL name. Each process
+accumulates into an in-memory registry and, when ``METRICS_DIR`` is set,
+periodically writes a snapshot to ``<METRICS_DIR>/metrics-<pid>.json``. The
+``/metrics`` view merges every snapshot in the directory, so the totals cover
+all gunicorn workers. Files left by exited workers are kept on purpose:
+Prometheus counters must never go backwards. The background task queue
+gauges are read from the tasks table at export time.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import fragment_cache
+from .tasks import check_lag, queue_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 5
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+class Registry:
+    """Metrics recorded by this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.views = {}
+        self.transactions = {}
+        self.last_flush = 0
+
+    def observe(self, view, method, status, duration, queries, sql_seconds):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked from a process that had already recorded requests.
+                self.reset()
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = {
+                    'requests': {}, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                    'duration_sum': 0.0, 'queries': 0, 'sql_seconds': 0.0,
+                }
+            key = f'{method} {status}'
+            stats['requests'][key] = stats['requests'].get(key, 0) + 1
+            stats['buckets'][_bucket_index(duration)] += 1
+            stats['duration_sum'] += duration
+            stats['queries'] += queries
+            stats['sql_seconds'] += sql_seconds
+            due = time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def observe_transaction(self, name, duration, commit):
+        """Record a write transaction: its total duration and the time its COMMIT took"""
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            stats = self.transactions.get(name)
+            if stats is None:
+                stats = self.transactions[name] = {
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'duration_sum': 0.0,
+                    'commit_buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'commit_sum': 0.0,
+                }
+            stats['buckets'][_bucket_index(duration)] += 1
+            stats['duration_sum'] += duration
+            stats['commit_buckets'][_bucket_index(commit)] += 1
+            stats['commit_sum'] += commit
+            due = time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            views = json.loads(json.dumps(self.views))
+            transactions = json.loads(json.dumps(self.transactions))
+        cache_stats = fragment_cache.stats()
+        return {
+            'pid': os.getpid(),
+            'views': views,
+            'transactions': transactions,
+            'fragment_cache': {key: value for key, value in cache_stats.items() if key != 'hit_ratio'},
+        }
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR, if configured"""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        self.last_flush = time.monotonic()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+def _bucket_index(duration):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if duration <= bound:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+def collect():
+    """Return the snapshots of every process (just this one without METRICS_DIR)"""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return [registry.snapshot()]
+    registry.flush()
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge(snapshots):
+    views = {}
+    transactions = {}
+    cache_stats = {}
+    for snapshot in snapshots:
+        for view, stats in snapshot['views'].items():
+            total = views.setdefault(view, {
+                'requests': {}, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                'duration_sum': 0.0, 'queries': 0, 'sql_seconds': 0.0,
+            })
+            for key, count in stats['requests'].items():
+                total['requests'][key] = total['requests'].get(key, 0) + count
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+            for key in ('duration_sum', 'queries', 'sql_seconds'):
+                total[key] += stats[key]
+        for name, stats in snapshot.get('transactions', {}).items():
+            total = transactions.setdefault(name, {
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'duration_sum': 0.0,
+                'commit_buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'commit_sum': 0.0,
+            })
+            for key in ('buckets', 'commit_buckets'):
+                total[key] = [a + b for a, b in zip(total[key], stats[key])]
+            for key in ('duration_sum', 'commit_sum'):
+                total[key] += stats[key]
+        for key, value in snapshot.get('fragment_cache', {}).items():
+            cache_stats[key] = cache_stats.get(key, 0) + value
+    return views, cache_stats, transactions
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def export():
+    """Return the merged metrics of all processes in Prometheus text format"""
+    task_queue = queue_stats()
+    check_lag(task_queue['lag'])
+    return render(*merge(collect()), task_queue=task_queue)
+
+
+def _histogram(name, label, buckets, total):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{label}}} {total:.6f}')
+    lines.append(f'{name}_count{{{label}}} {cumulative}')
+    return lines
+
+
+def render(views, cache_stats, transactions=None, task_queue=None):
+    """Format merged metrics in the Prometheus text exposition format"""
+    lines = [
+        '# HELP stroke_http_requests_total Requests handled, by view, method and status.',
+        '# TYPE stroke_http_requests_total counter',
+    ]
+    for view, stats in sorted(views.items()):
+        for key, count in sorted(stats['requests'].items()):
+            method, status = key.split(' ', 1)
+            lines.append(f'stroke_http_requests_total{{view="{_label(view)}",method="{_label(method)}",'
+                         f'status="{_label(status)}"}} {count}')
+
+    lines += [
+        '# HELP stroke_http_request_duration_seconds Request latency by view.',
+        '# TYPE stroke_http_request_duration_seconds histogram',
+    ]
+    for view, stats in sorted(views.items()):
+        lines += _histogram('stroke_http_request_duration_seconds', f'view="{_label(view)}"',
+                            stats['buckets'], stats['duration_sum'])
+
+    lines += [
+        '# HELP stroke_db_queries_total SQL queries executed while handling requests, by view.',
+        '# TYPE stroke_db_queries_total counter',
+    ]
+    lines += [f'stroke_db_queries_total{{view="{_label(view)}"}} {stats["queries"]}'
+              for view, stats in sorted(views.items())]
+    lines += [
+        '# HELP stroke_db_query_duration_seconds_total Time spent executing SQL, by view.',
+        '# TYPE stroke_db_query_duration_seconds_total counter',
+    ]
+    lines += [f'stroke_db_query_duration_seconds_total{{view="{_label(view)}"}} {stats["sql_seconds"]:.6f}'
+              for view, stats in sorted(views.items())]
+
+    for key, value in sorted(cache_stats.items()):
+        name = f'stroke_fragment_cache_{key}_total'
+        lines += [f'# TYPE {name} counter', f'{name} {value}']
+
+    if transactions:
+        lines += [
+            '# HELP stroke_db_transaction_duration_seconds Duration of multi-table write transactions.',
+            '# TYPE stroke_db_transaction_duration_seconds histogram',
+        ]
+        for name, stats in sorted(transactions.items()):
+            lines += _histogram('stroke_db_transaction_duration_seconds', f'transaction="{_label(name)}"',
+                                stats['buckets'], stats['duration_sum'])
+        lines += [
+            '# HELP stroke_db_commit_duration_seconds Time taken by the COMMIT of those transactions.',
+            '# TYPE stroke_db_commit_duration_seconds histogram',
+        ]
+        for name, stats in sorted(transactions.items()):
+            lines += _histogram('stroke_db_commit_duration_seconds', f'transaction="{_label(name)}"',
+                                stats['commit_buckets'], stats['commit_sum'])
+
+    if task_queue is not None:
+        # Read from the tasks table, so shared by every process.
+        lines += [
+            '# HELP stroke_task_queue_tasks Background tasks by status (finished tasks are purged).',
+            '# TYPE stroke_task_queue_tasks gauge',
+        ]
+        lines += [f'stroke_task_queue_tasks{{status="{status}"}} {task_queue[status]}'
+                  for status in ('queued', 'running', 'failed')]
+        lines += [
+            '# HELP stroke_task_queue_lag_seconds Age of the oldest task due to run.',
+            '# TYPE stroke_task_queue_lag_seconds gauge',
+            f'stroke_task_queue_lag_seconds {task_queue["lag"]:.3f}',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Record latency and SQL usage for every request; keep it first in MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql = {'queries': 0, 'seconds': 0.0}
+
+        def count_sql(execute, sql_text, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql_text, params, many, context)
+            finally:
+                sql['queries'] += 1
+                sql['seconds'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_sql))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED_VIEW
+        registry.observe(view, request.method, response.status_code, duration, sql['queries'], sql['seconds'])
+        return response
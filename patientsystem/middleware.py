@@ -0,0 +1,92 @@
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserProfile
+
+DEFAULT_ROLE = 'technician'
+DEFAULT_ROLE_CACHE_CHECK = 5
+ROLE_VERSION_KEY = 'patientsystem:role_version'
+
+
+class _RoleCache:
+    """Roles by user id, kept in this process and dropped when the shared role version changes"""
+
+    def __init__(self):
+        self.roles = {}
+        self.version = None
+        self.checked_at = None
+
+    def current(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'ROLE_CACHE_CHECK_INTERVAL', DEFAULT_ROLE_CACHE_CHECK)
+        if self.checked_at is None or now - self.checked_at >= interval:
+            version = cache.get(ROLE_VERSION_KEY)
+            if version is None:
+                cache.add(ROLE_VERSION_KEY, secrets.token_hex(8), None)
+                version = cache.get(ROLE_VERSION_KEY)
+            if version != self.version:
+                self.roles = {}
+                self.version = version
+            self.checked_at = now
+        return self.roles
+
+
+_role_cache = _RoleCache()
+
+
+def get_role(user):
+    """Return the role of ``user`` (None when anonymous), reading the profile only on a cache miss"""
+    if not user.is_authenticated:
+        return None
+    roles = _role_cache.current()
+    role = roles.get(user.pk)
+    if role is None:
+        # Users created outside the sign-up flow may not have a profile yet.
+        profile, created = UserProfile.objects.get_or_create(user=user, defaults={'role': DEFAULT_ROLE})
+        role = roles[user.pk] = profile.role
+    return role
+
+
+def _bump_role_version(user_id):
+    _role_cache.roles.pop(user_id, None)
+    cache.set(ROLE_VERSION_KEY, secrets.token_hex(8), None)
+
+
+def invalidate_role(user_id):
+    """Drop ``user_id``'s role here now, and in every process once the change commits"""
+    _role_cache.roles.pop(user_id, None)
+    # Again after the commit, in case a request reloaded the old role in between.
+    transaction.on_commit(lambda: _bump_role_version(user_id))
+
+
+def request_role(request):
+    """The role resolved by RoleMiddleware, resolving it here if the middleware did not run"""
+    if not hasattr(request, 'role'):
+        request.role = get_role(request.user)
+    return request.role
+
+
+class RoleMiddleware:
+    """
+    Resolve the signed-in user's role once per request as ``request.role``.
+
+    Roles are kept per user id in each process, so steady-state requests
+    never query ``UserProfile`` or the cache. Saving or deleting a profile
+    drops the role in the process that did it and bumps a role version in the
+    shared cache (see ``CACHES``); every other process reads that version at
+    most every ``ROLE_CACHE_CHECK_INTERVAL`` seconds and starts over when it
+    changed, so a role change or revocation reaches all workers within that
+    interval.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role = get_role(request.user)
+        return self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0008_consultation_symptom_onset_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['updated_at', 'id'], name='patient_updated_at_id_idx'),
+        ),
+    ]
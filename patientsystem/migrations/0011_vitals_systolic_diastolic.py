@@ -0,0 +1,58 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:07
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_systolic_diastolic(apps, schema_editor):
+    Vitals = apps.get_model('patientsystem', 'Vitals')
+    last_id = 0
+    while True:
+        batch = list(Vitals.objects.filter(id__gt=last_id).order_by('id')
+                     .only('id', 'blood_pressure')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for vitals in batch:
+            try:
+                systolic, diastolic = (int(part) for part in vitals.blood_pressure.split('/'))
+            except (ValueError, AttributeError):
+                continue
+            vitals.systolic, vitals.diastolic = systolic, diastolic
+            vitals.blood_pressure = f"{systolic}/{diastolic}"
+        Vitals.objects.bulk_update(batch, ['systolic', 'diastolic', 'blood_pressure'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0010_alert_deduplication'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vitals',
+            name='diastolic',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vitals',
+            name='systolic',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vitals',
+            name='blood_pressure',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(backfill_systolic_diastolic, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vitals',
+            index=models.Index(fields=['systolic'], name='vitals_systolic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitals',
+            index=models.Index(fields=['diastolic'], name='vitals_diastolic_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:09
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+
+def seed_hospital_id_sequence(apps, schema_editor):
+    Patient = apps.get_model('patientsystem', 'Patient')
+    IdSequence = apps.get_model('patientsystem', 'IdSequence')
+    last_value = 1000
+    # Longest first, then highest: "P-10000" sorts below "P-9999" as text.
+    latest = (Patient.objects.exclude(hospital_id='')
+              .annotate(id_length=Length('hospital_id'))
+              .order_by('-id_length', '-hospital_id')
+              .values_list('hospital_id', flat=True)
+              .first())
+    if latest:
+        try:
+            last_value = max(last_value, int(latest.split('-')[1]))
+        except (IndexError, ValueError):
+            pass
+    IdSequence.objects.update_or_create(name='hospital_id', defaults={'last_value': last_value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0011_vitals_systolic_diastolic'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_hospital_id_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+FIELDS = ['systolic', 'diastolic', 'heart_rate', 'oxygen_saturation',
+          'temperature', 'respiratory_rate', 'blood_glucose']
+
+
+def _copy_in_batches(queryset, VitalsReading, time_field):
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id')
+                    .values('id', 'patient_id', time_field, *[f'vitals__{f}' for f in FIELDS])[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        VitalsReading.objects.bulk_create([
+            VitalsReading(patient_id=row['patient_id'], recorded_at=row[time_field],
+                          **{f: row[f'vitals__{f}'] for f in FIELDS})
+            for row in rows
+        ])
+
+
+def backfill_vitals_readings(apps, schema_editor):
+    Consultation = apps.get_model('patientsystem', 'Consultation')
+    Patient = apps.get_model('patientsystem', 'Patient')
+    VitalsReading = apps.get_model('patientsystem', 'VitalsReading')
+    # Every consultation snapshot is a reading taken at the consultation...
+    _copy_in_batches(Consultation.objects.all(), VitalsReading, 'date')
+    # ...and a patient's current vitals only add one if they are not such a snapshot.
+    patients = Patient.objects.exclude(vitals_id__in=Consultation.objects.values('vitals_id'))
+    _copy_in_batches(patients.annotate(patient_id=models.F('id')), VitalsReading, 'updated_at')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0012_idsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalsReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('systolic', models.IntegerField(blank=True, null=True)),
+                ('diastolic', models.IntegerField(blank=True, null=True)),
+                ('heart_rate', models.IntegerField(blank=True, null=True)),
+                ('oxygen_saturation', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('respiratory_rate', models.IntegerField(blank=True, null=True)),
+                ('blood_glucose', models.IntegerField(blank=True, null=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vitals_readings', to='patientsystem.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'recorded_at'], name='vitalsreading_patient_time_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_vitals_readings, migrations.RunPython.noop),
+    ]
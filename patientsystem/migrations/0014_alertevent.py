@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0013_vitalsreading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('repeated', 'Repeated'), ('acknowledged', 'Acknowledged')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='patientsystem.alert')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0014_alertevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['acknowledged', 'timestamp'], name='alert_ack_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['patient', 'timestamp'], name='alert_patient_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['type', 'timestamp'], name='alert_type_timestamp_idx'),
+        ),
+    ]
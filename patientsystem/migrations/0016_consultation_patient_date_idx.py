@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0015_alert_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['patient', 'date'], name='consultation_patient_date_idx'),
+        ),
+    ]
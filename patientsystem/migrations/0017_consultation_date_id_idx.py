@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0016_consultation_patient_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['date', 'id'], name='consultation_date_id_idx'),
+        ),
+    ]
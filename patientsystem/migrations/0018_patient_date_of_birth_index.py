@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0017_consultation_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patient',
+            name='date_of_birth',
+            field=models.DateField(db_index=True),
+        ),
+    ]
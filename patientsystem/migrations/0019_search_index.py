@@ -0,0 +1,95 @@
+from django.db import migrations
+
+# Searched columns per table; patientsystem/search.py queries the same set.
+SEARCHED_COLUMNS = {
+    'patientsystem_patient': ['chief_complaint', 'medical_history', 'current_medications', 'allergies'],
+    'patientsystem_consultation': ['diagnosis', 'treatment_plan'],
+    'patientsystem_imagingstudy': ['findings'],
+}
+
+
+def sqlite_statements(table, columns):
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='id', "
+        f"tokenize='porter unicode61 remove_diacritics 2')",
+        *sqlite_trigger_statements(table, columns),
+        # Index the rows that already exist.
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def sqlite_trigger_statements(table, columns):
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+    ]
+
+
+def restore_search_triggers(*tables):
+    """
+    A RunPython function recreating the sync triggers of ``tables``.
+
+    On SQLite, adding or altering a column rebuilds the table, which drops its
+    triggers; migrations that do so to a searched table must run this after
+    the change (and before it, in reverse). The index is rebuilt as well to
+    pick up rows written in between.
+    """
+    def restore(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for table in tables:
+            fts = f'{table}_fts'
+            for suffix in ('insert', 'delete', 'update'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            for statement in sqlite_trigger_statements(table, SEARCHED_COLUMNS[table]):
+                schema_editor.execute(statement)
+            schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return restore
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, columns in SEARCHED_COLUMNS.items():
+        if vendor == 'sqlite':
+            for statement in sqlite_statements(table, columns):
+                schema_editor.execute(statement)
+        elif vendor == 'postgresql':
+            for column in columns:
+                schema_editor.execute(
+                    f"CREATE INDEX {table}_{column}_search ON {table} "
+                    f"USING GIN (to_tsvector('english', {column}))"
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, columns in SEARCHED_COLUMNS.items():
+        if vendor == 'sqlite':
+            for suffix in ('insert', 'delete', 'update'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+        elif vendor == 'postgresql':
+            for column in columns:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0018_patient_date_of_birth_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:40
+
+import re
+import unicodedata
+from importlib import import_module
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Adding the columns rebuilds the patient table on SQLite, dropping its search triggers.
+restore_search_triggers = import_module(
+    'patientsystem.migrations.0019_search_index').restore_search_triggers('patientsystem_patient')
+
+
+def name_key(value):
+    # Frozen copy of patientsystem.models.name_key.
+    decomposed = unicodedata.normalize('NFKD', value or '').replace('-', ' ')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^\w\s]', '', stripped).casefold().split())
+
+
+def backfill_name_keys(apps, schema_editor):
+    Patient = apps.get_model('patientsystem', 'Patient')
+    last_id = 0
+    while True:
+        batch = list(Patient.objects.filter(id__gt=last_id).order_by('id')
+                     .only('id', 'first_name', 'last_name')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for patient in batch:
+            patient.first_name_key = name_key(patient.first_name)
+            patient.last_name_key = name_key(patient.last_name)
+        Patient.objects.bulk_update(batch, ['first_name_key', 'last_name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0019_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='patient',
+            name='first_name_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='last_name_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name_key', 'first_name_key', 'id'], name='patient_last_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['first_name_key', 'last_name_key', 'id'], name='patient_first_name_key_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:45
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Adding the columns rebuilds the consultation table on SQLite, dropping its search triggers.
+restore_search_triggers = import_module(
+    'patientsystem.migrations.0019_search_index').restore_search_triggers('patientsystem_consultation')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patientsystem', '0020_patient_name_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='consultation',
+            name='tpa_blocking_reasons',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='consultation',
+            name='tpa_eligible',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='consultation',
+            name='tpa_window_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(condition=models.Q(('tpa_eligible', True)), fields=['tpa_window_expires_at', 'id'], name='consultation_tpa_worklist_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
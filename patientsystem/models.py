@@ -1,21 +1,196 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, Max, Min, Value, When
+from django.db.models.functions import ExtractYear, Greatest
 from django.contrib.auth.models import User
-from datetime import datetime
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+import re
+import unicodedata
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from .fragment_cache import bump_data_version, bump_patient_version
+
+class VitalsQuerySet(models.QuerySet):
+    def hypertensive(self, systolic=185, diastolic=110):
+        """Vitals with systolic above ``systolic`` or diastolic above ``diastolic``"""
+        return self.filter(models.Q(systolic__gt=systolic) | models.Q(diastolic__gt=diastolic))
 
 class Vitals(models.Model):
-    blood_pressure = models.CharField(max_length=20)
+    MEASUREMENT_FIELDS = [
+        'systolic', 'diastolic', 'heart_rate', 'oxygen_saturation',
+        'temperature', 'respiratory_rate', 'blood_glucose',
+    ]
+    # Saved together, since each is derived from the others.
+    BLOOD_PRESSURE_FIELDS = {'systolic', 'diastolic', 'blood_pressure'}
+    
+    systolic = models.IntegerField(null=True, blank=True)
+    diastolic = models.IntegerField(null=True, blank=True)
+    # Display value derived from systolic/diastolic on save, e.g. "120/80".
+    blood_pressure = models.CharField(max_length=20, blank=True)
     heart_rate = models.IntegerField()
     oxygen_saturation = models.FloatField()
     temperature = models.FloatField()
     blood_glucose = models.IntegerField(null=True, blank=True)
     respiratory_rate = models.IntegerField(null=True, blank=True)
     
+    objects = VitalsQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['systolic'], name='vitals_systolic_idx'),
+            models.Index(fields=['diastolic'], name='vitals_diastolic_idx'),
+        ]
+    
+    @staticmethod
+    def parse_blood_pressure(value):
+        """Split a "systolic/diastolic" string into two ints; raises ValueError"""
+        systolic, diastolic = str(value).split('/')
+        return int(systolic), int(diastolic)
+    
+    @staticmethod
+    def format_blood_pressure(systolic, diastolic):
+        if systolic is None or diastolic is None:
+            return ''
+        return f"{systolic}/{diastolic}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() can tell an edited blood_pressure string from the stored one.
+        instance._saved_blood_pressure = instance.__dict__.get('blood_pressure')
+        return instance
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._saved_blood_pressure = self.__dict__.get('blood_pressure')
+    
+    def save(self, *args, **kwargs):
+        # Older callers still write blood_pressure="120/80": a new or edited
+        # string is split into systolic/diastolic, otherwise those win.
+        saved = getattr(self, '_saved_blood_pressure', None)
+        if self.blood_pressure and self.blood_pressure != saved and (
+                saved is not None or (self.systolic is None and self.diastolic is None)):
+            self.systolic, self.diastolic = self.parse_blood_pressure(self.blood_pressure)
+        self.blood_pressure = self.format_blood_pressure(self.systolic, self.diastolic)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.BLOOD_PRESSURE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | self.BLOOD_PRESSURE_FIELDS
+        super().save(*args, **kwargs)
+        self._saved_blood_pressure = self.blood_pressure
+    
     def __str__(self):
         return f"BP: {self.blood_pressure}, HR: {self.heart_rate}, O2: {self.oxygen_saturation}%, Temp: {self.temperature}°C, RR: {self.respiratory_rate}"
 
+class IdSequence(models.Model):
+    """Named counter handing out consecutive numbers without races"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+    
+    @classmethod
+    def reserve(cls, name, count=1, start=1):
+        """
+        Atomically reserve ``count`` consecutive numbers from sequence ``name``.
+        
+        The increment is a single UPDATE, so concurrent callers are serialized
+        by the row lock and never receive overlapping ranges. A missing
+        sequence is created so that its first number is ``start``.
+        """
+        if count < 1:
+            raise ValueError('count must be at least 1')
+        sequence = cls.objects.filter(name=name)
+        with transaction.atomic():
+            if not sequence.update(last_value=F('last_value') + count):
+                cls.objects.bulk_create([cls(name=name, last_value=start - 1)], ignore_conflicts=True)
+                sequence.update(last_value=F('last_value') + count)
+            last_value = sequence.values_list('last_value', flat=True).get()
+        return range(last_value - count + 1, last_value + 1)
+    
+    @classmethod
+    def advance(cls, name, value):
+        """Move sequence ``name`` past ``value`` if it is not already, e.g. after numbers were assigned by hand"""
+        sequence = cls.objects.filter(name=name)
+        if not sequence.update(last_value=Greatest(F('last_value'), value)):
+            cls.objects.bulk_create([cls(name=name, last_value=value)], ignore_conflicts=True)
+            sequence.update(last_value=Greatest(F('last_value'), value))
+
+HOSPITAL_ID_PATTERN = re.compile(r'P-(\d+)')
+
+def years_before(day, years):
+    """The same calendar day ``years`` earlier (29 February becomes the 28th)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+def age_range(min_age=None, max_age=None, today=None):
+    """A Q object matching patients aged ``min_age`` to ``max_age`` years inclusive"""
+    today = today or timezone.localdate()
+    condition = models.Q()
+    if min_age is not None:
+        condition &= models.Q(date_of_birth__lte=years_before(today, min_age))
+    if max_age is not None:
+        condition &= models.Q(date_of_birth__gt=years_before(today, max_age + 1))
+    return condition
+
+def name_key(value):
+    """Case- and accent-folded form of a name, used for prefix lookups"""
+    decomposed = unicodedata.normalize('NFKD', value or '').replace('-', ' ')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^\w\s]', '', stripped).casefold().split())
+
+def prefix_range(prefix):
+    """(low, high) bounds of the strings starting with ``prefix``, for an indexed range scan"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class PatientQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), which is where the name keys are normally set.
+        objs = list(objs)
+        for obj in objs:
+            obj.set_name_keys()
+        created = super().bulk_create(objs, *args, **kwargs)
+        transaction.on_commit(bump_patient_version)
+        return created
+    
+    def name_prefix(self, field, prefix):
+        """Patients whose ``first_name_key`` or ``last_name_key`` starts with the folded ``prefix``"""
+        low, high = prefix_range(name_key(prefix))
+        return self.filter(**{f'{field}__gte': low, f'{field}__lt': high})
+    
+    def with_age(self, today=None):
+        """Annotate ``age_years``, the age in whole years computed by the database"""
+        today = today or timezone.localdate()
+        birthday_ahead = (
+            models.Q(date_of_birth__month__gt=today.month)
+            | models.Q(date_of_birth__month=today.month, date_of_birth__day__gt=today.day)
+        )
+        return self.annotate(age_years=ExpressionWrapper(
+            Value(today.year) - ExtractYear('date_of_birth')
+            - Case(When(birthday_ahead, then=Value(1)), default=Value(0)),
+            output_field=models.IntegerField(),
+        ))
+    
+    def age_between(self, min_age=None, max_age=None, today=None):
+        """
+        Patients aged ``min_age`` to ``max_age`` years inclusive (either may be None).
+        
+        Ages are turned into a date_of_birth range, so this is an indexed range scan.
+        """
+        return self.filter(age_range(min_age, max_age, today))
+    
+    def order_by_age(self, descending=False):
+        """Youngest first (oldest first with ``descending``), using the date_of_birth index"""
+        if descending:
+            return self.order_by('date_of_birth', 'id')
+        return self.order_by('-date_of_birth', '-id')
+
 class Patient(models.Model):
+    HOSPITAL_ID_SEQUENCE = 'hospital_id'
+    FIRST_HOSPITAL_NUMBER = 1001
+    
     GENDER_CHOICES = [
         ('M', 'Male'),
         ('F', 'Female'),
@@ -25,7 +200,10 @@ class Patient(models.Model):
     hospital_id = models.CharField(max_length=10, unique=True, blank=True)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
-    date_of_birth = models.DateField()
+    # Folded copies of the names (see name_key) for indexed prefix lookups.
+    first_name_key = models.CharField(max_length=100, blank=True, editable=False)
+    last_name_key = models.CharField(max_length=100, blank=True, editable=False)
+    date_of_birth = models.DateField(db_index=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     chief_complaint = models.TextField(blank=True)
     address = models.TextField(blank=True)
@@ -40,15 +218,38 @@ class Patient(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PatientQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated dashboard listing (newest first).
+            models.Index(fields=['updated_at', 'id'], name='patient_updated_at_id_idx'),
+            # Back autocomplete by last name, then by first name.
+            models.Index(fields=['last_name_key', 'first_name_key', 'id'], name='patient_last_name_key_idx'),
+            models.Index(fields=['first_name_key', 'last_name_key', 'id'], name='patient_first_name_key_idx'),
+        ]
+    
+    @classmethod
+    def allocate_hospital_ids(cls, count=1):
+        """Reserve ``count`` hospital IDs (P-1001, P-1002, ..., P-10000, ...) in one step"""
+        numbers = IdSequence.reserve(cls.HOSPITAL_ID_SEQUENCE, count, start=cls.FIRST_HOSPITAL_NUMBER)
+        return [f"P-{number:04d}" for number in numbers]
+    
+    @classmethod
+    def claim_hospital_ids(cls, hospital_ids):
+        """Advance the hospital ID sequence past explicitly assigned IDs so it never hands them out again"""
+        numbers = [int(match[1]) for match in map(HOSPITAL_ID_PATTERN.fullmatch, hospital_ids) if match]
+        if numbers:
+            IdSequence.advance(cls.HOSPITAL_ID_SEQUENCE, max(numbers))
+    
+    def set_name_keys(self):
+        self.first_name_key = name_key(self.first_name)
+        self.last_name_key = name_key(self.last_name)
+    
     def save(self, *args, **kwargs):
         if not self.hospital_id:
-            # Generate hospital ID if not set
-            last_patient = Patient.objects.order_by('-id').first()
-            if last_patient and last_patient.hospital_id:
-                last_number = int(last_patient.hospital_id.split('-')[1])
-                self.hospital_id = f"P-{last_number + 1:04d}"
-            else:
-                self.hospital_id = "P-1001"
+            self.hospital_id = self.allocate_hospital_ids(1)[0]
+        self.set_name_keys()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -60,7 +261,10 @@ class Patient(models.Model):
         
     @property
     def age(self):
-        today = datetime.now()
+        # Querysets built with with_age() have already computed it in SQL.
+        if 'age_years' in self.__dict__:
+            return self.age_years
+        today = timezone.localdate()
         return today.year - self.date_of_birth.year - ((today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
         
     @property
@@ -76,6 +280,22 @@ class Consultation(models.Model):
     test_orders = models.TextField(blank=True)
     vitals = models.OneToOneField(Vitals, on_delete=models.CASCADE)
     nihss_score = models.IntegerField()
+    # Materialized by patientsystem.tpa whenever an input changes; eligible
+    # means no contraindication, and the window is open until the expiry time.
+    tpa_eligible = models.BooleanField(default=False, editable=False)
+    tpa_blocking_reasons = models.JSONField(default=list, blank=True, editable=False)
+    tpa_window_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    TPA_WINDOW = timedelta(hours=4.5)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date'], name='consultation_patient_date_idx'),
+            models.Index(fields=['date', 'id'], name='consultation_date_id_idx'),
+            # Only eligible consultations, in order of their window closing.
+            models.Index(fields=['tpa_window_expires_at', 'id'], condition=models.Q(tpa_eligible=True),
+                         name='consultation_tpa_worklist_idx'),
+        ]
     
     def __str__(self):
         return f"Consultation for {self.patient.name} on {self.date}"
@@ -84,8 +304,22 @@ class Consultation(models.Model):
     def within_tpa_window(self):
         if not self.symptom_onset_time:
             return None
-        time_diff = self.date - self.symptom_onset_time
-        return time_diff.total_seconds() <= 16200  # 4.5 hours in seconds
+        return self.date - self.symptom_onset_time <= self.TPA_WINDOW
+
+class AlertQuerySet(models.QuerySet):
+    def acknowledge(self, user, now=None):
+        """Acknowledge the open alerts in this queryset with one UPDATE; returns their ids"""
+        now = now or timezone.now()
+        with transaction.atomic():
+            ids = list(self.filter(acknowledged=False).select_for_update().values_list('id', flat=True))
+            if not ids:
+                return []
+            Alert.objects.filter(id__in=ids, acknowledged=False).update(
+                acknowledged=True, acknowledged_by=user, acknowledged_at=now,
+            )
+            AlertEvent.objects.bulk_create([AlertEvent(alert_id=alert_id, kind='acknowledged') for alert_id in ids])
+            transaction.on_commit(bump_data_version)
+        return ids
 
 class Alert(models.Model):
     ALERT_TYPES = [
@@ -101,6 +335,28 @@ class Alert(models.Model):
     acknowledged = models.BooleanField(default=False)
     acknowledged_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='acknowledged_alerts')
     acknowledged_at = models.DateTimeField(null=True, blank=True)
+    rule_key = models.CharField(max_length=50, blank=True)
+    # Identifies (patient, rule) while the alert is open; cleared once the
+    # suppression window lapses so a fresh alert can be raised.
+    fingerprint = models.CharField(max_length=40, null=True, blank=True, editable=False)
+    occurrences = models.PositiveIntegerField(default=1)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    
+    objects = AlertQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['acknowledged', 'timestamp'], name='alert_ack_timestamp_idx'),
+            models.Index(fields=['patient', 'timestamp'], name='alert_patient_timestamp_idx'),
+            models.Index(fields=['type', 'timestamp'], name='alert_type_timestamp_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                condition=models.Q(acknowledged=False),
+                name='alert_open_fingerprint_unique',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_type_display()} alert for {self.patient.name}"
@@ -108,8 +364,24 @@ class Alert(models.Model):
     def acknowledge(self, user):
         self.acknowledged = True
         self.acknowledged_by = user
-        self.acknowledged_at = datetime.now()
-        self.save()
+        self.acknowledged_at = timezone.now()
+        self.save(update_fields=['acknowledged', 'acknowledged_by', 'acknowledged_at'])
+        AlertEvent.objects.create(alert=self, kind='acknowledged')
+
+class AlertEvent(models.Model):
+    """Append-only log of alert changes, read by the alert stream in id order"""
+    KINDS = [
+        ('created', 'Created'),
+        ('repeated', 'Repeated'),
+        ('acknowledged', 'Acknowledged'),
+    ]
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} event for alert {self.alert_id}"
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -234,3 +506,112 @@ class Consent(models.Model):
     
     def __str__(self):
         return f"Consent for {self.consultation.patient.name} on {self.consent_date}"
+
+class EpochBucket(models.Func):
+    """Start of the fixed-width time bucket containing a datetime, as epoch seconds"""
+    template = 'CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(seconds)d) AS BIGINT) * %(seconds)d'
+    output_field = models.BigIntegerField()
+    
+    def __init__(self, expression, seconds, **extra):
+        super().__init__(expression, seconds=int(seconds), **extra)
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # julianday() is fractional days since noon 4714 BC; rounding to the
+        # millisecond keeps readings on a bucket edge out of the previous bucket.
+        template = ('(CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400, 3) AS INTEGER)'
+                    ' / %(seconds)d) * %(seconds)d')
+        return self.as_sql(compiler, connection, template=template, **extra_context)
+
+class VitalsReadingQuerySet(models.QuerySet):
+    def buckets(self, interval, start=None, end=None, fields=None):
+        """
+        Downsample readings into ``interval``-wide buckets computed in SQL.
+        
+        Returns one dict per non-empty bucket, oldest first, holding the bucket
+        start time, the number of readings and the min/max/mean of each field.
+        """
+        seconds = int(interval.total_seconds())
+        if seconds < 1:
+            raise ValueError('interval must be at least one second')
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(recorded_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(recorded_at__lt=end)
+        aggregates = {}
+        for field in fields or Vitals.MEASUREMENT_FIELDS:
+            aggregates[f'{field}_min'] = Min(field)
+            aggregates[f'{field}_max'] = Max(field)
+            aggregates[f'{field}_mean'] = Avg(field)
+        rows = (queryset.order_by()
+                .annotate(bucket=EpochBucket('recorded_at', seconds))
+                .values('bucket')
+                .annotate(readings=Count('id'), **aggregates)
+                .order_by('bucket'))
+        buckets = []
+        for row in rows:
+            row['bucket'] = datetime.fromtimestamp(int(row['bucket']), tz=dt_timezone.utc)
+            buckets.append(row)
+        return buckets
+
+class VitalsReading(models.Model):
+    """Append-only history of a patient's vital signs; Patient.vitals holds the latest values"""
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='vitals_readings')
+    recorded_at = models.DateTimeField(default=timezone.now)
+    systolic = models.IntegerField(null=True, blank=True)
+    diastolic = models.IntegerField(null=True, blank=True)
+    heart_rate = models.IntegerField(null=True, blank=True)
+    oxygen_saturation = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    respiratory_rate = models.IntegerField(null=True, blank=True)
+    blood_glucose = models.IntegerField(null=True, blank=True)
+    
+    objects = VitalsReadingQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'recorded_at'], name='vitalsreading_patient_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Vitals for {self.patient.name} at {self.recorded_at}"
+    
+    @classmethod
+    def from_vitals(cls, patient, vitals, recorded_at=None):
+        """Build (without saving) a reading copying the measurements of ``vitals``"""
+        reading = cls(patient=patient, recorded_at=recorded_at or timezone.now())
+        for field in Vitals.MEASUREMENT_FIELDS:
+            setattr(reading, field, getattr(vitals, field))
+        return reading
+
+class Task(models.Model):
+    """Follow-up work queued in the database and run by ``manage.py run_task_worker`` (see tasks.py)"""
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # Enqueueing again with the same key returns the existing task.
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming and the queue metrics read one status in run_at order.
+            models.Index(fields=['status', 'run_at', 'id'], name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} task {self.pk} ({self.status})"
@@ -0,0 +1,158 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(json.JSONEncoder):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would make
+    # the equality half of the keyset condition miss rows.
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Encode the sort key values of a row as an opaque URL-safe cursor"""
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into a list of values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move around it"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, page_size):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed, indexed ordering.
+
+    Every page is fetched with a range condition on the sort key instead of
+    an OFFSET, so the cost of a page does not depend on how deep it is. The
+    ordering must end in a unique column (normally ``id``) and all keys must
+    share the same direction.
+    """
+
+    def __init__(self, queryset, ordering=('-id',), page_size=DEFAULT_PAGE_SIZE):
+        descending = {key.startswith('-') for key in ordering}
+        if len(descending) != 1:
+            raise ValueError('Keyset ordering keys must all have the same direction.')
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.fields = [key.lstrip('-') for key in ordering]
+        self.descending = descending.pop()
+        self.page_size = page_size
+
+    def _row_key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.fields]
+        return [_follow(obj, field) for field in self.fields]
+
+    def _after(self, values, forward):
+        # Builds (a < x) OR (a = x AND b < y) OR ... for the cursor position.
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            term = Q(**{f'{field}__{lookup}': values[i]})
+            for prior, value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{prior: value})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return [key[1:] if key.startswith('-') else f'-{key}' for key in self.ordering]
+
+    def page(self, after=None, before=None):
+        """Return the page following ``after`` or preceding ``before``"""
+        queryset = self.queryset
+        if before:
+            values = self._decode(before)
+            queryset = queryset.filter(self._after(values, forward=False))
+            rows = list(queryset.order_by(*self._reversed_ordering())[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size][::-1]
+            next_cursor = encode_cursor(self._row_key(rows[-1])) if rows else before
+            previous_cursor = encode_cursor(self._row_key(rows[0])) if rows and has_more else None
+        else:
+            if after:
+                values = self._decode(after)
+                queryset = queryset.filter(self._after(values, forward=True))
+            rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            next_cursor = encode_cursor(self._row_key(rows[-1])) if rows and has_more else None
+            previous_cursor = encode_cursor(self._row_key(rows[0])) if rows and after else None
+        return KeysetPage(rows, next_cursor, previous_cursor, self.page_size)
+
+    def _decode(self, cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return values
+
+
+def _follow(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Read an optional ``page_size`` query parameter, clamped to a sane range"""
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def paginate_request(request, queryset, ordering, default_page_size=DEFAULT_PAGE_SIZE):
+    """
+    Paginate ``queryset`` using the ``after``/``before``/``page_size`` query
+    parameters of ``request``. An unreadable cursor falls back to the first page.
+    """
+    paginator = KeysetPaginator(queryset, ordering, get_page_size(request, default_page_size))
+    try:
+        return paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        return paginator.page()
@@ -0,0 +1,152 @@
+"""
+Ranked full-text search over clinical free text.
+
+On SQLite every source table has an external-content FTS5 index
+(``<table>_fts``) that triggers keep in sync with inserts, updates and
+deletes, including bulk inserts that bypass model signals. On PostgreSQL each
+searched column has a GIN index over ``to_tsvector('english', column)``, and
+the same expression is used here so the planner can use it. Both are created
+by migration 0019.
+
+Every source is queried separately, ordered by relevance and limited, and the
+sorted results are merged with ``heapq.merge``. Snippets are HTML-escaped,
+with the matched terms wrapped in ``<mark>``. Each source lists the roles
+allowed to search it: technicians search patients only, consultations and
+imaging are for neurologists.
+"""
+import heapq
+import re
+from itertools import islice
+
+from django.db import NotSupportedError, connection
+from django.utils.html import escape
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SNIPPET_TOKENS = 12
+
+# Control characters mark matches inside snippets until they have been escaped.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+class Source:
+    """A searchable table. ``patient`` is the SQL expression giving the patient id of row ``t``"""
+
+    def __init__(self, kind, table, columns, patient, join='', roles=('technician', 'neurologist')):
+        self.kind = kind
+        self.table = table
+        self.columns = columns
+        self.patient = patient
+        self.join = join
+        self.roles = roles
+
+
+SOURCES = [
+    Source('patient', 'patientsystem_patient',
+           ['chief_complaint', 'medical_history', 'current_medications', 'allergies'], 't.id'),
+    Source('consultation', 'patientsystem_consultation', ['diagnosis', 'treatment_plan'], 't.patient_id',
+           roles=('neurologist',)),
+    Source('imaging', 'patientsystem_imagingstudy', ['findings'], 'c.patient_id',
+           join='JOIN patientsystem_consultation c ON c.id = t.consultation_id', roles=('neurologist',)),
+]
+FIELDS = [column for source in SOURCES for column in source.columns]
+
+
+def allowed_kinds(role):
+    """The kinds of record ``role`` may search"""
+    return [source.kind for source in SOURCES if role in source.roles]
+
+
+def allowed_fields(role):
+    """The columns ``role`` may search"""
+    return [column for source in SOURCES if role in source.roles for column in source.columns]
+
+
+class SearchResult:
+    def __init__(self, kind, id, patient_id, score, snippets):
+        self.kind = kind
+        self.id = id
+        self.patient_id = patient_id
+        # Lower is more relevant, whatever the backend.
+        self.score = score
+        self.snippets = snippets
+
+
+def terms(query):
+    """Split free text into search terms; a trailing * asks for a prefix match"""
+    return [term for term in re.findall(r'[\w*]+', query) if term.strip('*')]
+
+
+def _fts5_query(words, columns):
+    # Each word becomes a quoted FTS5 string, so user input can never be read as query syntax.
+    phrase = ' '.join(f'"{word.rstrip("*")}"' + ('*' if word.endswith('*') else '') for word in words)
+    return '{%s} : (%s)' % (' '.join(columns), phrase)
+
+
+def _tsquery(words):
+    return ' & '.join(re.sub(r'\W', '', word) + (':*' if word.endswith('*') else '') for word in words)
+
+
+def _search_sqlite(source, columns, words, limit):
+    fts = f'{source.table}_fts'
+    snippets = ', '.join(
+        f"snippet({fts}, {source.columns.index(column)}, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS})"
+        for column in columns
+    )
+    sql = (f'SELECT t.id, {source.patient}, bm25({fts}), {snippets} '
+           f'FROM {fts} JOIN {source.table} t ON t.id = {fts}.rowid {source.join} '
+           f'WHERE {fts} MATCH %s ORDER BY bm25({fts}) LIMIT %s')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_fts5_query(words, columns), limit])
+        return cursor.fetchall()
+
+
+def _search_postgresql(source, columns, words, limit):
+    vectors = [f"to_tsvector('english', t.{column})" for column in columns]
+    snippets = ', '.join(
+        f"ts_headline('english', t.{column}, q, 'StartSel={MATCH_START}, StopSel={MATCH_END}, "
+        f"MaxWords={SNIPPET_TOKENS}, MinWords=3')"
+        for column in columns
+    )
+    sql = (f"SELECT t.id, {source.patient}, -({' + '.join(f'ts_rank({v}, q)' for v in vectors)}), {snippets} "
+           f"FROM {source.table} t {source.join}, to_tsquery('english', %s) q "
+           f"WHERE {' OR '.join(f'{v} @@ q' for v in vectors)} ORDER BY 3 LIMIT %s")
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_tsquery(words), limit])
+        return cursor.fetchall()
+
+
+BACKENDS = {'sqlite': _search_sqlite, 'postgresql': _search_postgresql}
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def _results(source, columns, rows):
+    for row_id, patient_id, score, *snippets in rows:
+        matched = {column: _highlight(snippet) for column, snippet in zip(columns, snippets)
+                   if snippet and MATCH_START in snippet}
+        yield SearchResult(source.kind, row_id, patient_id, score, matched)
+
+
+def search(query, fields=None, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Return up to ``limit`` SearchResults for ``query``, most relevant first.
+
+    ``fields`` restricts matching to those columns and ``kinds`` to those
+    sources (patient, consultation, imaging).
+    """
+    backend = BACKENDS.get(connection.vendor)
+    if backend is None:
+        raise NotSupportedError(f'Full-text search is not available on {connection.vendor}.')
+    words = terms(query)
+    if not words:
+        return []
+    streams = []
+    for source in SOURCES:
+        columns = [column for column in source.columns if not fields or column in fields]
+        if columns and (not kinds or source.kind in kinds):
+            streams.append(_results(source, columns, backend(source, columns, words, limit)))
+    return list(islice(heapq.merge(*streams, key=lambda result: result.score), limit))
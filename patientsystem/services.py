@@ -0,0 +1,192 @@
+"""
+Write paths that span several tables.
+
+``submit_consultation`` validates the whole consultation form before writing
+anything, then stores the consultation, its vitals snapshot, lab results,
+imaging study, recent events, consent and vitals reading, updates the
+patient's latest vitals and NIHSS score and queues the follow-up tasks, all
+in one transaction: one durable commit per consultation, and nothing left
+behind if any part fails. The symptom onset time is required, as the tPA
+window is computed from it.
+
+Rows are written with ``bulk_create()`` and ``update()`` (one statement per
+table), so no model signal fires. The work those signals would trigger is
+done explicitly instead: the new consultation's tPA status is computed from
+the objects already in memory, the dashboards are invalidated once on
+commit, and alert evaluation and the tPA refresh of the patient's earlier
+consultations are left to the background worker (see ``tasks``).
+
+The duration of the transaction and of its COMMIT is recorded in
+``metrics`` under the name ``consultation``.
+"""
+import time
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import metrics, tasks, tpa
+from .fragment_cache import bump_data_version
+from .models import Consent, Consultation, ImagingStudy, LabResults, Patient, RecentEvents, Vitals, VitalsReading
+
+RECENT_EVENT_FIELDS = ['recent_surgery', 'recent_biopsy', 'recent_head_trauma', 'recent_stroke', 'recent_mi']
+
+
+def read_blood_pressure(data):
+    """Return (systolic, diastolic) from the form, accepting a legacy "120/80" value"""
+    if data.get('systolic') or data.get('diastolic'):
+        return int(data['systolic']), int(data['diastolic'])
+    if data.get('blood_pressure'):
+        return Vitals.parse_blood_pressure(data['blood_pressure'])
+    return None, None
+
+
+class InvalidSubmission(ValueError):
+    """The form failed validation; ``errors`` lists every problem found"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+class _Reader:
+    """Reads typed values from form data, collecting every error instead of stopping at the first"""
+
+    def __init__(self, data):
+        self.data = data
+        self.errors = []
+
+    def text(self, name, required=True):
+        value = (self.data.get(name) or '').strip()
+        if required and not value:
+            self.errors.append(f'{name} is required')
+        return value
+
+    def number(self, name, kind, required=True):
+        value = self.text(name, required)
+        if not value:
+            return None
+        try:
+            return kind(value)
+        except ValueError:
+            self.errors.append(f'{name} must be a number')
+            return None
+
+    def choice(self, name, choices):
+        value = self.text(name)
+        if value and value not in dict(choices):
+            self.errors.append(f'{name} must be one of {", ".join(dict(choices))}')
+        return value
+
+    def datetime(self, name, required=True):
+        value = self.text(name, required)
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            self.errors.append(f'{name} must be a date and time')
+            return None
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    def flag(self, name):
+        return self.data.get(name) == 'on'
+
+    def blood_pressure(self):
+        try:
+            return read_blood_pressure(self.data)
+        except (KeyError, ValueError):
+            self.errors.append('blood pressure must be given as systolic/diastolic')
+        return None, None
+
+
+def _build(patient, data):
+    """Validate ``data`` and build the unsaved objects of a submission; raises InvalidSubmission"""
+    form = _Reader(data)
+    systolic, diastolic = form.blood_pressure()
+    vitals = Vitals(
+        systolic=systolic, diastolic=diastolic,
+        blood_pressure=Vitals.format_blood_pressure(systolic, diastolic),
+        heart_rate=form.number('heart_rate', int),
+        oxygen_saturation=form.number('oxygen_saturation', float),
+        temperature=form.number('temperature', float),
+        respiratory_rate=form.number('respiratory_rate', int),
+    )
+    consultation = Consultation(
+        patient=patient,
+        symptom_onset_time=form.datetime('symptom_onset_time'),
+        diagnosis=form.text('diagnosis'),
+        treatment_plan=form.text('treatment_plan'),
+        test_orders=form.text('test_orders', required=False),
+        nihss_score=form.number('nihss_score', int),
+    )
+    lab_results = LabResults(
+        cbc_plt=form.number('cbc_plt', int, required=False),
+        inr=form.number('inr', float, required=False),
+    )
+    imaging_study = ImagingStudy(
+        study_type=form.choice('study_type', ImagingStudy._meta.get_field('study_type').choices),
+        findings=form.text('findings'),
+        stroke_type=form.choice('stroke_type', ImagingStudy.STROKE_TYPES),
+    )
+    recent_events = RecentEvents(patient=patient, event_date=timezone.localdate(),
+                                 **{field: form.flag(field) for field in RECENT_EVENT_FIELDS})
+    consent = Consent(
+        tpa_consent=form.flag('tpa_consent'),
+        consent_given_by=form.text('consent_given_by'),
+        relationship_to_patient=form.text('relationship_to_patient'),
+    )
+    if form.errors:
+        raise InvalidSubmission(form.errors)
+    return vitals, consultation, lab_results, imaging_study, recent_events, consent
+
+
+def submit_consultation(patient, data):
+    """
+    Validate and store a consultation for ``patient`` from form ``data`` in
+    one transaction; returns the Consultation. Raises InvalidSubmission
+    before writing anything if the form is invalid.
+    """
+    vitals, consultation, lab_results, imaging_study, recent_events, consent = _build(patient, data)
+    now = timezone.now()
+    consultation.date = now
+
+    # The patient's latest vitals become the new measurements, which the tPA status is computed against.
+    latest = {field: getattr(vitals, field) for field in Vitals.MEASUREMENT_FIELDS}
+    context = {
+        'consultation': consultation, 'patient': patient,
+        'vitals': Vitals(**latest), 'lab_results': lab_results,
+        'consent': consent, 'recent_events': recent_events, 'imaging_study': imaging_study,
+    }
+    consultation.tpa_eligible, consultation.tpa_blocking_reasons, consultation.tpa_window_expires_at = (
+        tpa.status(context))
+
+    started = time.perf_counter()
+    timings = {}
+    with transaction.atomic():
+        # Runs first among the commit callbacks, i.e. right after the COMMIT returns.
+        transaction.on_commit(lambda: timings.setdefault('committed', time.perf_counter()))
+        Vitals.objects.bulk_create([vitals])
+        consultation.vitals = vitals
+        Consultation.objects.bulk_create([consultation])
+        lab_results.consultation = imaging_study.consultation = consent.consultation = consultation
+        LabResults.objects.bulk_create([lab_results])
+        ImagingStudy.objects.bulk_create([imaging_study])
+        Consent.objects.bulk_create([consent])
+        RecentEvents.objects.bulk_create([recent_events])
+        VitalsReading.objects.bulk_create([VitalsReading.from_vitals(patient, vitals, recorded_at=consultation.date)])
+        Vitals.objects.filter(pk=patient.vitals_id).update(
+            blood_pressure=vitals.blood_pressure, **latest,
+        )
+        Patient.objects.filter(pk=patient.pk).update(
+            nihss_score=consultation.nihss_score, nihss_last_updated=now, updated_at=now,
+        )
+        # The consultation is new, so these cannot duplicate queued work and need no idempotency key.
+        tasks.enqueue('evaluate_alerts', {'consultation_id': consultation.id})
+        tasks.enqueue('refresh_tpa_status', {'patient_id': patient.pk})
+        transaction.on_commit(bump_data_version)
+        written = time.perf_counter()
+    if 'committed' in timings:
+        # Not when called inside an outer transaction, which commits later.
+        metrics.registry.observe_transaction('consultation', timings['committed'] - started,
+                                             timings['committed'] - written)
+    return consultation
@@ -1,7 +1,18 @@
-from django.db.models.signals import post_save
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.signals import post_migrate, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Patient, Vitals, Alert, Consultation, LabResults, ImagingStudy, RecentEvents, Consent
+from .middleware import invalidate_role
+from .fragment_cache import bump_data_version, bump_patient_version
+from . import tpa
+
+@receiver(post_migrate)
+def create_cache_table(sender, using, **kwargs):
+    # The DatabaseCache table is not a model, so no migration creates it; this is a no-op once it exists.
+    if sender.name == 'patientsystem':
+        call_command('createcachetable', database=using, verbosity=0)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -12,4 +23,53 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save() 
\ No newline at end of file
+    instance.userprofile.save()
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_role(sender, instance, **kwargs):
+    invalidate_role(instance.user_id)
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(post_save, sender=Vitals)
+@receiver(post_delete, sender=Vitals)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+@receiver(post_save, sender=Consultation)
+@receiver(post_delete, sender=Consultation)
+def invalidate_dashboard_fragments(sender, **kwargs):
+    # Deferred to commit so a reader cannot cache the old rows under the new version.
+    transaction.on_commit(bump_data_version)
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_names(sender, **kwargs):
+    transaction.on_commit(bump_patient_version)
+
+# Keep the materialized tPA status in step with everything it is computed from.
+@receiver(post_save, sender=Consultation)
+def refresh_consultation_tpa_status(sender, instance, **kwargs):
+    tpa.refresh_on_commit(pk=instance.pk)
+
+@receiver(post_save, sender=Patient)
+def refresh_patient_tpa_status(sender, instance, **kwargs):
+    tpa.refresh_on_commit(patient=instance.pk)
+
+@receiver(post_save, sender=Vitals)
+def refresh_vitals_tpa_status(sender, instance, **kwargs):
+    tpa.refresh_on_commit(patient__vitals=instance.pk)
+
+@receiver(post_save, sender=RecentEvents)
+@receiver(post_delete, sender=RecentEvents)
+def refresh_recent_events_tpa_status(sender, instance, **kwargs):
+    tpa.refresh_on_commit(patient=instance.patient_id)
+
+@receiver(post_save, sender=LabResults)
+@receiver(post_delete, sender=LabResults)
+@receiver(post_save, sender=ImagingStudy)
+@receiver(post_delete, sender=ImagingStudy)
+@receiver(post_save, sender=Consent)
+@receiver(post_delete, sender=Consent)
+def refresh_consultation_input_tpa_status(sender, instance, **kwargs):
+    tpa.refresh_on_commit(pk=instance.consultation_id)
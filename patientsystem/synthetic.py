@@ -0,0 +1,420 @@
+"""
+Deterministic, high-volume synthetic data for capacity testing.
+
+Patients are generated in fixed-size chunks. Each chunk draws from its own
+``random.Random`` seeded with ``(seed, chunk index)``, so chunks can be built
+in parallel worker processes and the output depends only on the seed, chunk
+size, profile and anchor time - never on scheduling. Workers also convert
+every value to its database representation, so the parent process only swaps
+chunk-local row numbers for the primary keys it gets back, allocates hospital
+IDs and writes each chunk with multi-row INSERTs in a single transaction, in
+chunk order. Model ``save()`` methods, ``auto_now`` fields and signals are
+bypassed on purpose: generated rows carry their own historical timestamps.
+
+Alerts are not invented: every synthetic consultation is run through the
+registered alert rules, so alert volume follows the vitals, labs and events
+distributions in the profile. Only alerts raised at a patient's latest
+consultation may still be open.
+"""
+import math
+import multiprocessing
+import random
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connection, connections, transaction
+from django.utils import timezone
+
+from . import tpa
+from .alert_rules import alert_fingerprint, evaluate
+from .fragment_cache import bump_data_version
+from .middleware import invalidate_role
+from .models import (
+    Alert, Consent, Consultation, ImagingStudy, LabResults, Patient, RecentEvents, UserProfile, Vitals,
+    VitalsReading, name_key,
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+# Where seeded timelines end unless an anchor is given, so a seed means the same rows on any day.
+SEEDED_ANCHOR = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+ROLES = ('technician', 'neurologist')
+
+# Tables in insert order: (rows key, model, {foreign key: rows key it points into}).
+# Generated foreign keys hold chunk-local row numbers until the parent writes them.
+TABLES = [
+    ('vitals', Vitals, {}),
+    ('patients', Patient, {'vitals': 'vitals'}),
+    ('readings', VitalsReading, {'patient': 'patients'}),
+    ('recent_events', RecentEvents, {'patient': 'patients'}),
+    ('consultation_vitals', Vitals, {}),
+    ('consultations', Consultation, {'patient': 'patients', 'vitals': 'consultation_vitals'}),
+    ('lab_results', LabResults, {'consultation': 'consultations'}),
+    ('imaging', ImagingStudy, {'consultation': 'consultations'}),
+    ('consents', Consent, {'consultation': 'consultations'}),
+    ('alerts', Alert, {'patient': 'patients'}),
+]
+
+# Every knob can be overridden with generate(profile={...}) or a JSON file
+# passed to the generate_data command.
+PROFILE = {
+    'consultations_per_patient': 1.2,
+    'readings_per_patient': 6,
+    'history_days': 365,
+    'age_mean': 71, 'age_sd': 13, 'age_min': 18, 'age_max': 100,
+    'female_ratio': 0.48,
+    # [low, high, weight] bands, sampled uniformly inside the chosen band.
+    'nihss_bands': [[0, 4, 0.45], [5, 15, 0.35], [16, 20, 0.12], [21, 42, 0.08]],
+    'systolic_mean': 158, 'systolic_sd': 26,
+    'diastolic_mean': 88, 'diastolic_sd': 14,
+    'heart_rate_mean': 84, 'heart_rate_sd': 16,
+    'glucose_median': 130, 'glucose_missing_ratio': 0.1,
+    # Onset-to-door minutes are log-normal; some onsets are unknown.
+    'onset_to_door_median_minutes': 150, 'onset_to_door_sigma': 0.8,
+    'unknown_onset_ratio': 0.15,
+    'anticoagulated_ratio': 0.08,
+    'low_platelet_ratio': 0.03,
+    'stroke_types': [['ischemic', 0.72], ['hemorrhagic', 0.13], ['none', 0.15]],
+    'mri_ratio': 0.15,
+    'tpa_consent_ratio': 0.8,
+    'recent_events': {
+        'recent_surgery': 0.03, 'recent_biopsy': 0.01, 'recent_head_trauma': 0.02,
+        'recent_stroke': 0.05, 'recent_mi': 0.02,
+    },
+    'open_alert_ratio': 0.15,
+}
+
+FIRST_NAMES = {
+    'M': ['James', 'John', 'Robert', 'Michael', 'William', 'David', 'Richard', 'Joseph', 'Thomas', 'Charles',
+          'Ahmed', 'Carlos', 'Hiroshi', 'Ivan', 'Kwame', 'Luca', 'Mateo', 'Omar', 'Ravi', 'Wei'],
+    'F': ['Mary', 'Patricia', 'Jennifer', 'Linda', 'Elizabeth', 'Barbara', 'Susan', 'Jessica', 'Sarah', 'Karen',
+          'Aisha', 'Chen', 'Fatima', 'Ingrid', 'Lucia', 'Mei', 'Nadia', 'Priya', 'Sofia', 'Yuki'],
+}
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson',
+              'Martin', 'Lee', 'Nguyen', 'Patel', 'Kim', 'Okafor', 'Schmidt', 'Rossi', 'Ivanova', 'Tanaka']
+STREETS = ['Main St', 'Oak Ave', 'Maple Dr', 'Cedar Ln', 'Park Rd', 'Elm St', 'Hill Rd', 'Lake View', 'River Rd']
+COMPLAINTS = ['Sudden left-sided weakness', 'Sudden right-sided weakness', 'Slurred speech', 'Facial droop',
+              'Sudden severe headache', 'Vision loss in one eye', 'Dizziness and loss of balance',
+              'Confusion and difficulty speaking', 'Numbness of arm and leg']
+HISTORY = ['Hypertension', 'Type 2 diabetes', 'Atrial fibrillation', 'Hyperlipidemia', 'Previous TIA',
+           'Coronary artery disease', 'Smoker', 'Chronic kidney disease', 'Obesity']
+MEDICATIONS = ['Lisinopril', 'Metformin', 'Atorvastatin', 'Amlodipine', 'Aspirin', 'Metoprolol', 'Apixaban',
+               'Warfarin', 'Insulin glargine', 'Clopidogrel']
+ALLERGIES = ['None known', 'Penicillin', 'Sulfa drugs', 'Iodine contrast', 'Latex', 'Codeine']
+DIAGNOSES = {
+    'ischemic': ['Acute ischemic stroke, left MCA territory', 'Acute ischemic stroke, right MCA territory',
+                 'Posterior circulation ischemic stroke', 'Lacunar infarct'],
+    'hemorrhagic': ['Intracerebral hemorrhage', 'Subarachnoid hemorrhage'],
+    'none': ['Transient ischemic attack', 'Stroke mimic - complicated migraine', 'Stroke mimic - seizure'],
+}
+FINDINGS = {
+    'ischemic': ['Hyperdense MCA sign', 'Early ischemic changes, ASPECTS 8', 'Loss of grey-white differentiation',
+                 'No hemorrhage; early ischemic changes'],
+    'hemorrhagic': ['Intraparenchymal hemorrhage with mass effect', 'Basal ganglia hemorrhage',
+                    'Subarachnoid blood in basal cisterns'],
+    'none': ['No acute intracranial abnormality', 'Chronic small vessel disease only'],
+}
+TREATMENTS = {
+    'ischemic': 'IV thrombolysis if eligible; CT angiography for thrombectomy assessment',
+    'hemorrhagic': 'Blood pressure control, reverse anticoagulation, neurosurgical consult',
+    'none': 'Observation, antiplatelet therapy and outpatient follow-up',
+}
+CONSENTING = [('Patient', 'Self'), ('Spouse', 'Spouse'), ('Next of kin', 'Child'), ('Next of kin', 'Sibling')]
+
+
+def default_anchor():
+    """Generated timelines end at the start of the current UTC day"""
+    return datetime.combine(timezone.now().date(), time.min, tzinfo=dt_timezone.utc)
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _weighted(rng, choices):
+    return rng.choices([choice[:-1] for choice in choices], weights=[choice[-1] for choice in choices])[0]
+
+
+def _poisson(rng, mean):
+    limit, k, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        k += 1
+        product *= rng.random()
+    return k
+
+
+def _vitals(rng, profile):
+    systolic = round(_clamp(rng.gauss(profile['systolic_mean'], profile['systolic_sd']), 80, 260))
+    diastolic = round(_clamp(
+        rng.gauss(profile['diastolic_mean'] + 0.4 * (systolic - profile['systolic_mean']), profile['diastolic_sd']),
+        40, min(150, systolic - 20),
+    ))
+    glucose = None
+    if rng.random() >= profile['glucose_missing_ratio']:
+        glucose = round(_clamp(rng.lognormvariate(math.log(profile['glucose_median']), 0.35), 35, 600))
+    return {
+        'systolic': systolic,
+        'diastolic': diastolic,
+        'blood_pressure': Vitals.format_blood_pressure(systolic, diastolic),
+        'heart_rate': round(_clamp(rng.gauss(profile['heart_rate_mean'], profile['heart_rate_sd']), 35, 190)),
+        'oxygen_saturation': round(_clamp(100 - rng.expovariate(1 / 2.5), 78, 100), 1),
+        'temperature': round(_clamp(rng.gauss(36.9, 0.5), 34.5, 40.5), 1),
+        'respiratory_rate': round(_clamp(rng.gauss(16, 3), 8, 36)),
+        'blood_glucose': glucose,
+    }
+
+
+def _drift(rng, vitals):
+    """A slightly different set of measurements for the vitals history"""
+    reading = dict(vitals)
+    reading.pop('blood_pressure')
+    reading['systolic'] = round(_clamp(vitals['systolic'] + rng.gauss(0, 8), 70, 270))
+    reading['diastolic'] = round(_clamp(vitals['diastolic'] + rng.gauss(0, 5), 35, 160))
+    reading['heart_rate'] = round(_clamp(vitals['heart_rate'] + rng.gauss(0, 5), 30, 200))
+    reading['oxygen_saturation'] = round(_clamp(vitals['oxygen_saturation'] + rng.gauss(0, 0.8), 75, 100), 1)
+    reading['temperature'] = round(vitals['temperature'] + rng.gauss(0, 0.1), 1)
+    return reading
+
+
+def _labs(rng, profile):
+    if rng.random() < profile['anticoagulated_ratio']:
+        inr = round(rng.uniform(1.8, 3.5), 2)
+    else:
+        inr = round(_clamp(rng.gauss(1.05, 0.1), 0.8, 1.6), 2)
+    if rng.random() < profile['low_platelet_ratio']:
+        platelets = rng.randint(20000, 99000)
+    else:
+        platelets = round(_clamp(rng.gauss(250000, 60000), 100000, 600000))
+    return {
+        'cbc_wbc': round(_clamp(rng.gauss(8.0, 2.5), 2.0, 25.0), 1),
+        'cbc_hgb': round(_clamp(rng.gauss(13.5, 1.6), 7.0, 19.0), 1),
+        'cbc_plt': platelets,
+        'bmp_glucose': round(_clamp(rng.lognormvariate(math.log(profile['glucose_median']), 0.3), 40, 600), 1),
+        'bmp_creatinine': round(_clamp(rng.lognormvariate(0, 0.3), 0.4, 6.0), 2),
+        'inr': inr,
+        'pt': round(11 + (inr - 1) * 12 + rng.gauss(0, 0.5), 1),
+        'ptt': round(_clamp(rng.gauss(30, 4), 20, 80), 1),
+    }
+
+
+def _prepare(model, rows):
+    """Convert generated rows to (columns, value tuples) ready for the database"""
+    db = connections[DEFAULT_DB_ALIAS]
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    defaults = {field.name: field.get_default() for field in fields}
+    return (
+        [field.column for field in fields],
+        [tuple(field.get_db_prep_save(row.get(field.name, defaults[field.name]), db) for field in fields)
+         for row in rows],
+    )
+
+
+def generate_chunk(task):
+    """Build the rows for one chunk of patients; runs in a worker process"""
+    seed, index, count, profile, anchor, neurologist_ids = task
+    rng = random.Random(f'{seed}:{index}')
+    rows = {key: [] for key, _, _ in TABLES}
+    history = timedelta(days=profile['history_days'])
+
+    for p in range(count):
+        gender = 'F' if rng.random() < profile['female_ratio'] else 'M'
+        age = _clamp(rng.gauss(profile['age_mean'], profile['age_sd']), profile['age_min'], profile['age_max'])
+        date_of_birth = (anchor - timedelta(days=round(age * 365.25))).date()
+        arrivals = sorted(anchor - history * rng.random()
+                          for _ in range(_poisson(rng, profile['consultations_per_patient'])))
+        first_seen = arrivals[0] if arrivals else anchor - history * rng.random()
+        last_seen = arrivals[-1] if arrivals else first_seen
+        events = {flag: rng.random() < ratio for flag, ratio in profile['recent_events'].items()}
+        nihss = 0
+
+        current = _vitals(rng, profile)
+        readings = max(1, _poisson(rng, profile['readings_per_patient']))
+        recorded_at = last_seen
+        for _ in range(readings):
+            rows['readings'].append(dict(_drift(rng, current), patient=p, recorded_at=recorded_at))
+            recorded_at -= timedelta(minutes=rng.randint(15, 90))
+
+        rows['recent_events'].append(dict(
+            events, patient=p, event_date=(first_seen - timedelta(days=rng.randint(1, 90))).date(),
+            notes='',
+        ))
+
+        for arrival_number, arrival in enumerate(arrivals):
+            latest = arrival_number == len(arrivals) - 1
+            stroke_type = _weighted(rng, profile['stroke_types'])[0]
+            low, high = _weighted(rng, profile['nihss_bands'])
+            nihss = rng.randint(low, high) if stroke_type != 'none' else rng.randint(0, 3)
+            onset = None
+            if rng.random() >= profile['unknown_onset_ratio']:
+                minutes = rng.lognormvariate(math.log(profile['onset_to_door_median_minutes']),
+                                             profile['onset_to_door_sigma'])
+                onset = arrival - timedelta(minutes=round(_clamp(minutes, 10, 72 * 60)))
+            snapshot = current if latest else _vitals(rng, profile)
+            labs = _labs(rng, profile)
+            consent_by, relationship = rng.choice(CONSENTING)
+            consent = {'tpa_consent': rng.random() < profile['tpa_consent_ratio'],
+                       'consent_given_by': consent_by, 'relationship_to_patient': relationship}
+            consultation = {
+                'patient': p, 'vitals': len(rows['consultation_vitals']), 'date': arrival,
+                'symptom_onset_time': onset, 'diagnosis': rng.choice(DIAGNOSES[stroke_type]),
+                'treatment_plan': TREATMENTS[stroke_type], 'test_orders': 'CBC, BMP, INR, CT angiography',
+                'nihss_score': nihss,
+            }
+            c = len(rows['consultations'])
+            rows['consultation_vitals'].append(dict(snapshot))
+            rows['consultations'].append(consultation)
+            rows['lab_results'].append(dict(labs, consultation=c))
+            rows['imaging'].append({
+                'consultation': c, 'study_type': 'MRI' if rng.random() < profile['mri_ratio'] else 'CT',
+                'findings': rng.choice(FINDINGS[stroke_type]), 'stroke_type': stroke_type,
+                'performed_at': arrival + timedelta(minutes=rng.randint(5, 40)),
+            })
+            rows['consents'].append(dict(consent, consultation=c,
+                                         consent_date=arrival + timedelta(minutes=rng.randint(10, 60))))
+
+            # Raise alerts exactly as the live system would have at this visit.
+            context = {
+                'consultation': Consultation(date=arrival, symptom_onset_time=onset, nihss_score=nihss),
+                'patient': Patient(date_of_birth=date_of_birth),
+                'vitals': Vitals(**snapshot),
+                'lab_results': LabResults(**labs),
+                'consent': Consent(**consent),
+                'recent_events': RecentEvents(**events),
+                'imaging_study': ImagingStudy(stroke_type=stroke_type),
+            }
+            # The stored tPA status is computed against the patient's current vitals.
+            eligible, reasons, expires_at = tpa.status(dict(context, vitals=Vitals(**current)))
+            consultation.update(tpa_eligible=eligible, tpa_blocking_reasons=reasons,
+                                tpa_window_expires_at=expires_at)
+            for rule, description in evaluate(context):
+                acknowledged = not latest or rng.random() >= profile['open_alert_ratio']
+                timestamp = arrival + timedelta(seconds=rng.randint(1, 120))
+                rows['alerts'].append({
+                    'patient': p, 'type': rule.type, 'description': description, 'rule_key': rule.key,
+                    'timestamp': timestamp, 'last_seen': timestamp, 'acknowledged': acknowledged,
+                    'acknowledged_at': timestamp + timedelta(minutes=rng.randint(1, 45)) if acknowledged else None,
+                    'acknowledged_by': rng.choice(neurologist_ids) if acknowledged and neurologist_ids else None,
+                    # Replaced by the real fingerprint once the patient has an id.
+                    'fingerprint': None if acknowledged else rule.key,
+                })
+
+        rows['vitals'].append(current)
+        first_name, last_name = rng.choice(FIRST_NAMES[gender]), rng.choice(LAST_NAMES)
+        rows['patients'].append({
+            'vitals': p, 'first_name': first_name, 'last_name': last_name,
+            'first_name_key': name_key(first_name), 'last_name_key': name_key(last_name),
+            'date_of_birth': date_of_birth, 'gender': gender,
+            'chief_complaint': rng.choice(COMPLAINTS),
+            'address': f'{rng.randint(1, 9999)} {rng.choice(STREETS)}',
+            'phone_number': f'555-{rng.randint(0, 9999):04d}',
+            'emergency_contact': f'{rng.choice(FIRST_NAMES["F" if gender == "M" else "M"])} {rng.choice(LAST_NAMES)}',
+            'medical_history': ', '.join(rng.sample(HISTORY, rng.randint(0, 3))) or 'None',
+            'current_medications': ', '.join(rng.sample(MEDICATIONS, rng.randint(0, 3))) or 'None',
+            'allergies': rng.choice(ALLERGIES),
+            'nihss_score': nihss,
+            'nihss_last_updated': last_seen, 'created_at': first_seen, 'updated_at': last_seen,
+        })
+    return {key: _prepare(model, rows[key]) for key, model, _ in TABLES}
+
+
+def create_users(count, password, prefix='synthetic_'):
+    """Create ``count`` users per role sharing one password; returns {role: [user ids]}"""
+    password_hash = make_password(password)
+    users = {}
+    for role in ROLES:
+        usernames = [f'{prefix}{role}{i}' for i in range(count)]
+        User.objects.bulk_create([User(username=username, password=password_hash) for username in usernames],
+                                 ignore_conflicts=True)
+        ids = list(User.objects.filter(username__in=usernames).order_by('id').values_list('id', flat=True))
+        UserProfile.objects.bulk_create([UserProfile(user_id=user_id, role=role) for user_id in ids],
+                                        ignore_conflicts=True)
+        UserProfile.objects.filter(user_id__in=ids).update(role=role)
+        for user_id in ids:
+            invalidate_role(user_id)
+        users[role] = ids
+    return users
+
+
+def _insert(cursor, model, columns, rows, returning=False):
+    """INSERT ``rows`` into ``model``'s table, returning the new primary keys in order when asked"""
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES '.format(quote(model._meta.db_table), ', '.join(map(quote, columns)))
+    placeholder = '({})'.format(', '.join(['%s'] * len(columns)))
+    if not returning:
+        cursor.executemany(sql + placeholder, rows)
+        return None
+    ids = []
+    batch_size = connection.ops.bulk_batch_size(columns, rows)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            sql + ', '.join([placeholder] * len(batch)) + f' RETURNING {quote(model._meta.pk.column)}',
+            [value for row in batch for value in row],
+        )
+        ids += [row[0] for row in cursor.fetchall()]
+    return ids
+
+
+def write_chunk(chunk):
+    """Insert one generated chunk in a single transaction; returns rows written per table"""
+    referenced = {target for _, _, foreign_keys in TABLES for target in foreign_keys.values()}
+    ids = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for key, model, foreign_keys in TABLES:
+            columns, rows = chunk[key]
+            rows = [list(row) for row in rows]
+            for name, target in foreign_keys.items():
+                position = columns.index(model._meta.get_field(name).column)
+                for row in rows:
+                    row[position] = ids[target][row[position]]
+            if model is Patient:
+                position = columns.index('hospital_id')
+                for row, hospital_id in zip(rows, Patient.allocate_hospital_ids(len(rows))):
+                    row[position] = hospital_id
+            elif model is Alert:
+                patient, fingerprint = columns.index('patient_id'), columns.index('fingerprint')
+                for row in rows:
+                    if row[fingerprint] is not None:
+                        row[fingerprint] = alert_fingerprint(row[patient], row[fingerprint])
+            ids[key] = _insert(cursor, model, columns, rows, returning=key in referenced)
+    return {key: len(chunk[key][1]) for key, _, _ in TABLES}
+
+
+def generate(patients, seed=None, profile=None, anchor=None, users=10, password='synthetic-password',
+             chunk_size=DEFAULT_CHUNK_SIZE, processes=None, progress=None):
+    """
+    Generate ``patients`` patients with their clinical history, plus ``users``
+    users per role. ``processes=1`` generates in this process. Histories
+    end at ``anchor``, by default SEEDED_ANCHOR when a seed is given and the
+    start of the current UTC day (with seed 0) when not. Returns
+    {'users': {role: [ids]}, 'rows': {table: count}}.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise NotSupportedError('Synthetic data needs a database that returns ids from multi-row INSERTs.')
+    profile = dict(PROFILE, **(profile or {}))
+    if anchor is None:
+        anchor = default_anchor() if seed is None else SEEDED_ANCHOR
+    seed = seed or 0
+    user_ids = create_users(users, password)
+    tasks = [(seed, index, min(chunk_size, patients - start), profile, anchor, user_ids['neurologist'])
+             for index, start in enumerate(range(0, patients, chunk_size))]
+    totals = {}
+    pool = None
+    if processes == 1:
+        chunks = map(generate_chunk, tasks)
+    else:
+        pool = multiprocessing.get_context().Pool(processes, initializer=django.setup)
+        chunks = pool.imap(generate_chunk, tasks)
+    try:
+        for chunk in chunks:
+            for key, count in write_chunk(chunk).items():
+                totals[key] = totals.get(key, 0) + count
+            if progress:
+                progress(totals)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    bump_data_version()
+    return {'users': user_ids, 'rows': totals}
@@ -0,0 +1,203 @@
+"""
+A task queue kept in the database, for follow-up work that should not hold
+up a request.
+
+``enqueue()`` inserts a ``Task`` row; called inside the request's
+transaction, the task commits or rolls back with the data it is about, so no
+work is lost or run for data that never existed. An ``idempotency_key``
+makes enqueueing the same work twice a no-op.
+
+``manage.py run_task_worker`` polls for due tasks through the
+(status, run_at) index. A worker claims a task with a conditional UPDATE
+(``status='queued'`` -> ``'running'``), so any number of workers can share
+the queue without row locks. The handler and the task's completion are
+committed in one transaction, so a handler's database writes happen exactly
+once; anything else it does must tolerate a retry. A failing task is retried
+with exponential backoff up to ``max_attempts``, then marked failed. Tasks
+left running by a worker that died are requeued once their lease
+(``TASK_LEASE`` seconds) has expired.
+
+With ``TASK_QUEUE_EAGER`` set, tasks run in-process as soon as the
+enqueueing transaction commits, which is meant for tests and local
+development without a worker: it puts the work back on the request.
+``check_lag()`` logs a warning when the oldest due
+task has waited longer than ``TASK_QUEUE_LAG_WARNING`` seconds, i.e. when
+the workers are not keeping up or not running.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from . import tpa
+from .alert_rules import run_alert_rules
+from .models import Consultation, Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_LEASE = 5 * 60
+DEFAULT_RETENTION = 24 * 60 * 60
+DEFAULT_LAG_WARNING = 60
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 60 * 60
+
+HANDLERS = {}
+
+
+def task(name):
+    """Decorator registering a handler; it is called with the task payload as keyword arguments"""
+    def decorator(func):
+        if name in HANDLERS:
+            raise ValueError(f"Task '{name}' is already registered.")
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, idempotency_key=None, run_at=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Queue ``name`` with ``payload``; returns the Task (the existing one for a known idempotency key)"""
+    if name not in HANDLERS:
+        raise ValueError(f"Unknown task '{name}'.")
+    new = Task(name=name, payload=payload or {}, idempotency_key=idempotency_key,
+               run_at=run_at or timezone.now(), max_attempts=max_attempts)
+    if idempotency_key is None:
+        new.save()
+    else:
+        try:
+            with transaction.atomic():
+                new.save()
+        except IntegrityError:
+            return Task.objects.get(idempotency_key=idempotency_key)
+    if getattr(settings, 'TASK_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: _run_eagerly(new.pk))
+    return new
+
+
+def _run_eagerly(task_id):
+    worker = worker_name()
+    if _claim(task_id, worker, timezone.now()):
+        run_task(task_id, worker)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'TASK_LEASE', DEFAULT_LEASE))
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after ``attempts`` failed ones"""
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def requeue_expired(now=None):
+    """Requeue tasks claimed more than TASK_LEASE seconds ago, whose worker presumably died; returns how many"""
+    now = now or timezone.now()
+    return Task.objects.filter(status='running', started_at__lt=now - _lease()).update(
+        status='queued', run_at=now, locked_by='',
+    )
+
+
+def _claim(task_id, worker, now):
+    # Another worker may have claimed it since it was read; only one UPDATE can win.
+    return Task.objects.filter(pk=task_id, status='queued').update(
+        status='running', locked_by=worker, started_at=now, attempts=F('attempts') + 1,
+    )
+
+
+def claim(worker, limit=1, now=None):
+    """Claim up to ``limit`` due tasks for ``worker``; returns their ids"""
+    now = now or timezone.now()
+    candidates = (Task.objects.filter(status='queued', run_at__lte=now)
+                  .order_by('run_at', 'id').values_list('id', flat=True)[:limit * 2])
+    claimed = []
+    for task_id in candidates:
+        if _claim(task_id, worker, now):
+            claimed.append(task_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def run_task(task_id, worker):
+    """Run a claimed task; returns its new status"""
+    mine = Task.objects.filter(pk=task_id, status='running', locked_by=worker)
+    current = mine.first()
+    if current is None:
+        return None
+    try:
+        with transaction.atomic():
+            HANDLERS[current.name](**current.payload)
+            finished = mine.update(status='done', finished_at=timezone.now(), last_error='')
+            if not finished:
+                # The lease expired and the task was requeued: let the other run win.
+                transaction.set_rollback(True)
+                return None
+        return 'done'
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Task %s (%s) failed on attempt %s', task_id, current.name, current.attempts)
+        now = timezone.now()
+        if current.attempts >= current.max_attempts:
+            mine.update(status='failed', finished_at=now, last_error=error)
+            return 'failed'
+        mine.update(
+            status='queued', run_at=now + retry_delay(current.attempts), locked_by='', last_error=error,
+        )
+        return 'queued'
+
+
+def purge(now=None):
+    """Delete finished tasks older than TASK_RETENTION seconds; failed ones are kept for inspection"""
+    now = now or timezone.now()
+    retention = timedelta(seconds=getattr(settings, 'TASK_RETENTION', DEFAULT_RETENTION))
+    return Task.objects.filter(status='done', finished_at__lt=now - retention).delete()[0]
+
+
+def queue_stats(now=None):
+    """Tasks per unfinished status and the age of the oldest due queued task, in seconds"""
+    now = now or timezone.now()
+    stats = {status: Task.objects.filter(status=status).count() for status in ('queued', 'running', 'failed')}
+    stats['lag'] = queue_lag(now)
+    return stats
+
+
+def queue_lag(now=None):
+    """Age of the oldest due queued task, in seconds"""
+    now = now or timezone.now()
+    oldest = Task.objects.filter(status='queued', run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+    return (now - oldest).total_seconds() if oldest else 0.0
+
+
+def check_lag(lag):
+    """Log a warning if ``lag`` exceeds TASK_QUEUE_LAG_WARNING seconds; returns whether it does"""
+    limit = getattr(settings, 'TASK_QUEUE_LAG_WARNING', DEFAULT_LAG_WARNING)
+    if lag <= limit:
+        return False
+    logger.warning('The oldest due task has waited %.0f seconds (TASK_QUEUE_LAG_WARNING is %s); '
+                   'are the task workers running?', lag, limit)
+    return True
+
+
+@task('evaluate_alerts')
+def evaluate_alerts(consultation_id):
+    """Run the alert rules for a consultation"""
+    try:
+        run_alert_rules(Consultation(pk=consultation_id))
+    except Consultation.DoesNotExist:
+        logger.info('Consultation %s was deleted before its alerts were evaluated', consultation_id)
+
+
+@task('refresh_tpa_status')
+def refresh_tpa_status(patient_id):
+    """Recompute the tPA status of a patient's consultations"""
+    tpa.refresh(Consultation.objects.filter(patient=patient_id))
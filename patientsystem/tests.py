@@ -1,3 +1,956 @@
-from django.test import TestCase
+import heapq
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils import timezone
+
+from . import alert_stream, autocomplete, fragment_cache, middleware, services, synthetic, tasks, timeline, tpa, tpa_scheduler
+from .filters import alert_filters
+from .middleware import get_role
+from .pagination import InvalidCursor, KeysetPaginator, encode_cursor, paginate_request
+from .alert_rules import RULES, evaluate, save_alerts, tpa_warning_lead
+from .models import (
+    Alert, AlertEvent, Consent, Consultation, IdSequence, ImagingStudy, LabResults, Patient, RecentEvents, Task, UserProfile,
+    Vitals, VitalsReading,
+)
+
+NOW = timezone.now()
+
+
+def quiet_context():
+    """A rule context in which no rule fires"""
+    patient = Patient(first_name='Ann', last_name='Smith', date_of_birth='1960-01-01', gender='F')
+    patient.age_years = 60
+    return {
+        'consultation': Consultation(patient=patient, date=NOW, symptom_onset_time=NOW - timedelta(hours=1),
+                                     nihss_score=3),
+        'patient': patient,
+        'vitals': Vitals(systolic=120, diastolic=80, heart_rate=70, oxygen_saturation=98, temperature=37,
+                         respiratory_rate=16, blood_glucose=100),
+        'lab_results': LabResults(inr=1.0, cbc_plt=250000),
+        'consent': Consent(tpa_consent=True),
+        'recent_events': RecentEvents(),
+    }
+
+
+def create_patient(**fields):
+    vitals = Vitals.objects.create(systolic=120, diastolic=80, heart_rate=70, oxygen_saturation=98,
+                                   temperature=37, respiratory_rate=16)
+    return Patient.objects.create(**{'first_name': 'Ann', 'last_name': 'Smith', 'date_of_birth': date(1960, 1, 1),
+                                     'gender': 'F', 'vitals': vitals, **fields})
+
+
+def consultation_form(**fields):
+    """New-consultation form data for a patient who is eligible for tPA"""
+    return {
+        'systolic': '150', 'diastolic': '90', 'heart_rate': '80', 'oxygen_saturation': '97',
+        'temperature': '36.8', 'respiratory_rate': '16',
+        'symptom_onset_time': (timezone.localtime() - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+        'diagnosis': 'Acute ischemic stroke', 'treatment_plan': 'IV alteplase', 'nihss_score': '8',
+        'cbc_plt': '250000', 'inr': '1.0',
+        'study_type': 'CT', 'findings': 'No bleed', 'stroke_type': 'ischemic',
+        'tpa_consent': 'on', 'consent_given_by': 'Patient', 'relationship_to_patient': 'Self',
+        **fields,
+    }
+
+
+def create_user(role, username=None):
+    user = User.objects.create_user(username or role, password='secret')
+    user.userprofile.role = role
+    user.userprofile.save()
+    return user
+
+
+class AlertRuleBoundaryTests(SimpleTestCase):
+    def fired(self, source=None, **values):
+        context = quiet_context()
+        for field, value in values.items():
+            setattr(context[source], field, value)
+        return {rule.key for rule, _ in evaluate(context)}
+
+    def assertBoundary(self, key, source, field, inside, outside):
+        self.assertNotIn(key, self.fired(source, **{field: inside}), f'{field}={inside}')
+        self.assertIn(key, self.fired(source, **{field: outside}), f'{field}={outside}')
+
+    def test_quiet_context_fires_nothing(self):
+        self.assertEqual(self.fired(), set())
+
+    def test_nihss(self):
+        self.assertBoundary('nihss_stroke', 'consultation', 'nihss_score', 3, 4)
+
+    def test_blood_pressure(self):
+        self.assertBoundary('blood_pressure_high', 'vitals', 'systolic', 185, 186)
+        self.assertBoundary('blood_pressure_high', 'vitals', 'diastolic', 110, 111)
+
+    def test_heart_rate(self):
+        self.assertBoundary('heart_rate_abnormal', 'vitals', 'heart_rate', 60, 59)
+        self.assertBoundary('heart_rate_abnormal', 'vitals', 'heart_rate', 100, 101)
+
+    def test_oxygen_saturation(self):
+        self.assertBoundary('oxygen_saturation_low', 'vitals', 'oxygen_saturation', 95, 94.9)
+
+    def test_temperature(self):
+        self.assertBoundary('temperature_abnormal', 'vitals', 'temperature', 36.1, 36.0)
+        self.assertBoundary('temperature_abnormal', 'vitals', 'temperature', 38, 38.1)
+
+    def test_respiratory_rate(self):
+        self.assertBoundary('respiratory_rate_abnormal', 'vitals', 'respiratory_rate', 12, 11)
+        self.assertBoundary('respiratory_rate_abnormal', 'vitals', 'respiratory_rate', 20, 21)
+
+    def test_blood_glucose(self):
+        self.assertBoundary('blood_glucose_out_of_range', 'vitals', 'blood_glucose', 50, 49)
+        self.assertBoundary('blood_glucose_out_of_range', 'vitals', 'blood_glucose', 400, 401)
+
+    def test_age(self):
+        self.assertBoundary('age_below_threshold', 'patient', 'age_years', 18, 17)
+
+    def test_recent_events(self):
+        for key in ('recent_surgery', 'recent_biopsy', 'recent_head_trauma', 'recent_stroke', 'recent_mi'):
+            self.assertBoundary(key, 'recent_events', key, False, True)
+
+    def test_inr(self):
+        self.assertBoundary('inr_high', 'lab_results', 'inr', 1.7, 1.8)
+
+    def test_platelets(self):
+        self.assertBoundary('platelets_low', 'lab_results', 'cbc_plt', 100000, 99999)
+
+    def test_zero_means_not_measured(self):
+        # As before the rule engine, 0 is an unrecorded value for these fields, not an abnormal one.
+        self.assertEqual(self.fired('vitals', respiratory_rate=0), set())
+        self.assertEqual(self.fired('lab_results', inr=0), set())
+        self.assertEqual(self.fired('lab_results', cbc_plt=0), set())
+
+    def test_missing_values_never_fire(self):
+        for field in ('heart_rate', 'oxygen_saturation', 'temperature', 'respiratory_rate', 'blood_glucose'):
+            self.assertEqual(self.fired('vitals', **{field: None}), set(), field)
+        context = quiet_context()
+        context['lab_results'] = context['recent_events'] = context['consent'] = None
+        self.assertEqual(evaluate(context), [])
+
+    def test_tpa_window(self):
+        self.assertBoundary('outside_tpa_window', 'consultation', 'symptom_onset_time',
+                            NOW - Consultation.TPA_WINDOW, NOW - Consultation.TPA_WINDOW - timedelta(seconds=1))
+        self.assertNotIn('outside_tpa_window', self.fired('consultation', symptom_onset_time=None))
+
+    def test_tpa_window_closing(self):
+        # Onset at which the window closes exactly at the consultation.
+        closing_now = NOW - Consultation.TPA_WINDOW
+        self.assertBoundary('tpa_window_closing', 'consultation', 'symptom_onset_time',
+                            closing_now + tpa_warning_lead() + timedelta(seconds=1), closing_now + tpa_warning_lead())
+        self.assertNotIn('tpa_window_closing', self.fired('consultation', symptom_onset_time=closing_now))
+
+    def test_consent(self):
+        self.assertBoundary('tpa_consent_missing', 'consent', 'tpa_consent', True, False)
+
+    def test_messages_format(self):
+        context = quiet_context()
+        for rule in RULES.values():
+            rule.message.format(**context)
+
+
+class AlertDeduplicationTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+        self.rule = RULES['blood_pressure_high']
+
+    def test_repeat_updates_open_alert(self):
+        save_alerts(self.patient, [(self.rule, 'High blood pressure (190/100)')], now=NOW)
+        created = save_alerts(self.patient, [(self.rule, 'High blood pressure (200/115)')],
+                              now=NOW + timedelta(minutes=5))
+        self.assertEqual(created, [])
+        alert = Alert.objects.get(patient=self.patient)
+        self.assertEqual(alert.occurrences, 2)
+        self.assertEqual(alert.last_seen, NOW + timedelta(minutes=5))
+        self.assertEqual(alert.description, 'High blood pressure (200/115)')
+
+    @override_settings(ALERT_SUPPRESSION_WINDOW=60)
+    def test_repeat_after_window_raises_new_alert(self):
+        save_alerts(self.patient, [(self.rule, 'High blood pressure (190/100)')], now=NOW)
+        created = save_alerts(self.patient, [(self.rule, 'High blood pressure (200/115)')],
+                              now=NOW + timedelta(minutes=2))
+        self.assertEqual(len(created), 1)
+        self.assertEqual(Alert.objects.filter(patient=self.patient).count(), 2)
+
+
+class AlertStreamTests(TestCase):
+    def test_refused_under_wsgi(self):
+        self.client.force_login(create_user('neurologist'))
+        self.assertEqual(self.client.get(reverse('patientsystem:stream_alerts')).status_code, 501)
+
+    def test_poll_picks_up_event_committed_behind_cursor(self):
+        patient = create_patient()
+        alert, = save_alerts(patient, [(RULES['blood_pressure_high'], 'High blood pressure')])
+        first = AlertEvent.objects.get(alert=alert)
+        broadcaster = alert_stream.Broadcaster()
+        broadcaster.last_id = first.id + 10
+        broadcaster.seen = alert_stream.recent_event_ids(broadcaster.last_id)
+        self.assertEqual(broadcaster.poll(), [])
+        # An id allocated before the cursor but committed after the last poll.
+        late = AlertEvent.objects.create(id=first.id + 5, alert=alert, kind='repeated')
+        self.assertEqual([payload['id'] for payload in broadcaster.poll()], [late.id])
+        self.assertEqual(broadcaster.poll(), [])
+
+
+@override_settings(ROLE_CACHE_CHECK_INTERVAL=5)
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch.object(middleware.time, 'monotonic', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        middleware._role_cache = middleware._RoleCache()
+
+    def test_role_change_takes_effect_immediately(self):
+        user = create_user('neurologist')
+        self.assertEqual(get_role(user), 'neurologist')
+        with self.assertNumQueries(0):
+            # Served from this process, without reading the profile or the cache table.
+            self.assertEqual(get_role(user), 'neurologist')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.userprofile.role = 'technician'
+            user.userprofile.save()
+        self.assertEqual(get_role(user), 'technician')
+
+    def test_change_in_another_process_reaches_this_one(self):
+        user = create_user('neurologist')
+        self.assertEqual(get_role(user), 'neurologist')
+        # Another worker saves the profile: the row changes and the shared version is bumped.
+        UserProfile.objects.filter(user=user).update(role='technician')
+        middleware._bump_role_version(None)
+        self.clock += 4
+        self.assertEqual(get_role(user), 'neurologist')
+        self.clock += 1
+        self.assertEqual(get_role(user), 'technician')
+
+    def test_synthetic_users_drop_cached_roles(self):
+        user = create_user('technician', username='synthetic_neurologist0')
+        self.assertEqual(get_role(user), 'technician')
+        with self.captureOnCommitCallbacks(execute=True):
+            synthetic.create_users(1, 'password')
+        self.assertEqual(get_role(user), 'neurologist')
+
+
+class FragmentCacheTests(TestCase):
+    def test_committed_write_invalidates_fragments(self):
+        renders = []
+
+        def render():
+            renders.append(1)
+            return f'<p>{Patient.objects.count()}</p>'
+
+        self.assertEqual(fragment_cache.cached_fragment('count', 'technician', (), render), '<p>0</p>')
+        self.assertEqual(fragment_cache.cached_fragment('count', 'technician', (), render), '<p>0</p>')
+        self.assertEqual(len(renders), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient()
+        self.assertEqual(fragment_cache.cached_fragment('count', 'technician', (), render), '<p>1</p>')
+
+    def test_every_bump_changes_the_version(self):
+        versions = {fragment_cache.data_version()}
+        for _ in range(3):
+            fragment_cache.bump_data_version()
+            versions.add(fragment_cache.data_version())
+        self.assertEqual(len(versions), 4)
+
+
+@override_settings(METRICS_TOKEN='s3cret')
+class MetricsAuthTests(TestCase):
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer sécret').status_code, 403)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class ApiConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = create_user('neurologist')
+        self.client.force_login(self.user)
+        self.patient = create_patient()
+
+    def test_etag_follows_the_page_content(self):
+        alert, = save_alerts(self.patient, [(RULES['blood_pressure_high'], 'High blood pressure')])
+        url = '/api/v1/alerts/?fields=id,acknowledged'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Acknowledging changes no timestamp the old ETag was derived from.
+        alert.acknowledge(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'][0]['acknowledged'])
+
+    def test_if_modified_since_never_hides_changes(self):
+        alert, = save_alerts(self.patient, [(RULES['blood_pressure_high'], 'High blood pressure')])
+        url = '/api/v1/alerts/?fields=id,acknowledged'
+        self.assertFalse(self.client.get(url).has_header('Last-Modified'))
+        alert.acknowledge(self.user)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'][0]['acknowledged'])
+
+    def test_age_etags_change_at_midnight(self):
+        def etag(url, today):
+            with mock.patch('django.utils.timezone.localdate', return_value=today):
+                return self.client.get(url)['ETag']
+
+        monday, tuesday = date(2026, 10, 19), date(2026, 10, 20)
+        self.assertNotEqual(etag('/api/v1/patients/?fields=id&min_age=18', monday),
+                            etag('/api/v1/patients/?fields=id&min_age=18', tuesday))
+        self.assertEqual(etag('/api/v1/patients/?fields=id', monday), etag('/api/v1/patients/?fields=id', tuesday))
+
+
+class SynchronousThread:
+    def __init__(self, target, args, **kwargs):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@override_settings(AUTOCOMPLETE_MEMORY_INDEX=True, AUTOCOMPLETE_MEMORY_INDEX_REFRESH=0)
+class AutocompleteMemoryIndexTests(TestCase):
+    def setUp(self):
+        autocomplete._memory_index = None
+        self.builds = []
+
+        def build(version):
+            self.builds.append(version)
+            autocomplete._memory_index = autocomplete.MemoryIndex(version)
+            autocomplete._memory_index_lock.release()
+
+        for patcher in (mock.patch.object(autocomplete, '_build_memory_index', build),
+                        mock.patch.object(autocomplete.threading, 'Thread', SynchronousThread)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, autocomplete, '_memory_index', None)
+
+    def test_rebuilt_on_patient_changes_only(self):
+        create_patient(last_name='Smith')
+        # The first request is answered from the database while the index is built.
+        self.assertIsNone(autocomplete.memory_index())
+        index = autocomplete.memory_index()
+        self.assertEqual(len(self.builds), 1)
+        self.assertEqual([row['last_name'] for row in autocomplete.suggest('smi')], ['Smith'])
+
+        fragment_cache.bump_data_version()
+        self.assertIs(autocomplete.memory_index(), index)
+        self.assertEqual(len(self.builds), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient(last_name='Smythe')
+        # The stale index keeps answering while its replacement is built.
+        self.assertIs(autocomplete.memory_index(), index)
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual([row['last_name'] for row in autocomplete.suggest('sm')], ['Smith', 'Smythe'])
+
+
+class TpaImagingTests(TestCase):
+    def test_hemorrhage_blocks_tpa(self):
+        eligible = services.submit_consultation(create_patient(), consultation_form())
+        self.assertTrue(eligible.tpa_eligible)
+
+        hemorrhagic = services.submit_consultation(
+            create_patient(), consultation_form(stroke_type='hemorrhagic', findings='Intracerebral hemorrhage'))
+        self.assertFalse(hemorrhagic.tpa_eligible)
+        self.assertEqual(hemorrhagic.tpa_blocking_reasons, ['imaging_hemorrhage'])
+
+    def test_new_imaging_refreshes_status(self):
+        consultation = services.submit_consultation(create_patient(), consultation_form())
+        with self.captureOnCommitCallbacks(execute=True):
+            ImagingStudy.objects.create(consultation=consultation, study_type='MRI',
+                                        findings='Hemorrhagic transformation', stroke_type='hemorrhagic')
+        consultation.refresh_from_db()
+        self.assertFalse(consultation.tpa_eligible)
+        self.assertIn('imaging_hemorrhage', consultation.tpa_blocking_reasons)
+
+    def test_refreshes_once_per_transaction(self):
+        patient = create_patient()
+        with mock.patch.object(tpa, 'refresh', wraps=tpa.refresh) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                consultation = Consultation.objects.create(patient=patient, vitals=patient.vitals, nihss_score=3,
+                                                           symptom_onset_time=NOW - timedelta(hours=1))
+                LabResults.objects.create(consultation=consultation, inr=1.0, cbc_plt=250000)
+                ImagingStudy.objects.create(consultation=consultation, study_type='CT', findings='Bleed',
+                                            stroke_type='hemorrhagic')
+                Consent.objects.create(consultation=consultation, tpa_consent=True, consent_given_by='Patient',
+                                       relationship_to_patient='Self')
+                patient.save()
+        refresh.assert_called_once()
+        consultation.refresh_from_db()
+        self.assertEqual(consultation.tpa_blocking_reasons, ['imaging_hemorrhage'])
+
+
+@override_settings(TASK_QUEUE_EAGER=False, TASK_LEASE=60, TASK_RETENTION=3600)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.failures = 0
+        patcher = mock.patch.dict(tasks.HANDLERS, {'record': self.record})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, value):
+        self.calls.append(value)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError('boom')
+
+    def test_only_one_worker_claims_a_task(self):
+        task = tasks.enqueue('record', {'value': 1})
+        self.assertEqual(tasks.claim('a', limit=5), [task.pk])
+        self.assertEqual(tasks.claim('b', limit=5), [])
+        self.assertEqual(tasks._claim(task.pk, 'b', timezone.now()), 0)
+        # Only the worker holding the task can run it.
+        self.assertIsNone(tasks.run_task(task.pk, 'b'))
+        self.assertEqual(tasks.run_task(task.pk, 'a'), 'done')
+        self.assertEqual(self.calls, [1])
+
+    def test_retry_with_backoff_then_fail(self):
+        self.failures = 3
+        task = tasks.enqueue('record', {'value': 1}, max_attempts=2)
+        tasks.claim('a')
+        before = timezone.now()
+        self.assertEqual(tasks.run_task(task.pk, 'a'), 'queued')
+        task.refresh_from_db()
+        self.assertEqual((task.attempts, task.locked_by), (1, ''))
+        self.assertIn('boom', task.last_error)
+        self.assertGreaterEqual(task.run_at, before + tasks.retry_delay(1))
+        self.assertEqual(tasks.claim('a'), [])
+
+        self.assertEqual(tasks.claim('a', now=task.run_at), [task.pk])
+        self.assertEqual(tasks.run_task(task.pk, 'a'), 'failed')
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 2))
+        self.assertEqual([tasks.retry_delay(n).total_seconds() for n in (1, 2, 3)], [5, 10, 20])
+        self.assertEqual(tasks.retry_delay(50).total_seconds(), tasks.RETRY_MAX_DELAY)
+
+    def test_expired_lease_is_requeued(self):
+        task = tasks.enqueue('record', {'value': 1})
+        now = timezone.now()
+        tasks.claim('dead', now=now)
+        self.assertEqual(tasks.requeue_expired(now + timedelta(seconds=30)), 0)
+        self.assertEqual(tasks.requeue_expired(now + timedelta(seconds=61)), 1)
+        self.assertEqual(tasks.claim('b', now=now + timedelta(seconds=61)), [task.pk])
+        # The dead worker's late completion loses to the new claim.
+        self.assertIsNone(tasks.run_task(task.pk, 'dead'))
+        self.assertEqual(tasks.run_task(task.pk, 'b'), 'done')
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('done', 2))
+
+    def test_idempotent_enqueue(self):
+        first = tasks.enqueue('record', {'value': 1}, idempotency_key='record:1')
+        again = tasks.enqueue('record', {'value': 2}, idempotency_key='record:1')
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(again.payload, {'value': 1})
+
+    def test_eager_tasks_run_on_commit(self):
+        with self.settings(TASK_QUEUE_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            task = tasks.enqueue('record', {'value': 1})
+            self.assertEqual(self.calls, [])
+        task.refresh_from_db()
+        self.assertEqual((task.status, self.calls), ('done', [1]))
+
+    def test_purge_by_finish_time(self):
+        now = timezone.now()
+        old, recent, failed = (tasks.enqueue('record', {'value': n}) for n in range(3))
+        Task.objects.filter(pk=old.pk).update(status='done', finished_at=now - timedelta(hours=2))
+        # Queued long ago but only just finished, e.g. after a backlog or retries.
+        Task.objects.filter(pk=recent.pk).update(status='done', run_at=now - timedelta(days=2), finished_at=now)
+        Task.objects.filter(pk=failed.pk).update(status='failed', finished_at=now - timedelta(days=2))
+        self.assertEqual(tasks.purge(now), 1)
+        self.assertCountEqual(Task.objects.values_list('pk', flat=True), [recent.pk, failed.pk])
+
+    def test_lag_warning(self):
+        tasks.enqueue('record', {'value': 1}, run_at=timezone.now() - timedelta(minutes=5))
+        self.assertGreaterEqual(tasks.queue_lag(), 300)
+        with self.assertLogs('patientsystem.tasks', 'WARNING'):
+            self.assertTrue(tasks.check_lag(tasks.queue_lag()))
+        self.assertFalse(tasks.check_lag(10))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        # The test database is built by the migrations, so this also checks their search triggers.
+        self.patient = create_patient(current_medications='Warfarin 5 mg daily')
+        self.consultation = services.submit_consultation(self.patient, consultation_form(
+            diagnosis='Lacunar infarct with warfarin reversal'))
+
+    def search(self, role, **params):
+        self.client.force_login(create_user(role))
+        return self.client.get(reverse('patientsystem:search'), {'q': 'warfarin', **params})
+
+    def test_finds_new_rows(self):
+        response = self.search('neurologist')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([(result['kind'], result['id']) for result in response.json()['results']],
+                              [('patient', self.patient.pk), ('consultation', self.consultation.pk)])
+
+    def test_technicians_search_patients_only(self):
+        response = self.search('technician')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(result['kind'], result['id']) for result in response.json()['results']],
+                         [('patient', self.patient.pk)])
+        for params in ({'kind': 'consultation'}, {'kind': 'patient,imaging'}, {'fields': 'diagnosis'}):
+            self.assertEqual(self.client.get(reverse('patientsystem:search'), {'q': 'warfarin', **params}).status_code, 403)
+
+
+@override_settings(TASK_QUEUE_EAGER=False)
+class SubmitConsultationTests(TestCase):
+    MODELS = (Consultation, Vitals, LabResults, ImagingStudy, Consent, RecentEvents, VitalsReading)
+
+    def counts(self):
+        return {model.__name__: model.objects.count() for model in self.MODELS}
+
+    def test_invalid_submission_writes_nothing(self):
+        patient = create_patient()
+        before = self.counts()
+        with self.assertRaises(services.InvalidSubmission) as raised:
+            services.submit_consultation(patient, consultation_form(
+                symptom_onset_time='', heart_rate='fast', systolic='150', diastolic='', stroke_type='unknown'))
+        self.assertEqual(raised.exception.errors, [
+            'blood pressure must be given as systolic/diastolic', 'heart_rate must be a number',
+            'symptom_onset_time is required', 'stroke_type must be one of ischemic, hemorrhagic, none',
+        ])
+        self.assertEqual(self.counts(), before)
+        self.assertFalse(Task.objects.exists())
+
+    def test_valid_submission_writes_one_of_each(self):
+        patient = create_patient()
+        before = self.counts()
+        consultation = services.submit_consultation(patient, consultation_form(systolic='', diastolic='',
+                                                                               blood_pressure='160/95'))
+        self.assertEqual(self.counts(), {name: count + 1 for name, count in before.items()})
+        self.assertCountEqual(Task.objects.values_list('name', flat=True), ['evaluate_alerts', 'refresh_tpa_status'])
+        patient.refresh_from_db()
+        self.assertEqual((patient.vitals.systolic, patient.vitals.diastolic), (160, 95))
+        self.assertEqual(consultation.vitals.blood_pressure, '160/95')
+
+
+@override_settings(TASK_QUEUE_EAGER=False)
+class ImportPatientsTests(TestCase):
+    HEADER = ('hospital_id,first_name,last_name,date_of_birth,gender,systolic,diastolic,heart_rate,'
+              'oxygen_saturation,temperature,consultation_diagnosis,consultation_treatment_plan,'
+              'consultation_symptom_onset_time\n')
+
+    def import_rows(self, *lines, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.HEADER + ''.join(f'{line}\n' for line in lines))
+        self.addCleanup(os.remove, f.name)
+        call_command('import_patients', f.name, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_explicit_ids_advance_the_sequence(self):
+        onset = (timezone.now() - timedelta(hours=1)).isoformat()
+        self.import_rows(f'P-5000,Ann,Smith,1960-01-01,F,150,90,80,97,36.8,Ischemic stroke,Alteplase,{onset}',
+                         ',Bob,Jones,1955-05-05,M,140,85,75,98,37.0,,,')
+        self.assertEqual(Patient.objects.get(first_name='Bob').hospital_id, 'P-1001')
+        self.assertEqual(create_patient(first_name='Cy').hospital_id, 'P-5001')
+
+        consultation = Consultation.objects.get(patient__hospital_id='P-5000')
+        self.assertEqual(consultation.tpa_window_expires_at, consultation.symptom_onset_time + Consultation.TPA_WINDOW)
+        self.assertIn('tpa_consent_missing', consultation.tpa_blocking_reasons)
+        self.assertEqual(list(Task.objects.values_list('name', 'payload')),
+                         [('evaluate_alerts', {'consultation_id': consultation.id})])
+
+    def test_duplicates_are_skipped_row_by_row(self):
+        create_patient(hospital_id='P-2000')
+        self.import_rows('P-2000,Ann,Smith,1960-01-01,F,150,90,80,97,36.8,,,',
+                         'P-2001,Bob,Jones,1955-05-05,M,140,85,75,98,37.0,,,',
+                         'P-2001,Bob,Jones,1955-05-05,M,140,85,75,98,37.0,,,')
+        self.assertEqual(Patient.objects.filter(hospital_id='P-2001').count(), 1)
+        self.assertEqual(Patient.objects.get(hospital_id='P-2000').first_name, 'Ann')
+        self.assertEqual(Patient.objects.count(), 2)
+        with self.assertRaises(CommandError):
+            self.import_rows('P-2001,Bob,Jones,1955-05-05,M,140,85,75,98,37.0,,,', strict=True)
+
+
+class TpaSchedulerTests(TestCase):
+    LEAD = timedelta(minutes=30)
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.scheduler = tpa_scheduler.Scheduler(warning_lead=self.LEAD, poll_interval=5, resync_interval=60,
+                                                 catch_up=3600)
+
+    def eligible(self, expires_at, **fields):
+        patient = create_patient(**fields)
+        vitals = Vitals.objects.create(heart_rate=70, oxygen_saturation=98, temperature=37)
+        consultation = Consultation.objects.create(patient=patient, vitals=vitals, nihss_score=5,
+                                                   symptom_onset_time=expires_at - Consultation.TPA_WINDOW)
+        Consultation.objects.filter(pk=consultation.pk).update(tpa_eligible=True, tpa_window_expires_at=expires_at)
+        return consultation
+
+    def fired(self, at):
+        return [(alert.patient_id, alert.rule_key) for alert in self.scheduler.fire_due(at)]
+
+    def test_heap_order(self):
+        late = self.eligible(self.now + timedelta(hours=2))
+        soon = self.eligible(self.now + timedelta(hours=1))
+        # Equal fire times are ordered by consultation id.
+        tied = self.eligible(self.now + timedelta(hours=1))
+        self.scheduler.sync(self.now)
+        popped = [heapq.heappop(self.scheduler.heap) for _ in range(len(self.scheduler.heap))]
+        self.assertEqual([(consultation_id, kind) for _, consultation_id, kind in popped], [
+            (soon.pk, 'tpa_window_closing'), (tied.pk, 'tpa_window_closing'),
+            (soon.pk, 'outside_tpa_window'), (tied.pk, 'outside_tpa_window'),
+            (late.pk, 'tpa_window_closing'), (late.pk, 'outside_tpa_window'),
+        ])
+        self.assertEqual([fire_at for fire_at, _, _ in popped], sorted(fire_at for fire_at, _, _ in popped))
+
+    def test_fires_warning_then_expiry_once(self):
+        expires_at = self.now + timedelta(hours=1)
+        consultation = self.eligible(expires_at)
+        patient_id = consultation.patient_id
+        self.scheduler.sync(self.now)
+        self.assertEqual(self.fired(expires_at - self.LEAD - timedelta(seconds=1)), [])
+        self.assertEqual(self.fired(expires_at - self.LEAD), [(patient_id, 'tpa_window_closing')])
+        self.assertEqual(self.fired(expires_at - timedelta(seconds=1)), [])
+        self.assertEqual(self.fired(expires_at), [(patient_id, 'outside_tpa_window')])
+        self.assertEqual(self.scheduler.heap, [])
+
+        # A restarted scheduler does not repeat the alerts raised since onset.
+        restarted = tpa_scheduler.Scheduler(warning_lead=self.LEAD, catch_up=3600)
+        restarted.sync(expires_at)
+        self.assertEqual(restarted.fire_due(expires_at), [])
+        self.assertEqual(Alert.objects.filter(patient_id=patient_id).count(), 2)
+
+    def test_skips_patients_already_alerted(self):
+        expires_at = self.now + timedelta(hours=1)
+        consultation = self.eligible(expires_at)
+        save_alerts(consultation.patient, [(RULES['tpa_window_closing'], 'Raised by a consultation')])
+        self.scheduler.sync(self.now)
+        self.assertEqual(self.fired(expires_at - self.LEAD), [])
+        self.assertEqual(Alert.objects.filter(rule_key='tpa_window_closing').count(), 1)
+
+    def test_rereads_the_consultation_before_firing(self):
+        expires_at = self.now + timedelta(hours=1)
+        ineligible = self.eligible(expires_at)
+        moved = self.eligible(expires_at)
+        self.scheduler.sync(self.now)
+        Consultation.objects.filter(pk=ineligible.pk).update(tpa_eligible=False)
+        Consultation.objects.filter(pk=moved.pk).update(tpa_window_expires_at=expires_at + timedelta(hours=1))
+        self.assertEqual(self.fired(expires_at), [])
+
+    def test_data_version_change_resyncs(self):
+        self.scheduler.sync(self.now)
+        self.assertFalse(self.scheduler.needs_sync(self.now + timedelta(seconds=59)))
+        self.assertTrue(self.scheduler.needs_sync(self.now + timedelta(seconds=60)))
+
+        consultation = self.eligible(self.now + timedelta(hours=1))
+        fragment_cache.bump_data_version()
+        self.assertTrue(self.scheduler.needs_sync(self.now + timedelta(seconds=1)))
+        self.scheduler.sync(self.now + timedelta(seconds=1))
+        self.assertFalse(self.scheduler.needs_sync(self.now + timedelta(seconds=2)))
+        self.assertIn(consultation.pk, self.scheduler.scheduled)
+
+    def test_catches_up_on_start(self):
+        missed = self.eligible(self.now - timedelta(minutes=20))
+        self.eligible(self.now - timedelta(hours=2))
+        self.scheduler.sync(self.now)
+        # The warning is moot once the window has closed; only the expiry is raised.
+        self.assertEqual(self.fired(self.now), [(missed.patient_id, 'outside_tpa_window')])
+        # Later syncs do not reach back.
+        late = self.eligible(self.now - timedelta(minutes=10))
+        self.scheduler.sync(self.now + timedelta(seconds=1))
+        self.assertNotIn(late.pk, self.scheduler.scheduled)
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        # Seven patients on three updated_at values, so pages split inside ties.
+        times = [NOW - timedelta(minutes=minutes) for minutes in (0, 0, 0, 5, 5, 10, 10)]
+        for updated_at in times:
+            Patient.objects.filter(pk=create_patient().pk).update(updated_at=updated_at)
+        self.expected = list(Patient.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+
+    def paginator(self, page_size=3):
+        return KeysetPaginator(Patient.objects.all(), ('-updated_at', '-id'), page_size)
+
+    def ids(self, page):
+        return [patient.id for patient in page]
+
+    def test_forward_and_backward_through_ties(self):
+        pages = [self.paginator().page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator().page(after=pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([patient_id for page in pages for patient_id in self.ids(page)], self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        # Walking back from the last page returns the same pages.
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(self.paginator().page(before=back[-1].previous_cursor))
+        self.assertEqual([self.ids(page) for page in back], [self.ids(page) for page in reversed(pages)])
+        self.assertTrue(back[-1].has_next)
+
+    def test_rows_inserted_into_a_tie_are_not_skipped_or_repeated(self):
+        first = self.paginator().page()
+        newest = create_patient()
+        Patient.objects.filter(pk=newest.pk).update(updated_at=NOW)
+        rest = self.paginator(page_size=10).page(after=first.next_cursor)
+        # The new row has a higher id than the whole tie, so it sorts before the first page.
+        self.assertEqual(self.ids(first) + self.ids(rest), self.expected)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', encode_cursor({'a': 1}), encode_cursor([1])):
+            with self.assertRaises(InvalidCursor):
+                self.paginator().page(after=cursor)
+        request = RequestFactory().get('/', {'after': 'garbage', 'page_size': '3'})
+        self.assertEqual(self.ids(paginate_request(request, Patient.objects.all(), ('-updated_at', '-id'))),
+                         self.expected[:3])
+
+    def test_mixed_directions_are_rejected(self):
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Patient.objects.all(), ('-updated_at', 'id'))
+
+
+class IdSequenceTests(TestCase):
+    def test_consecutive_ranges(self):
+        self.assertEqual(list(IdSequence.reserve('test', 3, start=100)), [100, 101, 102])
+        self.assertEqual(list(IdSequence.reserve('test')), [103])
+        self.assertEqual(list(IdSequence.reserve('other', 2)), [1, 2])
+        with self.assertRaises(ValueError):
+            IdSequence.reserve('test', 0)
+
+    def test_advance_never_moves_back(self):
+        IdSequence.reserve('test', 5)
+        IdSequence.advance('test', 3)
+        self.assertEqual(list(IdSequence.reserve('test')), [6])
+        IdSequence.advance('test', 50)
+        self.assertEqual(list(IdSequence.reserve('test')), [51])
+        IdSequence.advance('new', 7)
+        self.assertEqual(list(IdSequence.reserve('new')), [8])
+
+
+class IdSequenceConcurrencyTests(TransactionTestCase):
+    def test_concurrent_reservations_have_no_gaps_or_duplicates(self):
+        def reserve(count):
+            try:
+                return [number for _ in range(10) for number in IdSequence.reserve('concurrent', count)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            numbers = [number for chunk in pool.map(reserve, [1, 2, 3, 4]) for number in chunk]
+        self.assertEqual(sorted(numbers), list(range(1, 101)))
+
+
+class VitalsBloodPressureTests(TestCase):
+    def create(self, **fields):
+        return Vitals.objects.create(heart_rate=80, oxygen_saturation=98.0, temperature=36.8, **fields)
+
+    def test_legacy_string_is_split(self):
+        vitals = self.create(blood_pressure='150/90')
+        self.assertEqual((vitals.systolic, vitals.diastolic), (150, 90))
+
+    def test_edited_string_is_split_again(self):
+        vitals = self.create(blood_pressure='150/90')
+        vitals.blood_pressure = '130/85'
+        vitals.save()
+        vitals = Vitals.objects.get(pk=vitals.pk)
+        self.assertEqual((vitals.systolic, vitals.diastolic, vitals.blood_pressure), (130, 85, '130/85'))
+        vitals.blood_pressure = '120/80'
+        vitals.save(update_fields=['blood_pressure'])
+        vitals.refresh_from_db()
+        self.assertEqual((vitals.systolic, vitals.diastolic, vitals.blood_pressure), (120, 80, '120/80'))
+
+    def test_edited_numbers_win_over_an_unchanged_string(self):
+        vitals = self.create(systolic=150, diastolic=90)
+        vitals = Vitals.objects.get(pk=vitals.pk)
+        vitals.systolic = 170
+        vitals.save(update_fields=['systolic'])
+        vitals.refresh_from_db()
+        self.assertEqual((vitals.systolic, vitals.diastolic, vitals.blood_pressure), (170, 90, '170/90'))
+
+
+class VitalsBucketTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+        self.start = datetime(2026, 10, 19, 10, 0, tzinfo=dt_timezone.utc)
+
+    def reading(self, offset, heart_rate):
+        VitalsReading.objects.create(patient=self.patient, recorded_at=self.start + offset, heart_rate=heart_rate)
+
+    def test_bucket_edges(self):
+        self.reading(timedelta(0), 60)
+        self.reading(timedelta(minutes=4, seconds=59, milliseconds=999), 80)
+        self.reading(timedelta(minutes=5), 100)
+        self.reading(timedelta(minutes=20), 90)
+        buckets = VitalsReading.objects.buckets(timedelta(minutes=5), fields=['heart_rate'])
+        self.assertEqual([(bucket['bucket'], bucket['readings']) for bucket in buckets], [
+            (self.start, 2), (self.start + timedelta(minutes=5), 1), (self.start + timedelta(minutes=20), 1),
+        ])
+        self.assertEqual((buckets[0]['heart_rate_min'], buckets[0]['heart_rate_max'], buckets[0]['heart_rate_mean']),
+                         (60, 80, 70))
+
+    def test_range_is_half_open(self):
+        for minutes in (0, 5, 10):
+            self.reading(timedelta(minutes=minutes), 70)
+        buckets = VitalsReading.objects.buckets(timedelta(minutes=5), start=self.start + timedelta(minutes=5),
+                                                end=self.start + timedelta(minutes=10), fields=['heart_rate'])
+        self.assertEqual([bucket['bucket'] for bucket in buckets], [self.start + timedelta(minutes=5)])
+
+    def test_interval_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            VitalsReading.objects.buckets(timedelta(milliseconds=500))
+
+
+class AlertFilterTests(TestCase):
+    def setUp(self):
+        self.client.force_login(create_user('neurologist'))
+        self.patients = [create_patient(), create_patient(first_name='Bob')]
+        self.days = [timezone.make_aware(datetime(2026, 10, day, 12)) for day in (18, 19, 20)]
+        self.alerts = []
+        for patient in self.patients:
+            for day in self.days:
+                for alert_type, acknowledged in (('critical', False), ('warning', True)):
+                    alert = Alert.objects.create(patient=patient, type=alert_type, description='test',
+                                                 acknowledged=acknowledged)
+                    Alert.objects.filter(pk=alert.pk).update(timestamp=day)
+                    alert.timestamp = day
+                    self.alerts.append(alert)
+
+    def listed(self, **params):
+        response = self.client.get(reverse('patientsystem:alerts'), dict(params, page_size=100))
+        return [alert.id for alert in response.context['alerts']]
+
+    def expected(self, type=None, acknowledged=None, patient=None, since=None, until=None):
+        return [alert.id for alert in sorted(self.alerts, key=lambda a: (a.timestamp, a.id), reverse=True)
+                if (type is None or alert.type == type)
+                and (acknowledged is None or alert.acknowledged == acknowledged)
+                and (patient is None or alert.patient_id == patient)
+                and (since is None or alert.timestamp >= since)
+                and (until is None or alert.timestamp < until)]
+
+    def test_filter_combinations(self):
+        patient = self.patients[1].pk
+        midnight = timezone.make_aware(datetime(2026, 10, 19))
+        cases = [
+            ({}, {}),
+            ({'type': 'critical'}, {'type': 'critical'}),
+            ({'acknowledged': 'yes', 'patient': str(patient)}, {'acknowledged': True, 'patient': patient}),
+            ({'type': 'warning', 'acknowledged': 'no'}, {'type': 'warning', 'acknowledged': False}),
+            # A bare date as "until" includes that whole day.
+            ({'since': '2026-10-19', 'until': '2026-10-19'},
+             {'since': midnight, 'until': midnight + timedelta(days=1)}),
+            ({'type': 'critical', 'patient': str(patient), 'since': '2026-10-20'},
+             {'type': 'critical', 'patient': patient, 'since': midnight + timedelta(days=1)}),
+        ]
+        for params, filters in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.listed(**params), self.expected(**filters))
+
+    def test_invalid_values_are_ignored(self):
+        self.assertEqual(alert_filters({'type': 'urgent', 'acknowledged': 'maybe', 'patient': 'x', 'since': 'soon'}),
+                         {})
+        self.assertEqual(self.listed(type='urgent', since='soon'), self.expected())
+
+    def test_api_uses_the_same_filters(self):
+        response = self.client.get('/api/v1/alerts/', {'fields': 'id', 'type': 'critical', 'since': '2026-10-20',
+                                                       'page_size': 100})
+        self.assertEqual([row['id'] for row in response.json()['results']],
+                         self.expected(type='critical', since=timezone.make_aware(datetime(2026, 10, 20))))
+
+
+class BulkAcknowledgeTests(TestCase):
+    def setUp(self):
+        self.user = create_user('neurologist')
+        self.client.force_login(self.user)
+        self.ann, self.bob = create_patient(), create_patient(first_name='Bob')
+        self.open = {
+            (patient.pk, alert_type): Alert.objects.create(patient=patient, type=alert_type, description='test')
+            for patient in (self.ann, self.bob) for alert_type in ('critical', 'warning')
+        }
+        self.closed = Alert.objects.create(patient=self.ann, type='critical', description='test', acknowledged=True)
+
+    def acknowledge(self, **data):
+        return self.client.post(reverse('patientsystem:acknowledge_alerts'), data)
+
+    def test_by_patient_and_type(self):
+        response = self.acknowledge(patient=self.ann.pk, type='critical')
+        self.assertEqual(response.json(), {'acknowledged': 1, 'ids': [self.open[self.ann.pk, 'critical'].pk],
+                                           'open_count': 3})
+        # One event per alert actually acknowledged; the already closed alert gets none.
+        self.assertEqual(list(AlertEvent.objects.filter(kind='acknowledged').values_list('alert_id', flat=True)),
+                         [self.open[self.ann.pk, 'critical'].pk])
+        alert = Alert.objects.get(pk=self.open[self.ann.pk, 'critical'].pk)
+        self.assertEqual((alert.acknowledged, alert.acknowledged_by), (True, self.user))
+
+    def test_by_patient(self):
+        response = self.acknowledge(patient=self.bob.pk)
+        self.assertEqual(response.json()['acknowledged'], 2)
+        self.assertEqual(AlertEvent.objects.filter(kind='acknowledged').count(), 2)
+        # Repeating the request finds nothing left to acknowledge.
+        self.assertEqual(self.acknowledge(patient=self.bob.pk).json()['acknowledged'], 0)
+        self.assertEqual(AlertEvent.objects.filter(kind='acknowledged').count(), 2)
+
+    def test_by_ids(self):
+        ids = [self.open[self.ann.pk, 'warning'].pk, self.closed.pk, 'x']
+        response = self.client.post(reverse('patientsystem:acknowledge_alerts'), {'ids': ids})
+        self.assertEqual(response.json()['ids'], [self.open[self.ann.pk, 'warning'].pk])
+        self.assertEqual(AlertEvent.objects.filter(kind='acknowledged').count(), 1)
+
+    def test_needs_a_selection_and_a_neurologist(self):
+        self.assertEqual(self.acknowledge().status_code, 400)
+        self.assertEqual(self.acknowledge(type='urgent').status_code, 400)
+        self.client.force_login(create_user('technician'))
+        self.assertEqual(self.acknowledge(patient=self.ann.pk).status_code, 302)
+        self.assertEqual(Alert.objects.filter(acknowledged=False).count(), 4)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.patient = create_patient()
+        other = create_patient(first_name='Bob')
+        times = [NOW - timedelta(minutes=minutes) for minutes in (0, 10, 10, 20)]
+        for time in times:
+            for patient in (self.patient, other):
+                vitals = Vitals.objects.create(heart_rate=70, oxygen_saturation=98, temperature=37)
+                consultation = Consultation.objects.create(patient=patient, vitals=vitals, nihss_score=3)
+                Consultation.objects.filter(pk=consultation.pk).update(date=time)
+                # Lab results take the consultation's time: a tie across streams.
+                LabResults.objects.create(consultation=consultation, inr=1.0)
+                VitalsReading.objects.create(patient=patient, recorded_at=time, heart_rate=70)
+                alert = Alert.objects.create(patient=patient, type='info', description='test')
+                Alert.objects.filter(pk=alert.pk).update(timestamp=time)
+
+    def brute_force(self):
+        rank = {stream.kind: rank for rank, stream in enumerate(timeline.STREAMS)}
+        events = []
+        for stream in timeline.STREAMS:
+            for obj in stream.model.objects.filter(**{stream.patient_field: self.patient}).annotate(
+                    event_time=F(stream.time_field)):
+                events.append((obj.event_time, rank[stream.kind], obj.id, stream.kind))
+        return [(kind, id) for _, _, id, kind in sorted(events, reverse=True)]
+
+    def test_pages_match_a_full_sort(self):
+        expected = self.brute_force()
+        self.assertEqual(len(expected), 16)
+        for page_size in (1, 3, 5, 16, 50):
+            with self.subTest(page_size=page_size):
+                seen, cursor = [], None
+                while True:
+                    page = timeline.patient_timeline(self.patient, after=cursor, page_size=page_size)
+                    self.assertLessEqual(len(page), page_size)
+                    seen += [(event.kind, event.object.id) for event in page]
+                    if not page.has_next:
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', encode_cursor([1, 2, 3]), encode_cursor(['not a time', 0, 1]),
+                       encode_cursor([NOW.isoformat(), 'a', 1])):
+            with self.assertRaises(InvalidCursor):
+                timeline.patient_timeline(self.patient, after=cursor)
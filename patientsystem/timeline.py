@@ -0,0 +1,108 @@
+"""
+A patient's consultations, vitals readings, lab results, imaging studies,
+consents and alerts as one chronological feed, newest first.
+
+Each kind of event is read from its own table with a query ordered by an
+indexed (patient, time) key and limited to one page, and the sorted streams
+are merged lazily with ``heapq.merge``. Events are ordered by
+(time, stream rank, id), which is unique, so a page costs one query per
+stream however long the patient's stay, and a cursor holding that key picks
+up exactly where the previous page stopped.
+"""
+import heapq
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Alert, Consent, Consultation, ImagingStudy, LabResults, VitalsReading
+from .pagination import InvalidCursor, KeysetPage, decode_cursor, encode_cursor
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class Stream:
+    """One source of timeline events: rows of ``model`` for a patient, ordered by ``time_field``"""
+
+    def __init__(self, kind, label, model, patient_field, time_field, select_related=()):
+        self.kind = kind
+        self.label = label
+        self.model = model
+        self.patient_field = patient_field
+        self.time_field = time_field
+        self.select_related = select_related
+
+    def events(self, patient, rank, cursor, limit):
+        queryset = (self.model.objects
+                    .filter(**{self.patient_field: patient})
+                    .select_related(*self.select_related)
+                    .annotate(event_time=F(self.time_field)))
+        if cursor is not None:
+            queryset = queryset.filter(_older_than(cursor, rank))
+        for obj in queryset.order_by('-event_time', '-id')[:limit]:
+            yield TimelineEvent(self, rank, obj)
+
+
+# The rank breaks ties between events of different kinds recorded at the same time.
+STREAMS = [
+    Stream('consultation', 'Consultation', Consultation, 'patient', 'date'),
+    Stream('lab_results', 'Lab results', LabResults, 'consultation__patient', 'consultation__date'),
+    Stream('imaging', 'Imaging', ImagingStudy, 'consultation__patient', 'performed_at'),
+    Stream('consent', 'Consent', Consent, 'consultation__patient', 'consent_date'),
+    Stream('vitals', 'Vitals', VitalsReading, 'patient', 'recorded_at'),
+    Stream('alert', 'Alert', Alert, 'patient', 'timestamp'),
+]
+
+
+class TimelineEvent:
+    def __init__(self, stream, rank, obj):
+        self.kind = stream.kind
+        self.label = stream.label
+        self.rank = rank
+        self.object = obj
+        self.time = obj.event_time
+
+    @property
+    def sort_key(self):
+        return (self.time, self.rank, self.object.id)
+
+
+def _older_than(cursor, rank):
+    """Rows of the stream with ``rank`` that come after ``cursor`` in newest-first order"""
+    time, cursor_rank, cursor_id = cursor
+    if rank < cursor_rank:
+        return Q(event_time__lte=time)
+    if rank > cursor_rank:
+        return Q(event_time__lt=time)
+    return Q(event_time__lt=time) | Q(event_time=time, id__lt=cursor_id)
+
+
+def _decode(cursor):
+    values = decode_cursor(cursor)
+    if len(values) != 3 or not isinstance(values[0], str):
+        raise InvalidCursor(cursor)
+    time = parse_datetime(values[0])
+    if time is None or not all(isinstance(value, int) for value in values[1:]):
+        raise InvalidCursor(cursor)
+    return time, values[1], values[2]
+
+
+def patient_timeline(patient, after=None, page_size=DEFAULT_PAGE_SIZE, streams=None):
+    """
+    Return a KeysetPage of the ``page_size`` newest events of ``patient``
+    older than the ``after`` cursor. Raises InvalidCursor for a bad cursor.
+    """
+    cursor = _decode(after) if after else None
+    merged = heapq.merge(
+        *(stream.events(patient, rank, cursor, page_size + 1)
+          for rank, stream in enumerate(streams or STREAMS)),
+        key=lambda event: event.sort_key, reverse=True,
+    )
+    events = []
+    for event in merged:
+        events.append(event)
+        if len(events) > page_size:
+            break
+    has_more = len(events) > page_size
+    events = events[:page_size]
+    next_cursor = encode_cursor(list(events[-1].sort_key)) if has_more else None
+    return KeysetPage(events, next_cursor, None, page_size)
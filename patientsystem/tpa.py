@@ -0,0 +1,127 @@
+"""
+Materialized tPA eligibility of consultations.
+
+Each consultation stores whether any tPA contraindication applies
+(``tpa_eligible``), the keys of the alert rules that block it
+(``tpa_blocking_reasons``) and when its treatment window closes
+(``tpa_window_expires_at``: symptom onset + 4.5 hours). The contraindications
+are the tPA rules of the alert engine, evaluated against the patient's
+current vitals rather than the snapshot taken at the consultation, so the
+status tracks the patient as they are now, plus a hemorrhage on the latest
+imaging study, a missing consent and an unknown onset time.
+
+Signal handlers (see ``signals``) refresh the affected consultations after
+every change to vitals, lab results, imaging, recent events, consent, the
+patient or the consultation itself. The lookups are collected per thread
+until the transaction commits, so a transaction that saves a patient, their
+vitals and a consultation with its inputs refreshes once, in one query. The
+status is written with ``update()``, which fires no signals of its own. Rows written without signals (bulk imports,
+or consultations created before this existed) are brought up to date with
+``manage.py refresh_tpa_status``.
+
+"Eligible now" is then ``tpa_eligible`` with an expiry still in the future:
+one range scan of a partial index over the eligible rows, already in order
+of time left.
+"""
+import threading
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .alert_rules import RULES, evaluate, load_contexts
+from .fragment_cache import bump_data_version
+from .models import Consultation
+
+BLOCKING_RULES = (
+    'blood_pressure_high', 'blood_glucose_out_of_range', 'age_below_threshold',
+    'recent_surgery', 'recent_biopsy', 'recent_head_trauma', 'recent_stroke', 'recent_mi',
+    'inr_high', 'platelets_low', 'outside_tpa_window', 'tpa_consent_missing',
+)
+ONSET_UNKNOWN = 'symptom_onset_unknown'
+NO_CONSENT = 'tpa_consent_missing'
+HEMORRHAGE = 'imaging_hemorrhage'
+REFRESH_BATCH_SIZE = 500
+
+
+def status(context):
+    """(eligible, blocking reasons, window expiry) for an alert rule context"""
+    consultation = context['consultation']
+    reasons = [rule.key for rule, _ in evaluate(context, [RULES[key] for key in BLOCKING_RULES])]
+    # The consent rule only fires on a refusal; no consent at all blocks too.
+    if context['consent'] is None and NO_CONSENT not in reasons:
+        reasons.append(NO_CONSENT)
+    imaging_study = context.get('imaging_study')
+    if imaging_study is not None and imaging_study.stroke_type == 'hemorrhagic':
+        reasons.append(HEMORRHAGE)
+    onset = consultation.symptom_onset_time
+    if onset is None:
+        reasons.append(ONSET_UNKNOWN)
+    return not reasons, reasons, onset + Consultation.TPA_WINDOW if onset else None
+
+
+def refresh(consultations):
+    """Recompute and store the status of ``consultations`` (a queryset); returns how many changed"""
+    changed = 0
+    for context in load_contexts(consultations):
+        context['vitals'] = context['patient'].vitals
+        consultation = context['consultation']
+        current = (consultation.tpa_eligible, consultation.tpa_blocking_reasons, consultation.tpa_window_expires_at)
+        new = status(context)
+        if current != new:
+            eligible, reasons, expires_at = new
+            Consultation.objects.filter(pk=consultation.pk).update(
+                tpa_eligible=eligible, tpa_blocking_reasons=reasons, tpa_window_expires_at=expires_at,
+            )
+            changed += 1
+    if changed:
+        transaction.on_commit(bump_data_version)
+    return changed
+
+
+_pending = threading.local()
+
+
+def refresh_on_commit(**lookups):
+    """Refresh the consultations matching ``lookups`` once the current transaction commits"""
+    if not hasattr(_pending, 'lookups'):
+        _pending.lookups = set()
+    _pending.lookups.update(lookups.items())
+    # Every call registers a callback, as a rolled-back savepoint discards its own; the first
+    # to run after the COMMIT refreshes everything pending and the others find nothing left.
+    transaction.on_commit(_refresh_pending)
+
+
+def _refresh_pending():
+    lookups, _pending.lookups = _pending.lookups, set()
+    if not lookups:
+        return
+    values = defaultdict(set)
+    for field, value in lookups:
+        values[field].add(value)
+    matching = reduce(or_, (Q(**{f'{field}__in': ids}) for field, ids in values.items()))
+    refresh(Consultation.objects.filter(matching))
+
+
+def refresh_all(batch_size=REFRESH_BATCH_SIZE):
+    """Refresh every consultation in id batches; returns how many changed"""
+    changed = 0
+    last_id = 0
+    while True:
+        ids = list(Consultation.objects.filter(id__gt=last_id).order_by('id')
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return changed
+        last_id = ids[-1]
+        with transaction.atomic():
+            changed += refresh(Consultation.objects.filter(id__in=ids))
+
+
+def eligible_now(now=None):
+    """Consultations currently eligible for tPA, least time left first"""
+    return (Consultation.objects
+            .filter(tpa_eligible=True, tpa_window_expires_at__gt=now or timezone.now())
+            .order_by('tpa_window_expires_at', 'id'))
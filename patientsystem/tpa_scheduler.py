@@ -0,0 +1,138 @@
+"""
+Raises alerts when a tPA-eligible patient's treatment window is about to
+close and when it has closed, at the moment it happens rather than at the
+next consultation.
+
+The scheduler keeps a heap of (fire time, consultation id, kind) entries:
+a ``tpa_window_closing`` warning ``TPA_WINDOW_WARNING`` seconds before
+``tpa_window_expires_at`` and an ``outside_tpa_window`` alert at it. Between
+firings it sleeps until the earliest entry or the next poll, whichever comes
+first, and a poll only reads the data version (see ``fragment_cache``).
+
+The schedule is (re)loaded from the partial index over eligible
+consultations: on start, whenever the data version changes and at least
+every ``TPA_SCHEDULER_RESYNC_INTERVAL`` seconds, so it also converges when
+the cache is not shared with the web processes. Entries whose consultation
+became ineligible or got a new expiry are dropped lazily when they reach the
+top of the heap. Before firing, the consultation is re-read, and nothing is
+raised if the patient was already alerted for that rule during the window,
+so restarts, catch-up after downtime and several running schedulers never
+duplicate an alert.
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import fragment_cache
+from .alert_rules import RULES, save_alerts, tpa_warning_lead
+from .models import Alert, Consultation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_RESYNC_INTERVAL = 60
+DEFAULT_CATCH_UP = 60 * 60
+
+CLOSING = 'tpa_window_closing'
+EXPIRED = 'outside_tpa_window'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Scheduler:
+    def __init__(self, warning_lead=None, poll_interval=None, resync_interval=None, catch_up=None):
+        self.warning_lead = warning_lead or tpa_warning_lead()
+        self.poll_interval = poll_interval or _setting('TPA_SCHEDULER_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.resync_interval = timedelta(seconds=resync_interval or _setting(
+            'TPA_SCHEDULER_RESYNC_INTERVAL', DEFAULT_RESYNC_INTERVAL))
+        self.catch_up = timedelta(seconds=catch_up if catch_up is not None else _setting(
+            'TPA_SCHEDULER_CATCH_UP', DEFAULT_CATCH_UP))
+        self.heap = []
+        # Consultation id -> the window expiry its heap entries were pushed for.
+        self.scheduled = {}
+        self.version = None
+        self.synced_at = None
+
+    def schedule(self, consultation_id, expires_at):
+        if self.scheduled.get(consultation_id) == expires_at:
+            return
+        self.scheduled[consultation_id] = expires_at
+        heapq.heappush(self.heap, (expires_at - self.warning_lead, consultation_id, CLOSING))
+        heapq.heappush(self.heap, (expires_at, consultation_id, EXPIRED))
+
+    def sync(self, now):
+        """Load the eligible consultations whose window closes after ``now`` (or within the catch-up on start)"""
+        since = now - self.catch_up if self.synced_at is None else now
+        self.version = fragment_cache.data_version()
+        current = dict(Consultation.objects
+                       .filter(tpa_eligible=True, tpa_window_expires_at__gt=since)
+                       .values_list('id', 'tpa_window_expires_at'))
+        for consultation_id, expires_at in current.items():
+            self.schedule(consultation_id, expires_at)
+        # Consultations that are no longer eligible; their heap entries are skipped when popped.
+        for consultation_id in [cid for cid, expires_at in self.scheduled.items()
+                                if cid not in current and expires_at > since]:
+            del self.scheduled[consultation_id]
+        self.synced_at = now
+
+    def needs_sync(self, now):
+        return (self.synced_at is None or now - self.synced_at >= self.resync_interval
+                or fragment_cache.data_version() != self.version)
+
+    def fire_due(self, now):
+        """Raise the alerts of every entry due at ``now``; returns the alerts created"""
+        created = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, consultation_id, kind = heapq.heappop(self.heap)
+            expires_at = self.scheduled.get(consultation_id)
+            if expires_at is None or fire_at != (expires_at if kind == EXPIRED else expires_at - self.warning_lead):
+                continue
+            if kind == EXPIRED:
+                del self.scheduled[consultation_id]
+            elif expires_at <= now:
+                # Caught up after downtime: the window has already closed.
+                continue
+            created += self.fire(consultation_id, expires_at, kind)
+        return created
+
+    def fire(self, consultation_id, expires_at, kind):
+        consultation = (Consultation.objects.select_related('patient')
+                        .filter(pk=consultation_id, tpa_eligible=True, tpa_window_expires_at=expires_at)
+                        .first())
+        if consultation is None:
+            return []
+        rule = RULES[kind]
+        already_alerted = Alert.objects.filter(
+            patient_id=consultation.patient_id, rule_key=rule.key,
+            timestamp__gte=expires_at - Consultation.TPA_WINDOW,
+        ).exists()
+        if already_alerted:
+            return []
+        logger.info('Consultation %s: %s', consultation_id, rule.key)
+        return save_alerts(consultation.patient, [(rule, rule.message)])
+
+    def next_wakeup(self, now):
+        """Seconds to sleep before the next entry is due or the next poll"""
+        wait = self.poll_interval
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(wait, 0)
+
+    def run(self, stop=None):
+        """Fire alerts until ``stop`` (a threading.Event) is set; can also run in a thread"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            close_old_connections()
+            now = timezone.now()
+            if self.needs_sync(now):
+                self.sync(now)
+            self.fire_due(now)
+            stop.wait(self.next_wakeup(timezone.now()))
+
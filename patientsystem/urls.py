@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'patientsystem'
 
@@ -9,8 +9,18 @@ urlpatterns = [
     path('patient/<int:patient_id>/', views.patient_detail, name='patient_detail'),
     path('patient/<int:patient_id>/consultation/new/', views.new_consultation, name='new_consultation'),
     path('alerts/', views.alerts, name='alerts'),
+    path('alerts/stream/', views.stream_alerts, name='stream_alerts'),
     path('alert/<int:alert_id>/acknowledge/', views.acknowledge_alert, name='acknowledge_alert'),
+    path('alerts/acknowledge/', views.acknowledge_alerts, name='acknowledge_alerts'),
     path('consultations/', views.consultations, name='consultations'),
+    path('consultations/tpa/', views.tpa_worklist, name='tpa_worklist'),
     path('logout/', views.custom_logout, name='logout'),
     path('patient/<int:patient_id>/edit_vitals/', views.edit_vitals, name='edit_vitals'),
+    path('patient/<int:patient_id>/vitals/history/', views.vitals_history, name='vitals_history'),
+    path('search/', views.search_records, name='search'),
+    path('patients/autocomplete/', views.patient_autocomplete, name='patient_autocomplete'),
+    path('cache/stats/', views.fragment_cache_stats, name='fragment_cache_stats'),
+    path(f'api/{api.API_VERSION}/patients/', api.patients, name='api_patients'),
+    path(f'api/{api.API_VERSION}/consultations/', api.consultations, name='api_consultations'),
+    path(f'api/{api.API_VERSION}/alerts/', api.alerts, name='api_alerts'),
 ] 
\ No newline at end of file
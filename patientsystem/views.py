@@ -1,41 +1,146 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.contrib.auth import logout, login, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from datetime import datetime
-from .models import Patient, Consultation, Alert, Vitals, UserProfile, LabResults, ImagingStudy, RecentEvents, Consent
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.db import NotSupportedError
+from datetime import timedelta
+import hmac
+from asgiref.sync import sync_to_async
+from .models import Patient, Consultation, Alert, Vitals, VitalsReading, UserProfile, LabResults, ImagingStudy, RecentEvents, Consent
 from .decorators import technician_required, neurologist_required
+from .filters import ALERT_FILTERS, alert_filters, filters_to_q
+from .middleware import request_role
+from . import alert_stream, autocomplete, fragment_cache, metrics, search, services, tpa
+from .pagination import InvalidCursor, get_page_size, paginate_request
+from .timeline import patient_timeline
+
+# Dashboards list the most recently updated patients first; the ordering ends
+# in the primary key so every row has a unique position for the cursor.
+DASHBOARD_ORDERING = ('-updated_at', '-id')
+
+# The alerts page lists newest first; each filter combination is served by one
+# of the (column, timestamp) indexes on Alert.
+ALERT_ORDERING = ('-timestamp', '-id')
+
+# Patient detail shows the latest consultations in full and everything else in
+# the cursor-paged timeline.
+RECENT_CONSULTATIONS = 5
+TIMELINE_PAGE_SIZE = 50
+
+def patient_table(request, role, template_name):
+    """Render (or fetch from the fragment cache) the dashboard's current page of patients"""
+    # The table shows ages, which change at midnight without any write.
+    parts = (request.GET.get('after'), request.GET.get('before'), get_page_size(request), timezone.localdate())
+    
+    def render_table():
+        page = paginate_request(request, Patient.objects.with_age(), DASHBOARD_ORDERING)
+        return render_to_string(template_name, {'patients': page, 'page': page})
+    
+    return fragment_cache.cached_fragment('patient_table', role, parts, render_table)
 
 @login_required
 def dashboard(request):
     """Display role-specific dashboard"""
-    # Ensure user has a profile with a role
-    user_profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={'role': 'technician'}
-    )
+    role = request_role(request)
     
-    if user_profile.role == 'technician':
+    if role == 'technician':
         return render(request, 'patientsystem/technician_dashboard.html', {
-            'patients': Patient.objects.all()
+            'patient_table': patient_table(request, role, 'patientsystem/_technician_patients.html')
         })
     else:  # neurologist
         return render(request, 'patientsystem/neurologist_dashboard.html', {
-            'patients': Patient.objects.all(),
-            'alerts': Alert.objects.filter(acknowledged=False).order_by('-timestamp')[:5]
+            'patient_table': patient_table(request, role, 'patientsystem/_neurologist_patients.html'),
+            'alert_panel': fragment_cache.cached_fragment('alert_panel', role, (), lambda: render_to_string(
+                'patientsystem/_neurologist_alerts.html',
+                {'alerts': Alert.objects.filter(acknowledged=False).order_by('-timestamp')[:5]}
+            ))
         })
 
+@login_required
+def search_records(request):
+    """Full-text search over patient, consultation and imaging free text as JSON"""
+    query = request.GET.get('q', '').strip()
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+    kinds = [kind for kind in request.GET.get('kind', '').split(',') if kind]
+    unknown = [field for field in fields if field not in search.FIELDS]
+    if unknown:
+        return JsonResponse({'error': f'Unknown field(s): {", ".join(unknown)}.'}, status=400)
+    role = request_role(request)
+    allowed = search.allowed_kinds(role)
+    forbidden = ([kind for kind in kinds if kind not in allowed]
+                 + [field for field in fields if field not in search.allowed_fields(role)])
+    if not allowed:
+        return JsonResponse({'error': 'Search is not available to your role.'}, status=403)
+    if forbidden:
+        return JsonResponse({'error': f'Not searchable by your role: {", ".join(forbidden)}.'}, status=403)
+    kinds = kinds or allowed
+    try:
+        limit = min(max(int(request.GET.get('limit', search.DEFAULT_LIMIT)), 1), search.MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    try:
+        results = search.search(query, fields=fields, kinds=kinds, limit=limit)
+    except NotSupportedError as e:
+        return JsonResponse({'error': str(e)}, status=501)
+    patients = Patient.objects.in_bulk({result.patient_id for result in results})
+    return JsonResponse({
+        'query': query,
+        'results': [{
+            'kind': result.kind,
+            'id': result.id,
+            'patient': {
+                'id': result.patient_id,
+                'hospital_id': patients[result.patient_id].hospital_id,
+                'name': patients[result.patient_id].name,
+            },
+            'score': result.score,
+            'snippets': result.snippets,
+        } for result in results],
+    })
+
+@login_required
+def patient_autocomplete(request):
+    """Suggest patients by name prefix or hospital ID as compact JSON"""
+    try:
+        limit = min(max(int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT)), 1), autocomplete.MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    patients = autocomplete.suggest(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [
+        [p['id'], p['hospital_id'], f"{p['first_name']} {p['last_name']}", p['date_of_birth'], p['gender']]
+        for p in patients
+    ]})
+
+@login_required
+def fragment_cache_stats(request):
+    """Report this process's dashboard fragment cache counters (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required.'}, status=403)
+    return JsonResponse(fragment_cache.stats())
+
 @login_required
 def patient_detail(request, patient_id):
     """Display patient details for both roles"""
     try:
-        patient = get_object_or_404(Patient, id=patient_id)
-        consultations = patient.consultations.all().order_by('-date')
+        patient = get_object_or_404(Patient.objects.select_related('vitals'), id=patient_id)
+        recent_consultations = patient.consultations.order_by('-date')[:RECENT_CONSULTATIONS]
+        try:
+            events = patient_timeline(patient, after=request.GET.get('after'),
+                                      page_size=get_page_size(request, TIMELINE_PAGE_SIZE))
+        except InvalidCursor:
+            events = patient_timeline(patient, page_size=get_page_size(request, TIMELINE_PAGE_SIZE))
         
         # Check user role
-        is_technician = hasattr(request.user, 'userprofile') and request.user.userprofile.role == 'technician'
-        is_neurologist = hasattr(request.user, 'userprofile') and request.user.userprofile.role == 'neurologist'
+        is_technician = request_role(request) == 'technician'
+        is_neurologist = request_role(request) == 'neurologist'
         
         if not (is_technician or is_neurologist):
             messages.error(request, 'You do not have permission to view patient details.')
@@ -43,7 +148,8 @@ def patient_detail(request, patient_id):
         
         return render(request, 'patientsystem/patient_detail.html', {
             'patient': patient,
-            'consultations': consultations,
+            'recent_consultations': recent_consultations,
+            'timeline': events,
             'is_technician': is_technician,
             'is_neurologist': is_neurologist,
             'can_create_consultation': is_neurologist  # Add this to control button visibility
@@ -61,68 +167,7 @@ def new_consultation(request, patient_id):
         
         if request.method == 'POST':
             try:
-                # Create new Vitals record
-                vitals = Vitals.objects.create(
-                    blood_pressure=request.POST['blood_pressure'],
-                    heart_rate=int(request.POST['heart_rate']),
-                    oxygen_saturation=float(request.POST['oxygen_saturation']),
-                    temperature=float(request.POST['temperature']),
-                    respiratory_rate=int(request.POST['respiratory_rate'])
-                )
-                
-                # Create new Consultation record
-                consultation = Consultation.objects.create(
-                    patient=patient,
-                    symptom_onset_time=request.POST['symptom_onset_time'],
-                    diagnosis=request.POST['diagnosis'],
-                    treatment_plan=request.POST['treatment_plan'],
-                    test_orders=request.POST.get('test_orders', ''),
-                    vitals=vitals,
-                    nihss_score=int(request.POST['nihss_score'])
-                )
-                
-                # Create Lab Results record
-                lab_results = LabResults.objects.create(
-                    consultation=consultation,
-                    cbc_plt=int(request.POST.get('cbc_plt', 0)) if request.POST.get('cbc_plt') else None,
-                    inr=float(request.POST.get('inr', 0)) if request.POST.get('inr') else None
-                )
-                
-                # Create Imaging Study record
-                imaging_study = ImagingStudy.objects.create(
-                    consultation=consultation,
-                    study_type=request.POST['study_type'],
-                    findings=request.POST['findings'],
-                    stroke_type=request.POST['stroke_type']
-                )
-                
-                # Create Recent Events record
-                recent_events = RecentEvents.objects.create(
-                    patient=patient,
-                    recent_surgery=request.POST.get('recent_surgery') == 'on',
-                    recent_biopsy=request.POST.get('recent_biopsy') == 'on',
-                    recent_head_trauma=request.POST.get('recent_head_trauma') == 'on',
-                    recent_stroke=request.POST.get('recent_stroke') == 'on',
-                    recent_mi=request.POST.get('recent_mi') == 'on',
-                    event_date=datetime.now().date()
-                )
-                
-                # Create Consent record
-                consent = Consent.objects.create(
-                    consultation=consultation,
-                    tpa_consent=request.POST.get('tpa_consent') == 'on',
-                    consent_given_by=request.POST['consent_given_by'],
-                    relationship_to_patient=request.POST['relationship_to_patient']
-                )
-                
-                # Update patient's NIHSS score
-                patient.nihss_score = consultation.nihss_score
-                patient.vitals = vitals
-                patient.save()
-                
-                # Check for alerts
-                check_alerts(patient, consultation)
-                
+                services.submit_consultation(patient, request.POST)
                 messages.success(request, 'Consultation submitted successfully')
                 return redirect('patientsystem:patient_detail', patient_id=patient_id)
                 
@@ -139,16 +184,65 @@ def new_consultation(request, patient_id):
 @login_required
 @neurologist_required
 def alerts(request):
-    """Display all system alerts (neurologist only)"""
+    """Display system alerts, filtered and paginated (neurologist only)"""
     try:
-        alerts = Alert.objects.all().order_by('-timestamp')
+        filters = alert_filters(request.GET)
+        alerts = Alert.objects.filter(filters_to_q(filters)).select_related('patient', 'acknowledged_by')
+        page = paginate_request(request, alerts, ALERT_ORDERING)
         return render(request, 'patientsystem/alerts.html', {
-            'alerts': alerts
+            'alerts': page,
+            'page': page,
+            'filters': filters,
+            'filter_query': urlencode({key: request.GET[key] for key in ALERT_FILTERS if request.GET.get(key)}),
+            'alert_types': Alert.ALERT_TYPES,
+            'open_count': Alert.objects.filter(acknowledged=False).count()
         })
     except Exception as e:
         messages.error(request, f'Error accessing alerts: {str(e)}')
         return redirect('patientsystem:dashboard')
 
+async def stream_alerts(request):
+    """Stream alert events to a neurologist as server-sent events (ASGI only)"""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless response would hold a worker per open dashboard.
+        return HttpResponse('The alert stream requires an ASGI server.', status=501, content_type='text/plain')
+    if await sync_to_async(request_role)(request) != 'neurologist':
+        return HttpResponseForbidden('Only neurologists can subscribe to alerts.')
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(alert_stream.stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+@neurologist_required
+@require_POST
+def acknowledge_alerts(request):
+    """Acknowledge the selected alerts, or all open alerts for a patient and/or type"""
+    ids = [value for value in request.POST.getlist('ids') if value.isdigit()]
+    filters = alert_filters({key: request.POST.get(key) for key in ('patient', 'type')})
+    if ids:
+        selection = Alert.objects.filter(id__in=ids)
+    elif filters:
+        selection = Alert.objects.filter(filters_to_q(filters))
+    else:
+        return JsonResponse({'error': 'Select alerts by ids, patient or type.'}, status=400)
+    acknowledged = selection.acknowledge(request.user)
+    return JsonResponse({
+        'acknowledged': len(acknowledged),
+        'ids': acknowledged,
+        'open_count': Alert.objects.filter(acknowledged=False).count()
+    })
+
+def metrics_export(request):
+    """Export per-view metrics in Prometheus format (bearer token or staff only)"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    has_token = bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    if not (has_token or request.user.is_staff):
+        return HttpResponseForbidden('Metrics require a token or a staff account.')
+    return HttpResponse(metrics.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def custom_logout(request):
     """Custom logout view to handle both GET and POST requests"""
     logout(request)
@@ -161,8 +255,10 @@ def new_patient(request):
     if request.method == 'POST':
         try:
             # Create new Vitals record
+            systolic, diastolic = services.read_blood_pressure(request.POST)
             vitals = Vitals.objects.create(
-                blood_pressure=request.POST.get('blood_pressure'),
+                systolic=systolic,
+                diastolic=diastolic,
                 heart_rate=request.POST.get('heart_rate'),
                 oxygen_saturation=request.POST.get('oxygen_saturation'),
                 temperature=request.POST.get('temperature'),
@@ -184,6 +280,7 @@ def new_patient(request):
                 allergies=request.POST.get('allergies'),
                 vitals=vitals
             )
+            VitalsReading.from_vitals(patient, vitals).save()
             
             messages.success(request, 'Patient added successfully!')
             return redirect('patientsystem:patient_detail', patient_id=patient.id)
@@ -194,142 +291,6 @@ def new_patient(request):
     
     return render(request, 'patientsystem/new_patient.html')
 
-def check_alerts(patient, consultation):
-    """Check for conditions that should trigger alerts"""
-    # Check NIHSS score
-    if consultation.nihss_score >= 4:
-        Alert.objects.create(
-            type='warning',
-            description=f'NIHSS score ({consultation.nihss_score}) indicates potential stroke',
-            patient=patient
-        )
-    
-    # Check blood pressure
-    systolic, diastolic = map(int, consultation.vitals.blood_pressure.split('/'))
-    if systolic > 185 or diastolic > 110:
-        Alert.objects.create(
-            type='critical',
-            description=f'High blood pressure ({consultation.vitals.blood_pressure}) detected - tPA contraindicated',
-            patient=patient
-        )
-    
-    # Check heart rate
-    if consultation.vitals.heart_rate < 60 or consultation.vitals.heart_rate > 100:
-        Alert.objects.create(
-            type='warning',
-            description=f'Abnormal heart rate ({consultation.vitals.heart_rate} bpm) detected',
-            patient=patient
-        )
-    
-    # Check oxygen saturation
-    if consultation.vitals.oxygen_saturation < 95:
-        Alert.objects.create(
-            type='warning',
-            description=f'Oxygen saturation below normal range ({consultation.vitals.oxygen_saturation:.1f}% < 95%) - Supplemental oxygen may be required',
-            patient=patient
-        )
-    
-    # Check temperature
-    if consultation.vitals.temperature < 36.1 or consultation.vitals.temperature > 38:
-        Alert.objects.create(
-            type='warning',
-            description=f'Abnormal temperature detected ({consultation.vitals.temperature:.1f}°C) - Normal range: 36.1°C to 38°C',
-            patient=patient
-        )
-    
-    # Check respiratory rate
-    if consultation.vitals.respiratory_rate and (consultation.vitals.respiratory_rate < 12 or consultation.vitals.respiratory_rate > 20):
-        Alert.objects.create(
-            type='warning',
-            description=f'Abnormal respiratory rate detected ({consultation.vitals.respiratory_rate} breaths/min) - Normal range: 12-20 breaths/min',
-            patient=patient
-        )
-    
-    # Check blood glucose if available
-    if consultation.vitals.blood_glucose is not None:
-        if consultation.vitals.blood_glucose < 50 or consultation.vitals.blood_glucose > 400:
-            Alert.objects.create(
-                type='critical',
-                description=f'Blood glucose outside tPA administration range ({consultation.vitals.blood_glucose} mg/dL) - Normal range: 50-400 mg/dL',
-                patient=patient
-            )
-    
-    # Check age for tPA eligibility
-    if patient.age < 18:
-        Alert.objects.create(
-            type='critical',
-            description=f'Patient age ({patient.age}) is below tPA eligibility threshold',
-            patient=patient
-        )
-    
-    # Check recent events
-    recent_events = patient.recent_events.first()
-    if recent_events:
-        if recent_events.recent_surgery:
-            Alert.objects.create(
-                type='critical',
-                description='Recent surgery detected - tPA contraindicated',
-                patient=patient
-            )
-        if recent_events.recent_biopsy:
-            Alert.objects.create(
-                type='critical',
-                description='Recent biopsy detected - tPA contraindicated',
-                patient=patient
-            )
-        if recent_events.recent_head_trauma:
-            Alert.objects.create(
-                type='critical',
-                description='Recent head trauma detected - tPA contraindicated',
-                patient=patient
-            )
-        if recent_events.recent_stroke:
-            Alert.objects.create(
-                type='critical',
-                description='Recent stroke detected - tPA contraindicated',
-                patient=patient
-            )
-        if recent_events.recent_mi:
-            Alert.objects.create(
-                type='critical',
-                description='Recent myocardial infarction detected - tPA contraindicated',
-                patient=patient
-            )
-    
-    # Check lab results
-    lab_results = consultation.lab_results.first()
-    if lab_results:
-        if lab_results.inr and lab_results.inr > 1.7:
-            Alert.objects.create(
-                type='critical',
-                description=f'INR too high for tPA administration ({lab_results.inr:.1f} > 1.7) - tPA contraindicated',
-                patient=patient
-            )
-        if lab_results.cbc_plt and lab_results.cbc_plt < 100000:
-            Alert.objects.create(
-                type='critical',
-                description=f'Platelet count too low for tPA administration ({lab_results.cbc_plt} x10³/μL < 100,000) - tPA contraindicated',
-                patient=patient
-            )
-    
-    # Check symptom onset time
-    if consultation.symptom_onset_time:
-        if not consultation.within_tpa_window:
-            Alert.objects.create(
-                type='critical',
-                description='Patient outside tPA treatment window (>4.5 hours)',
-                patient=patient
-            )
-    
-    # Check consent
-    consent = consultation.consents.first()
-    if consent and not consent.tpa_consent:
-        Alert.objects.create(
-            type='critical',
-            description='No consent for tPA administration',
-            patient=patient
-        )
-
 @login_required
 @neurologist_required
 def acknowledge_alert(request, alert_id):
@@ -432,6 +393,16 @@ def consultations(request):
         messages.error(request, f'Error accessing consultations: {str(e)}')
         return redirect('patientsystem:dashboard')
 
+@login_required
+@neurologist_required
+def tpa_worklist(request):
+    """List consultations eligible for tPA right now, least time left first (neurologist only)"""
+    now = timezone.now()
+    return render(request, 'patientsystem/tpa_worklist.html', {
+        'consultations': tpa.eligible_now(now).select_related('patient'),
+        'now': now,
+    })
+
 @login_required
 @technician_required
 def edit_vitals(request, patient_id):
@@ -443,13 +414,14 @@ def edit_vitals(request, patient_id):
             try:
                 # Update existing Vitals record
                 vitals = patient.vitals
-                vitals.blood_pressure = request.POST.get('blood_pressure')
+                vitals.systolic, vitals.diastolic = services.read_blood_pressure(request.POST)
                 vitals.heart_rate = int(request.POST.get('heart_rate'))
                 vitals.oxygen_saturation = float(request.POST.get('oxygen_saturation'))
                 vitals.temperature = float(request.POST.get('temperature'))
                 vitals.respiratory_rate = int(request.POST.get('respiratory_rate'))
                 vitals.blood_glucose = int(request.POST.get('blood_glucose')) if request.POST.get('blood_glucose') else None
                 vitals.save()
+                VitalsReading.from_vitals(patient, vitals).save()
                 
                 messages.success(request, 'Vital signs updated successfully')
                 return redirect('patientsystem:patient_detail', patient_id=patient_id)
@@ -463,3 +435,24 @@ def edit_vitals(request, patient_id):
     except Exception as e:
         messages.error(request, f'Error accessing vitals form: {str(e)}')
         return redirect('patientsystem:dashboard')
+
+@login_required
+def vitals_history(request, patient_id):
+    """Return a patient's vitals downsampled into min/max/mean buckets as JSON"""
+    patient = get_object_or_404(Patient, id=patient_id)
+    try:
+        hours = min(max(int(request.GET.get('hours', 72)), 1), 24 * 30)
+        bucket_minutes = min(max(int(request.GET.get('bucket', 60)), 1), 24 * 60)
+    except ValueError:
+        return JsonResponse({'error': 'hours and bucket must be integers'}, status=400)
+    end = timezone.now()
+    buckets = patient.vitals_readings.buckets(
+        timedelta(minutes=bucket_minutes), start=end - timedelta(hours=hours), end=end,
+    )
+    return JsonResponse({
+        'patient': patient.id,
+        'bucket_minutes': bucket_minutes,
+        'start': end - timedelta(hours=hours),
+        'end': end,
+        'buckets': buckets,
+    })
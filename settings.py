@@ -57,11 +57,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'patientsystem.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'patientsystem.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +99,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the in-memory default, so tests running several
+        # connections at once wait on SQLite's locks as a deployment would.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -148,4 +153,72 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Add these settings at the end of the file
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'patientsystem:dashboard'
-LOGOUT_REDIRECT_URL = 'login' 
+LOGOUT_REDIRECT_URL = 'login'
+
+# Repeat firings of the same alert rule for a patient within this many seconds
+# update the open alert instead of creating a new one.
+ALERT_SUPPRESSION_WINDOW = 60 * 60
+
+# The live alert stream polls the alert event log this often (seconds, once per
+# server process) and sends idle clients a keepalive comment this often.
+ALERT_STREAM_POLL_INTERVAL = 1
+ALERT_STREAM_KEEPALIVE = 15
+
+# Roles, dashboard fragments and the data version are cached, and every
+# worker process must see the same cache for a change made through one worker
+# to reach the others. Redis when REDIS_URL is set, otherwise a database table
+# (created by "python manage.py migrate").
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'patientsystem_cache',
+        }
+    }
+
+# Each process keeps users' roles in memory and checks this often (seconds)
+# whether any profile changed; the process saving a profile drops it at once.
+ROLE_CACHE_CHECK_INTERVAL = 5
+
+# Seconds a rendered dashboard fragment is kept; data changes invalidate it sooner.
+FRAGMENT_CACHE_TIMEOUT = 10 * 60
+
+# Per-view metrics served at /metrics. Each worker process writes its counters
+# to METRICS_DIR so the endpoint can merge them; without it only the answering
+# process is reported. Scrapers authenticate with "Authorization: Bearer <token>".
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Keep the sorted patient name keys in memory in every process for faster
+# autocomplete; the copy checks this often (seconds) whether patients changed
+# and is then rebuilt in the background.
+AUTOCOMPLETE_MEMORY_INDEX = False
+AUTOCOMPLETE_MEMORY_INDEX_REFRESH = 60
+
+# The tPA scheduler (manage.py run_tpa_scheduler) warns this many seconds
+# before an eligible patient's treatment window closes, checks the data
+# version this often, reloads its schedule at least this often, and on start
+# catches up on windows that closed up to this long ago.
+TPA_WINDOW_WARNING = 30 * 60
+TPA_SCHEDULER_POLL_INTERVAL = 5
+TPA_SCHEDULER_RESYNC_INTERVAL = 60
+TPA_SCHEDULER_CATCH_UP = 60 * 60
+
+# Background tasks (manage.py run_task_worker): a running task is requeued
+# after TASK_LEASE seconds and finished tasks are purged after TASK_RETENTION
+# seconds. TASK_QUEUE_EAGER=true in the environment runs tasks in the
+# request's process on commit instead, for local development without a
+# worker; never in production, where it puts the work back on the request.
+# The workers and /metrics log a warning when the oldest due task has waited
+# more than TASK_QUEUE_LAG_WARNING seconds.
+TASK_LEASE = 5 * 60
+TASK_RETENTION = 24 * 60 * 60
+TASK_QUEUE_EAGER = os.environ.get('TASK_QUEUE_EAGER', '').lower() == 'true'
+TASK_QUEUE_LAG_WARNING = 60
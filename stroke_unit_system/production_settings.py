@@ -47,6 +47,15 @@ DATABASES = {
     }
 }
 
+# Cache shared by all workers: set REDIS_URL, or keep the DatabaseCache
+# inherited from settings.py (created by "python manage.py migrate").
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+} if os.environ.get('REDIS_URL') else CACHES
+
 # Static files
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
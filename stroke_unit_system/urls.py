@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
-from patientsystem.views import custom_logout, register, custom_login
+from patientsystem.views import custom_logout, register, custom_login, metrics_export
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,4 +25,5 @@ urlpatterns = [
     path('login/', custom_login, name='login'),
     path('register/', register, name='register'),
     path('logout/', custom_logout, name='logout'),
+    path('metrics', metrics_export, name='metrics'),
 ]